@@ -1,6 +1,6 @@
 from textwrap import dedent
 
-from anaconda_cli_base.config import AnacondaBaseSettings
+from anaconda_assistant.config import AssistantBaseSettings, load_config
 from pydantic import BaseModel
 from typing import Literal, Optional
 from .core import set_config
@@ -24,7 +24,7 @@ class SystemMessages(BaseModel):
     error: str = DEFAULT_ERROR_SYSTEM_MESSAGE
 
 
-class AssistantCondaConfig(AnacondaBaseSettings, plugin_name="assistant"):
+class AssistantCondaConfig(AssistantBaseSettings, plugin_name="assistant"):
     debug_error_mode: DebugErrorMode = None
     system_messages: SystemMessages = SystemMessages()
 
@@ -42,4 +42,4 @@ def set_debug_error_mode(
 
 def get_debug_error_mode() -> DebugErrorMode:
     """Get the debug error mode from the config."""
-    return AssistantCondaConfig().debug_error_mode
+    return load_config(AssistantCondaConfig).debug_error_mode
@@ -14,6 +14,8 @@ from anaconda_cli_base.config import anaconda_config_path
 from anaconda_cli_base.exceptions import register_error_handler
 from anaconda_cli_base.exceptions import ERROR_HANDLERS
 from anaconda_assistant import ChatSession
+from anaconda_assistant.config import clear_config_cache
+from anaconda_assistant.streaming import CoalesceTimePolicy
 from anaconda_assistant.exceptions import (
     UnspecifiedAcceptedTermsError,
     UnspecifiedDataCollectionChoice,
@@ -23,6 +25,10 @@ from rich.live import Live
 from rich.prompt import Confirm
 from .rich_customizations.md import MyMarkdown
 
+# Re-rendering the markdown is the expensive part of each update,
+# so group the streamed response into updates at most every 50 ms
+STREAM_POLICY = CoalesceTimePolicy(interval=50)
+
 
 def set_config(table: str, key: str, value: Any) -> None:
     expanded = table.split(".")
@@ -51,6 +57,9 @@ def set_config(table: str, key: str, value: Any) -> None:
     with open(config_toml, "wb") as f:
         tomli_w.dump(config, f)
 
+    # don't rely on the file mtime alone for settings written in this process
+    clear_config_cache()
+
 
 @register_error_handler(UnspecifiedDataCollectionChoice)
 def data_collection_choice(e: Type[UnspecifiedDataCollectionChoice]) -> int:
@@ -141,7 +150,9 @@ def stream_response(
 
             def chat() -> Generator[str, None, None]:
                 session = ChatSession(system_message=system_message)
-                response = session.chat(message=prompt, stream=True)
+                response = session.chat(
+                    message=prompt, stream=True, stream_policy=STREAM_POLICY
+                )
                 yield from response
 
             response = cast(
@@ -1,20 +1,20 @@
 import sys
 import traceback
-from typing import Any, Generator
+from functools import lru_cache
+from typing import TYPE_CHECKING, Any, Generator
 
-from anaconda_assistant.config import AssistantConfig
 from conda import CondaError, plugins
 from conda.cli.conda_argparse import BUILTIN_COMMANDS
 from conda.exception_handler import ExceptionHandler
 from conda.exceptions import PackagesNotFoundError
-from rich.console import Console
-from rich.prompt import Confirm
 
-from .cli import app
-from .config import AssistantCondaConfig, DebugErrorMode
-from .core import stream_response
-from .prompt_debug_config import prompt_debug_config, config_command_styled
-from .get_clean_error_report_command import get_clean_error_report_command
+if TYPE_CHECKING:
+    from rich.console import Console
+
+    from .config import DebugErrorMode
+
+# conda imports this module for every command, so the assistant, rich and the
+# CLI are only imported once an error is handled or `conda assist` runs.
 
 
 ENV_COMMANDS = {
@@ -40,7 +40,13 @@ BUILD_COMMANDS = {
 
 ALL_COMMANDS = BUILTIN_COMMANDS.union(ENV_COMMANDS, BUILD_COMMANDS)
 
-console = Console()
+
+@lru_cache(maxsize=None)
+def _console() -> "Console":
+    from rich.console import Console
+
+    return Console()
+
 
 ExceptionHandler._orig_print_conda_exception = (  # type: ignore
     ExceptionHandler._print_conda_exception
@@ -48,11 +54,16 @@ ExceptionHandler._orig_print_conda_exception = (  # type: ignore
 
 
 def create_message(
-    debug_mode: DebugErrorMode,
+    debug_mode: "DebugErrorMode",
     prompt: str,
     is_a_tty: bool = True,
     error: str = "",
 ) -> None:
+    from rich.prompt import Confirm
+
+    from .core import stream_response
+    from .prompt_debug_config import prompt_debug_config, config_command_styled
+
     # If we don't have a config option, we ask the user
     if debug_mode is None:
         debug_mode = prompt_debug_config()
@@ -67,7 +78,7 @@ def create_message(
         if should_debug:
             stream_response(error, prompt, is_a_tty=is_a_tty)
         else:
-            console.print(
+            _console().print(
                 "\nOK, goodbye! 👋\n"
                 f"To change default behavior, run {config_command_styled}\n"
             )
@@ -94,7 +105,7 @@ def error_handler(command: str) -> None:
         # the error since it's not really an error, so we just re-throw.
         # This also prevents stack trace from being printed.
         if str(exc_val) == "KeyboardInterrupt":
-            console.print(interrupt_message_styled)
+            _console().print(interrupt_message_styled)
             sys.exit(1)
 
         try:
@@ -103,28 +114,31 @@ def error_handler(command: str) -> None:
                 return
 
             try:
-                config = AssistantCondaConfig()
+                from anaconda_assistant.config import AssistantConfig, load_config
+                from .config import AssistantCondaConfig
+
+                config = load_config(AssistantCondaConfig)
                 if config.debug_error_mode == "off":
                     return
 
                 # If the user has not accepted the terms, we prompt them to do so.
                 # This would tend to happen if the user manually modified the config file.
-                assistant_config = AssistantConfig()
+                assistant_config = load_config(AssistantConfig)
                 if assistant_config.accepted_terms is False:
                     from .prompt_accept_terms import prompt_accept_terms
 
                     if not sys.stdout.isatty():
-                        console.print(
+                        _console().print(
                             "\nYou must accept the terms to use Anaconda Assistant.\n"
                         )
                         return
                     accepted = prompt_accept_terms()
                     if accepted:
-                        console.print(
+                        _console().print(
                             "\nThank you! Run the previous command again to see your change reflected.\n"
                         )
                     else:
-                        console.print(
+                        _console().print(
                             "\n[bold red]You must accept the terms to use Anaconda Assistant.[/bold red]\n"
                         )
                     return
@@ -136,6 +150,10 @@ def error_handler(command: str) -> None:
                 print(repr(e))
                 sys.exit(1)
 
+            from .get_clean_error_report_command import (
+                get_clean_error_report_command,
+            )
+
             report = self.get_error_report(exc_val, exc_tb)
             command = get_clean_error_report_command(report)
             prompt = f"COMMAND:\n{command}\nMESSAGE:\n{report['error']}"
@@ -147,18 +165,24 @@ def error_handler(command: str) -> None:
         # If we're in the conda debug flow, ctrl-c is caught so we don't show stack trace.
         # This also prevents stack trace from being printed.
         except KeyboardInterrupt:
-            console.print(interrupt_message_styled)
+            _console().print(interrupt_message_styled)
             sys.exit(1)
 
     ExceptionHandler._print_conda_exception = assistant_exception_handler  # type: ignore
 
 
+def _assist(args: Any) -> Any:
+    from .cli import app
+
+    return app(args=args)
+
+
 @plugins.hookimpl
 def conda_subcommands() -> Generator[plugins.CondaSubcommand, None, None]:
     yield plugins.CondaSubcommand(
         name="assist",
         summary="Anaconda Assistant integration",
-        action=lambda args: app(args=args),
+        action=_assist,
     )
 
 
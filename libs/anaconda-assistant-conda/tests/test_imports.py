@@ -0,0 +1,46 @@
+import os
+import subprocess
+import sys
+from typing import Set
+
+import anaconda_assistant_conda
+
+DEFERRED_MODULES = [
+    "anaconda_assistant_conda.cli",
+    "anaconda_assistant_conda.config",
+    "anaconda_assistant_conda.core",
+    "anaconda_assistant.core",
+    "anaconda_auth",
+    "anaconda_cli_base",
+    "typer",
+]
+
+
+def _imported_modules(statement: str) -> Set[str]:
+    """Return the names of all modules imported by statement using -X importtime"""
+    src = os.path.dirname(os.path.dirname(anaconda_assistant_conda.__file__))
+    path = os.pathsep.join(filter(None, [src, os.environ.get("PYTHONPATH")]))
+    env = {**os.environ, "PYTHONPATH": path}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        name = line.rsplit("|", 1)[-1].strip()
+        modules.add(name)
+    return modules
+
+
+def test_import_plugin_defers_assistant_modules() -> None:
+    modules = _imported_modules("import anaconda_assistant_conda.plugin")
+
+    assert "anaconda_assistant_conda.plugin" in modules
+    for deferred in DEFERRED_MODULES:
+        assert deferred not in modules
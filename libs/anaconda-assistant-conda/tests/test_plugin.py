@@ -3,7 +3,7 @@ import pytest
 from pytest import MonkeyPatch
 from pytest_mock import MockerFixture
 from anaconda_assistant_conda.plugin import error_handler
-from anaconda_assistant_conda.plugin import AssistantCondaConfig
+from anaconda_assistant_conda.config import AssistantCondaConfig
 from conda.exception_handler import ExceptionHandler
 from conda import CondaError
 from conda.exceptions import PackagesNotFoundError
@@ -1,9 +1,34 @@
+from typing import TYPE_CHECKING, Any, List
+
 try:
     from anaconda_assistant._version import version as __version__
 except ImportError:  # pragma: nocover
     __version__ = "unknown"
 
-
-from anaconda_assistant.core import ChatSession, ChatClient
+if TYPE_CHECKING:
+    from anaconda_assistant.core import ChatSession, ChatClient
 
 __all__ = ["__version__", "ChatSession", "ChatClient"]
+
+# Resolved on first access (PEP 562) so that importing the package does not
+# pay for requests, anaconda_auth and anaconda_cli_base until they are used.
+_LAZY_ATTRIBUTES = {
+    "ChatSession": "anaconda_assistant.core",
+    "ChatClient": "anaconda_assistant.core",
+}
+
+
+def __getattr__(name: str) -> Any:
+    module_name = _LAZY_ATTRIBUTES.get(name)
+    if module_name is None:
+        raise AttributeError(f"module {__name__!r} has no attribute {name!r}")
+
+    from importlib import import_module
+
+    value = getattr(import_module(module_name), name)
+    globals()[name] = value
+    return value
+
+
+def __dir__() -> List[str]:
+    return sorted(set(globals()) | set(__all__))
@@ -1,9 +1,37 @@
+import gzip
 from typing import Optional, Dict, Any, Union
 
 from anaconda_auth.client import BaseClient
+from requests import Response
 
 from anaconda_assistant import __version__ as version
 from anaconda_assistant.config import AssistantConfig
+from anaconda_assistant.config import RequestCompression
+from anaconda_assistant.config import load_config
+from anaconda_assistant.exceptions import AnacondaAssistantError
+from anaconda_assistant.serialization import JSONSerializer
+from anaconda_assistant.serialization import default_json_dumps
+
+
+def _zstd_compress(data: bytes) -> bytes:
+    try:
+        import zstandard
+    except ImportError:
+        raise AnacondaAssistantError(
+            "request_compression = 'zstd' requires the zstandard package to be installed"
+        )
+    return zstandard.ZstdCompressor().compress(data)
+
+
+def compress_body(data: bytes, encoding: str) -> bytes:
+    """Compress a request body with the given Content-Encoding"""
+    if encoding == "gzip":
+        # a low level is enough for JSON and keeps the cost per turn small
+        return gzip.compress(data, compresslevel=5)
+    elif encoding == "zstd":
+        return _zstd_compress(data)
+    else:
+        raise ValueError(f"Unsupported request compression: {encoding}")
 
 
 class APIClient(BaseClient):
@@ -17,9 +45,14 @@ class APIClient(BaseClient):
         client_source: Optional[str] = None,
         ssl_verify: Optional[bool] = None,
         extra_headers: Optional[Union[str, dict]] = None,
+        json_dumps: Optional[JSONSerializer] = None,
+        request_compression: RequestCompression = None,
+        request_compression_threshold: Optional[int] = None,
+        base_uri: Optional[str] = None,
     ):
         super().__init__(
             domain=domain,
+            base_uri=base_uri,
             api_key=api_key,
             ssl_verify=ssl_verify,
             extra_headers=extra_headers,
@@ -30,8 +63,22 @@ class APIClient(BaseClient):
             kwargs["api_version"] = api_version
         if client_source is not None:
             kwargs["client_source"] = client_source
+        if request_compression is not None:
+            kwargs["request_compression"] = request_compression
+        if request_compression_threshold is not None:
+            kwargs["request_compression_threshold"] = request_compression_threshold
+
+        self._config = load_config(AssistantConfig, **kwargs)
+        if self._config.request_compression == "zstd":
+            # fail early rather than on the first large request
+            _zstd_compress(b"")
+        self.json_dumps: JSONSerializer = json_dumps or default_json_dumps
+
+        if self._config.token_refresh and not self.config.api_key:
+            from anaconda_assistant.auth import refreshing_auth
 
-        self._config = AssistantConfig(**kwargs)
+            # reload the login token ahead of expiry instead of on a request
+            self.auth = refreshing_auth(self.config.domain)
 
         self.headers["X-Client-Source"] = self._config.client_source
         self.headers["X-Client-Version"] = version
@@ -42,3 +89,41 @@ class APIClient(BaseClient):
 
         joined = f"{self._base_uri.strip('/')}/api/assistant/{self._config.api_version}/{url.lstrip('/')}"
         return joined
+
+    def request_compression(self, data: bytes) -> Optional[str]:
+        """Return the Content-Encoding to compress this request body with, if any"""
+        encoding = self._config.request_compression
+        if encoding is None or len(data) < self._config.request_compression_threshold:
+            return None
+        return encoding
+
+    def request(
+        self,
+        method: Union[str, bytes],
+        url: Union[str, bytes],
+        *args: Any,
+        **kwargs: Any,
+    ) -> Response:
+        """Send the request
+
+        Any json= body is encoded with self.json_dumps and bytes bodies
+        at or above the configured threshold are compressed."""
+        body = kwargs.pop("json", None)
+        if body is not None:
+            if kwargs.get("data") is not None:
+                raise ValueError("Only one of `json` or `data` may be provided")
+            headers = dict(kwargs.get("headers") or {})
+            headers.setdefault("Content-Type", "application/json")
+            kwargs["headers"] = headers
+            kwargs["data"] = self.json_dumps(body)
+
+        data = kwargs.get("data")
+        encoding = self.request_compression(data) if isinstance(data, bytes) else None
+        if isinstance(data, bytes) and encoding is not None:
+            headers = dict(kwargs.get("headers") or {})
+            if "Content-Encoding" not in headers:
+                headers["Content-Encoding"] = encoding
+                kwargs["headers"] = headers
+                kwargs["data"] = compress_body(data, encoding)
+
+        return super().request(method, url, *args, **kwargs)
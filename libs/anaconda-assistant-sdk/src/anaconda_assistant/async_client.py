@@ -0,0 +1,435 @@
+import asyncio
+import os
+import ssl
+from functools import partial
+from time import monotonic
+from types import TracebackType
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import AsyncGenerator
+from typing import Callable
+from typing import Dict
+from typing import Generator
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Sequence
+from typing import Type
+from typing import Union
+from typing import cast
+from uuid import uuid4
+
+import httpx
+
+from anaconda_assistant.core import DAILY_QUOTA_MESSAGE
+from anaconda_assistant.core import ChatClient
+from anaconda_assistant.core import TokenTrailer
+from anaconda_assistant.core import _log_response
+from anaconda_assistant.exceptions import DailyQuotaExceeded
+from anaconda_assistant.streaming import StopSequences
+
+if TYPE_CHECKING:
+    from requests.auth import AuthBase
+    from anaconda_assistant.api_client import APIClient
+    from anaconda_assistant.streaming import StreamPolicy
+    from anaconda_assistant.telemetry import JSONLSink
+    from anaconda_assistant.templates import PromptTemplate
+
+
+class _RequestsAuth(httpx.Auth):
+    """Authenticate httpx requests with the requests auth of an APIClient
+
+    The requests auth may read the token from the keyring, so on the event
+    loop it runs in a worker thread."""
+
+    def __init__(self, auth: "AuthBase") -> None:
+        self._auth = auth
+
+    def _authorization(self) -> Optional[str]:
+        from requests import PreparedRequest
+
+        prepared = PreparedRequest()
+        prepared.prepare_headers({})
+        self._auth(prepared)
+        return prepared.headers.get("Authorization")
+
+    def auth_flow(
+        self, request: httpx.Request
+    ) -> Generator[httpx.Request, httpx.Response, None]:
+        authorization = self._authorization()
+        if authorization:
+            request.headers["Authorization"] = authorization
+        yield request
+
+    async def async_auth_flow(
+        self, request: httpx.Request
+    ) -> AsyncGenerator[httpx.Request, httpx.Response]:
+        authorization = await asyncio.to_thread(self._authorization)
+        if authorization:
+            request.headers["Authorization"] = authorization
+        yield request
+
+
+def _ssl_verify(api_client: "APIClient") -> Union[ssl.SSLContext, bool]:
+    """The httpx verify argument matching the SSL settings of api_client
+
+    That is the truststore context, ssl_verify of the config, which may be
+    the path to a CA bundle, and the client certificate."""
+    verify: Union[ssl.SSLContext, str, bool]
+    if api_client._ssl is not None:
+        verify = api_client._ssl
+    else:
+        verify = True if api_client.verify is None else api_client.verify
+    if isinstance(verify, str):
+        if os.path.isdir(verify):
+            verify = ssl.create_default_context(capath=verify)
+        else:
+            verify = ssl.create_default_context(cafile=verify)
+
+    cert = api_client.cert
+    if not cert:
+        return verify
+
+    if not isinstance(verify, ssl.SSLContext):
+        context = ssl.create_default_context()
+        if not verify:
+            context.check_hostname = False
+            context.verify_mode = ssl.CERT_NONE
+        verify = context
+    if isinstance(cert, str):
+        verify.load_cert_chain(cert)
+    else:
+        verify.load_cert_chain(*cert)
+    return verify
+
+
+def _proxy_mounts(
+    proxies: Mapping[str, str], verify: Union[ssl.SSLContext, bool]
+) -> Dict[str, httpx.AsyncBaseTransport]:
+    """httpx transports for the requests proxies of an APIClient
+
+    The requests keys are a scheme, "all" or a scheme and host, e.g.
+    "https://example.com", which httpx writes as "https://" and "all://"."""
+    mounts: Dict[str, httpx.AsyncBaseTransport] = {}
+    for key, url in proxies.items():
+        if not url:
+            continue
+        pattern = key if "://" in key else f"{key}://"
+        mounts[pattern] = httpx.AsyncHTTPTransport(proxy=url, verify=verify)
+    return mounts
+
+
+def _requests_error(error: httpx.HTTPError, streaming: bool = False) -> Exception:
+    """Return the requests exception ChatClient raises for the same failure"""
+    from requests import Response
+    from requests import exceptions
+
+    if isinstance(error, httpx.HTTPStatusError):
+        response = Response()
+        response.status_code = error.response.status_code
+        response.reason = error.response.reason_phrase
+        response.headers.update(error.response.headers)
+        response.url = str(error.response.url)
+        response._content = error.response.content
+        return exceptions.HTTPError(str(error), response=response)
+    elif isinstance(error, httpx.TimeoutException):
+        return exceptions.Timeout(str(error))
+    elif streaming:
+        # the connection broke while reading the response
+        return exceptions.ChunkedEncodingError(str(error))
+    return exceptions.ConnectionError(str(error))
+
+
+class AsyncChatResponse:
+    """Process the API response from AsyncChatClient
+
+    The async counterpart of ChatResponse: the response is streamed with
+    .aiter_content() or read with .aread(), after which .message,
+    .tokens_used and .token_limit are available. Chunks are yielded as they
+    arrive from the network. A broken connection raises requests'
+    ChunkedEncodingError or Timeout, like ChatResponse."""
+
+    def __init__(
+        self,
+        response: httpx.Response,
+        message_id: str,
+        on_complete: Optional[Callable[["AsyncChatResponse"], None]] = None,
+    ) -> None:
+        self._response = response
+        self.message_id = message_id
+        self.on_complete = on_complete
+        self._message: Optional[str] = None
+        self.tokens_used: int = 0
+        self.token_limit: int = 0
+        self.first_chunk_time: Optional[float] = None
+
+    @property
+    def message(self) -> str:
+        if self._message is None:
+            raise ValueError("The response has not been read, use `await .aread()`")
+        return self._message
+
+    async def aread(self) -> str:
+        """Read the whole response and return the message"""
+        if self._message is None:
+            async for _ in self.aiter_bytes():
+                ...
+        return self.message
+
+    def _complete(self) -> None:
+        on_complete, self.on_complete = self.on_complete, None
+        if on_complete is not None:
+            on_complete(self)
+
+    async def aclose(self) -> None:
+        """Close the connection without reading the rest of the response"""
+        await self._response.aclose()
+
+    async def _aiter_raw(self) -> AsyncGenerator[bytes, None]:
+        try:
+            async for chunk in self._response.aiter_bytes():
+                yield chunk
+        except httpx.HTTPError as e:
+            raise _requests_error(e, streaming=True) from e
+
+    async def _strip_trailer(self) -> AsyncGenerator[bytes, None]:
+        trailer = TokenTrailer()
+        try:
+            async for chunk in self._aiter_raw():
+                data = trailer.feed(chunk)
+                if data:
+                    yield data
+        finally:
+            await self._response.aclose()
+
+        data = trailer.finish()
+        self.tokens_used = trailer.tokens_used
+        self.token_limit = trailer.token_limit
+        if data:
+            yield data
+
+    async def aiter_bytes(
+        self, stream_policy: Optional["StreamPolicy"] = None
+    ) -> AsyncGenerator[bytes, None]:
+        """Stream the UTF-8 encoded response without decoding it
+
+        The token trailer is removed and every chunk ends on a complete
+        character. Chunks are grouped with stream_policy.acoalesce(), by
+        default they are forwarded as they arrive."""
+        raw = chunks = self._strip_trailer()
+        if stream_policy is not None:
+            chunks = stream_policy.acoalesce(raw)
+
+        parts = []
+        try:
+            async for data in chunks:
+                if self.first_chunk_time is None:
+                    self.first_chunk_time = monotonic()
+                parts.append(data)
+                yield data
+        finally:
+            await chunks.aclose()
+            await raw.aclose()
+
+        self._message = b"".join(parts).decode("utf-8", errors="replace")
+        self._complete()
+
+    async def aiter_content(
+        self, stream_policy: Optional["StreamPolicy"] = None
+    ) -> AsyncGenerator[str, None]:
+        async for chunk in self.aiter_bytes(stream_policy):
+            yield chunk.decode("utf-8", errors="replace")
+
+    async def aiter_until(
+        self, stop: Sequence[str], stream_policy: Optional["StreamPolicy"] = None
+    ) -> AsyncGenerator[str, None]:
+        """Stream the decoded response up to the first of the stop sequences
+
+        See ChatResponse.iter_until."""
+        matcher = StopSequences(stop)
+        chunks = self.aiter_bytes(stream_policy)
+        parts = []
+        async for chunk in chunks:
+            text = matcher.feed(chunk.decode("utf-8", errors="replace"))
+            if text:
+                parts.append(text)
+                yield text
+            if matcher.stopped:
+                # closes the connection
+                await chunks.aclose()
+                self._message = "".join(parts)
+                self._complete()
+                return
+
+        text = matcher.finish()
+        if text:
+            yield text
+
+
+class AsyncChatClient:
+    """Anaconda Assistant client for asyncio
+
+    Requests are sent with httpx on the running event loop, so any number
+    of concurrent requests can be in flight without a thread each. The
+    configuration, terms of service checks, authentication and request
+    bodies are shared with the ChatClient in .sync_client. httpx_kwargs are
+    passed to the httpx.AsyncClient. An existing ChatClient can be provided
+    as client, in which case the other ChatClient arguments are ignored.
+
+    The SSL verification, client certificate and proxies of the APIClient
+    apply to the httpx client too. Setting up the HTTP and auth clients and
+    reading the token from the keyring run in worker threads. Errors are raised as the same
+    exceptions as ChatClient: DailyQuotaExceeded, and requests' HTTPError,
+    ConnectionError and Timeout rather than their httpx equivalents.
+
+    Close the client with `await client.aclose()` or use it as an async
+    context manager."""
+
+    def __init__(
+        self,
+        system_message: Optional[str] = None,
+        example_messages: Optional[List[Dict[str, str]]] = None,
+        domain: Optional[str] = None,
+        api_key: Optional[str] = None,
+        api_version: Optional[str] = None,
+        telemetry: Optional["JSONLSink"] = None,
+        httpx_kwargs: Optional[Dict[str, Any]] = None,
+        client: Optional[ChatClient] = None,
+    ) -> None:
+        if client is None:
+            client = ChatClient(
+                system_message=system_message,
+                example_messages=example_messages,
+                domain=domain,
+                api_key=api_key,
+                api_version=api_version,
+                use_gateway=False,
+                telemetry=telemetry,
+            )
+        self.sync_client = client
+        self.id = self.sync_client.id
+        self._httpx_kwargs = {} if httpx_kwargs is None else httpx_kwargs
+        self._http_client: Optional[httpx.AsyncClient] = None
+        self._user_id: Optional[str] = None
+
+    @property
+    def http_client(self) -> httpx.AsyncClient:
+        """The httpx client, created on first use"""
+        if self._http_client is None:
+            api_client = self.sync_client.api_client
+            verify = _ssl_verify(api_client)
+            kwargs: Dict[str, Any] = {
+                "headers": dict(api_client.headers),
+                "verify": verify,
+                "mounts": _proxy_mounts(api_client.proxies, verify),
+                "auth": _RequestsAuth(cast("AuthBase", api_client.auth)),
+                # completions are streamed for a long time
+                "timeout": httpx.Timeout(600.0, connect=30.0),
+                **self._httpx_kwargs,
+            }
+            self._http_client = httpx.AsyncClient(**kwargs)
+        return self._http_client
+
+    async def _get_user_id(self) -> str:
+        if self._user_id is None:
+            # the account is requested once by the sync auth client
+            self._user_id = await asyncio.to_thread(
+                lambda: self.sync_client.auth_client.email
+            )
+        return self._user_id
+
+    async def completions(
+        self,
+        messages: List[Dict[str, str]],
+        variables: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+        prompt_template: Optional["PromptTemplate"] = None,
+    ) -> AsyncChatResponse:
+        """Return completions from the Anaconda Assistant as an AsyncChatResponse
+
+        See ChatClient.completions for the arguments."""
+        client = self.sync_client
+        # loads the config, creates the auth client and reads the CA bundles
+        api_client = await asyncio.to_thread(lambda: client.api_client)
+        if self._http_client is None:
+            await asyncio.to_thread(lambda: self.http_client)
+        response_message_id = str(uuid4())
+        session_id = self.id if session_id is None else session_id
+
+        body = client._body(
+            messages,
+            variables,
+            session_id,
+            response_message_id,
+            user_id=await self._get_user_id(),
+            custom_prompt=prompt_template is None,
+        )
+        if prompt_template is None:
+            data = api_client.json_dumps(body)
+        else:
+            data = client._encode_body(body, prompt_template, variables)
+
+        headers = {"Content-Type": "application/json"}
+        encoding = api_client.request_compression(data)
+        if encoding is not None:
+            from anaconda_assistant.api_client import compress_body
+
+            headers["Content-Encoding"] = encoding
+            data = compress_body(data, encoding)
+
+        log = None
+        if client.telemetry is not None:
+            log = partial(
+                client._log, messages, session_id, response_message_id, monotonic()
+            )
+
+        try:
+            response = await self._post(
+                api_client.urljoin("/completions"), data, headers
+            )
+        except Exception as e:
+            if log is not None:
+                log(error=e)
+            raise
+
+        return AsyncChatResponse(
+            response,
+            message_id=response_message_id,
+            on_complete=None if log is None else partial(_log_response, log),
+        )
+
+    async def _post(
+        self, url: str, data: bytes, headers: Dict[str, str]
+    ) -> httpx.Response:
+        request = self.http_client.build_request(
+            "POST", url, content=data, headers=headers
+        )
+        try:
+            response = await self.http_client.send(request, stream=True)
+            if not response.is_error:
+                return response
+
+            await response.aread()
+            await response.aclose()
+            if response.status_code == 429:
+                raise DailyQuotaExceeded(DAILY_QUOTA_MESSAGE)
+            response.raise_for_status()
+        except httpx.HTTPError as e:
+            raise _requests_error(e) from e
+        return response
+
+    async def aclose(self) -> None:
+        if self._http_client is not None:
+            await self._http_client.aclose()
+            self._http_client = None
+
+    async def __aenter__(self) -> "AsyncChatClient":
+        return self
+
+    async def __aexit__(
+        self,
+        exc_type: Optional[Type[BaseException]],
+        exc_value: Optional[BaseException],
+        traceback: Optional[TracebackType],
+    ) -> None:
+        await self.aclose()
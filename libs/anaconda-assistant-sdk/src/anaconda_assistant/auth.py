@@ -0,0 +1,144 @@
+from threading import Lock
+from threading import Timer
+from time import time
+from typing import Dict
+from typing import Optional
+
+from requests import PreparedRequest
+from requests.auth import AuthBase
+
+
+def token_expiry(token: str) -> Optional[float]:
+    """Return the expiry of a JWT as a timestamp or None if it does not expire"""
+    import jwt
+
+    try:
+        claims = jwt.decode(token, options={"verify_signature": False})
+    except jwt.InvalidTokenError:
+        return None
+
+    exp = claims.get("exp")
+    return None if exp is None else float(exp)
+
+
+class RefreshingBearerAuth(AuthBase):
+    """Bearer auth with the login token reloaded from the keyring ahead of its expiry
+
+    anaconda_auth loads the token from the keyring on the first request of
+    every client and never reloads it, so a long-running service keeps
+    using it even after a new `anaconda login`. Here the token is loaded
+    once, reused by every request, and reloaded from the keyring starting
+    refresh_margin seconds before it expires on a background timer, so a
+    token renewed by logging in again is picked up without a restart and
+    requests never wait for the keyring.
+
+    The token itself is not renewed. Once it has expired the timer stops
+    and requests raise TokenExpiredError until a reload finds a new one.
+
+    Reloads are single-flight: when many requests find the token expired
+    only one of them reloads it and the others use the result. A token
+    that is still expired after a reload is not reloaded again for
+    min_interval seconds."""
+
+    def __init__(
+        self,
+        domain: str,
+        refresh_margin: float = 300.0,
+        min_interval: float = 30.0,
+    ) -> None:
+        self.domain = domain
+        self.refresh_margin = refresh_margin
+        self.min_interval = min_interval
+
+        self._token: Optional[str] = None
+        self._expires_at: Optional[float] = None
+        self._loaded_at: Optional[float] = None
+        self._lock = Lock()
+        self._timer: Optional[Timer] = None
+
+    @property
+    def token(self) -> Optional[str]:
+        return self._token
+
+    def _expired(self) -> bool:
+        return self._expires_at is not None and self._expires_at <= time()
+
+    def _load(self) -> None:
+        from anaconda_auth.token import TokenInfo
+        from anaconda_auth.exceptions import TokenNotFoundError
+
+        try:
+            token = TokenInfo.load(self.domain).api_key
+        except TokenNotFoundError:
+            token = None
+
+        self._token = token
+        self._expires_at = None if token is None else token_expiry(token)
+        self._loaded_at = time()
+
+    def _schedule(self) -> None:
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if self._expires_at is None or self._expired():
+            # nothing left to refresh ahead of, requests reload on demand
+            return
+
+        delay = max(self._expires_at - self.refresh_margin - time(), self.min_interval)
+        self._timer = Timer(delay, self.refresh, kwargs={"force": True})
+        self._timer.daemon = True
+        self._timer.start()
+
+    def refresh(self, force: bool = False) -> Optional[str]:
+        """Reload the token if it is missing or expired, or always with force"""
+        stale = self._token
+        with self._lock:
+            if self._token is not stale:
+                # reloaded by another thread while waiting for the lock
+                return self._token
+
+            recently = (
+                self._loaded_at is not None
+                and time() - self._loaded_at < self.min_interval
+            )
+            if not force and (recently or (stale is not None and not self._expired())):
+                return self._token
+
+            self._load()
+            self._schedule()
+            return self._token
+
+    def close(self) -> None:
+        """Stop the background reloads"""
+        with self._lock:
+            if self._timer is not None:
+                self._timer.cancel()
+                self._timer = None
+
+    def __call__(self, r: PreparedRequest) -> PreparedRequest:
+        token = self._token
+        if token is None or self._expired():
+            token = self.refresh()
+            if token is not None and self._expired():
+                from anaconda_auth.exceptions import TokenExpiredError
+
+                raise TokenExpiredError(
+                    "Your login token has expired. Please login again using\n"
+                    "  anaconda login --force"
+                )
+        if token:
+            r.headers["Authorization"] = f"Bearer {token}"
+        return r
+
+
+_AUTHS: Dict[str, RefreshingBearerAuth] = {}
+_AUTHS_LOCK = Lock()
+
+
+def refreshing_auth(domain: str) -> RefreshingBearerAuth:
+    """Return the auth shared by all clients of this domain"""
+    with _AUTHS_LOCK:
+        auth = _AUTHS.get(domain)
+        if auth is None:
+            auth = _AUTHS[domain] = RefreshingBearerAuth(domain)
+        return auth
@@ -1,9 +1,113 @@
-from typing import Optional
+import os
+from threading import Lock
+from typing import Any, Dict, Literal, Optional, Tuple, Type, TypeVar
+
 from anaconda_cli_base.config import AnacondaBaseSettings
+from anaconda_cli_base.config import anaconda_config_path
+from anaconda_cli_base.exceptions import AnacondaConfigTomlSyntaxError
+from pydantic_settings import BaseSettings
+from pydantic_settings import PydanticBaseSettingsSource
+from pydantic_settings import PyprojectTomlConfigSettingsSource
+
+RequestCompression = Optional[Literal["gzip", "zstd"]]
+
+
+class AssistantBaseSettings(AnacondaBaseSettings):
+    """Settings that read config.toml every time they are instantiated
+
+    AnacondaBaseSettings keeps the parsed config.toml for the life of the
+    process. Settings deriving from this class read the file afresh instead,
+    load_config() takes care of only re-creating them when it has changed."""
+
+    @classmethod
+    def settings_customise_sources(
+        cls,
+        settings_cls: Type[BaseSettings],
+        init_settings: PydanticBaseSettingsSource,
+        env_settings: PydanticBaseSettingsSource,
+        dotenv_settings: PydanticBaseSettingsSource,
+        file_secret_settings: PydanticBaseSettingsSource,
+    ) -> Tuple[PydanticBaseSettingsSource, ...]:
+        config_toml = anaconda_config_path()
+        try:
+            toml_settings = PyprojectTomlConfigSettingsSource(settings_cls, config_toml)
+        except ValueError as e:
+            raise AnacondaConfigTomlSyntaxError(f"{config_toml}: {e}") from e
+        return (
+            init_settings,
+            env_settings,
+            file_secret_settings,
+            dotenv_settings,
+            toml_settings,
+        )
 
 
-class AssistantConfig(AnacondaBaseSettings, plugin_name="assistant"):
+class AssistantConfig(AssistantBaseSettings, plugin_name="assistant"):
     client_source: str = "anaconda-cli-prod"
     api_version: str = "v3"
     accepted_terms: Optional[bool] = None
     data_collection: Optional[bool] = None
+    request_compression: RequestCompression = None
+    request_compression_threshold: int = 16384
+    use_gateway: bool = False
+    gateway_socket: Optional[str] = None
+    telemetry_path: Optional[str] = None
+    token_refresh: bool = False
+
+
+SettingsT = TypeVar("SettingsT", bound=AnacondaBaseSettings)
+
+# (config class, init kwargs) -> (fingerprint of the config sources, instance)
+_CONFIG_CACHE: Dict[Tuple[Any, ...], Tuple[Tuple[Any, ...], Any]] = {}
+_CONFIG_CACHE_LOCK = Lock()
+
+
+def _stat(path: str) -> Optional[Tuple[int, int]]:
+    try:
+        st = os.stat(path)
+    except OSError:
+        return None
+    return st.st_mtime_ns, st.st_size
+
+
+def _sources_fingerprint() -> Tuple[Any, ...]:
+    """Identify the state of everything the settings are loaded from
+
+    That is the config.toml file, the ANACONDA_ environment variables
+    and the .env file in the current directory."""
+    config_toml = str(anaconda_config_path())
+    env = tuple(
+        sorted((k, v) for k, v in os.environ.items() if k.startswith("ANACONDA_"))
+    )
+    dotenv = os.path.join(os.getcwd(), ".env")
+    return config_toml, _stat(config_toml), env, dotenv, _stat(dotenv)
+
+
+def load_config(config_class: Type[SettingsT], **kwargs: Any) -> SettingsT:
+    """Return a cached instance of config_class
+
+    The instance is re-created when config.toml is modified, an ANACONDA_
+    environment variable changes or different kwargs are given. Changes to
+    config.toml are only seen by subclasses of AssistantBaseSettings. The returned
+    object is shared between callers and must be treated as read-only."""
+    try:
+        key = (config_class, tuple(sorted(kwargs.items())))
+        hash(key)
+    except TypeError:
+        return config_class(**kwargs)
+
+    fingerprint = _sources_fingerprint()
+    with _CONFIG_CACHE_LOCK:
+        cached = _CONFIG_CACHE.get(key)
+        if cached is not None and cached[0] == fingerprint:
+            return cached[1]
+
+        config = config_class(**kwargs)
+        _CONFIG_CACHE[key] = (fingerprint, config)
+        return config
+
+
+def clear_config_cache() -> None:
+    """Drop all cached config instances loaded with load_config()"""
+    with _CONFIG_CACHE_LOCK:
+        _CONFIG_CACHE.clear()
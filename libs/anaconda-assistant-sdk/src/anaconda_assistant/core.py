@@ -1,53 +1,173 @@
+import asyncio
 import json
 import os
 import re
+from contextlib import contextmanager
+from datetime import datetime
+from datetime import timezone
+from functools import partial
 from textwrap import dedent
+from threading import Lock
+from threading import get_ident
+from time import monotonic
+from typing import TYPE_CHECKING
 from typing import Any
+from typing import AsyncGenerator
+from typing import Callable
 from typing import Generator
+from typing import Iterable
+from typing import Iterator
 from typing import Optional
 from typing import List
+from typing import Sequence
 from typing import Dict
+from typing import Tuple
 from typing import Union
 from uuid import uuid4
+from weakref import WeakKeyDictionary
+from weakref import finalize
 
-from requests import Response
-from requests.exceptions import HTTPError
-
-from anaconda_cli_base.config import anaconda_config_path
-from anaconda_auth.client import BaseClient as AuthClient
-from anaconda_assistant.api_client import APIClient
 from anaconda_assistant.exceptions import NotAcceptedTermsError
 from anaconda_assistant.exceptions import UnspecifiedAcceptedTermsError
 from anaconda_assistant.exceptions import UnspecifiedDataCollectionChoice
 from anaconda_assistant.exceptions import DailyQuotaExceeded
+from anaconda_assistant.streaming import DEFAULT_STREAM_POLICY
+from anaconda_assistant.streaming import StopSequences
+from anaconda_assistant.streaming import StreamPolicy
+
+# requests, anaconda_auth and anaconda_cli_base are imported where they are
+# first needed to keep `import anaconda_assistant` fast
+if TYPE_CHECKING:
+    from requests import Response
+    from anaconda_auth.client import BaseClient as AuthClient
+    from anaconda_assistant.api_client import APIClient
+    from anaconda_assistant.async_client import AsyncChatResponse
+    from anaconda_assistant.gateway import GatewayClient
+    from anaconda_assistant.telemetry import JSONLSink
+    from anaconda_assistant.scheduler import RequestScheduler
+    from anaconda_assistant.templates import PromptTemplate
 
 TOKEN_COUNT = re.compile(
     r"(?P<message>.*)__TOKENS_(?P<used>[0-9]+)\/(?P<limit>[0-9]+)__", re.DOTALL
 )
 
+TOKENS_MARKER = b"__TOKENS_"
+TOKENS_TRAILER = re.compile(rb"__TOKENS_(?P<used>[0-9]+)/(?P<limit>[0-9]+)__")
+# matches anything that may still grow into a complete trailer
+TOKENS_TRAILER_PREFIX = re.compile(rb"__TOKENS_(?:[0-9]+(?:/(?:[0-9]+(?:__?)?)?)?)?")
+
+DAILY_QUOTA_MESSAGE = (
+    "You have reached your request limit. Please try again in 24 hours.\n"
+    "Or visit https://anaconda.com/app/profile/subscriptions to upgrade your account"
+)
+
 HERE = os.path.dirname(__file__)
 
 
+def _incomplete_utf8(data: bytes) -> int:
+    """Return the number of trailing bytes of an incomplete UTF-8 character"""
+    for size in range(1, min(4, len(data)) + 1):
+        byte = data[-size]
+        if byte < 0x80:
+            return 0
+        if byte >= 0xC0:
+            expected = 2 if byte < 0xE0 else 3 if byte < 0xF0 else 4
+            return size if expected > size else 0
+    return 0
+
+
+class TokenTrailer:
+    """Strip the token count trailer from a stream of bytes
+
+    Each chunk passed to .feed() returns the bytes that can be forwarded
+    immediately. Anything that could be the start of the trailer or of a
+    multi-byte UTF-8 character is held back until the next chunk so that the
+    forwarded chunks always end on a complete character. Call .finish()
+    once the stream is exhausted to parse the trailer."""
+
+    def __init__(self) -> None:
+        self._pending = b""
+        self.tokens_used: int = 0
+        self.token_limit: int = 0
+
+    def feed(self, chunk: bytes) -> bytes:
+        data = self._pending + chunk if self._pending else chunk
+
+        start = 0
+        while True:
+            idx = data.find(TOKENS_MARKER, start)
+            if idx == -1:
+                break
+            if TOKENS_TRAILER_PREFIX.fullmatch(data, idx):
+                self._pending = data[idx:]
+                return data[:idx]
+            start = idx + 1
+
+        held = _incomplete_utf8(data)
+        for size in range(len(TOKENS_MARKER) - 1, 0, -1):
+            if data.endswith(TOKENS_MARKER[:size]):
+                held = size
+                break
+
+        if held:
+            self._pending = data[-held:]
+            return data[:-held]
+
+        self._pending = b""
+        return data
+
+    def finish(self) -> bytes:
+        data, self._pending = self._pending, b""
+        matched = TOKENS_TRAILER.fullmatch(data)
+        if matched is None:
+            return data
+
+        self.tokens_used = int(matched["used"])
+        self.token_limit = int(matched["limit"])
+        return b""
+
+
 class ChatResponse:
     """Process the API response from ChatClient
 
     The response currently includes tokens used and
     token limit at the end of the response text. Methods
     here capture this extra metadata and filter it out from
-    the response text."""
+    the response text.
 
-    def __init__(self, response: Response) -> None:
+    on_complete is called with the response once it has been consumed and
+    release once it has been consumed, closed or garbage collected."""
+
+    def __init__(
+        self,
+        response: "Response",
+        message_id: Optional[str] = None,
+        stream_policy: Optional[StreamPolicy] = None,
+        on_complete: Optional[Callable[["ChatResponse"], None]] = None,
+        release: Optional[Callable[[], None]] = None,
+    ) -> None:
         self._response = response
+        self._message_id = message_id
+        self.stream_policy = stream_policy or DEFAULT_STREAM_POLICY
+        self.on_complete = on_complete
+        self._release = None if release is None else finalize(self, release)
         self._message: Optional[str] = None
         self.tokens_used: int = 0
         self.token_limit: int = 0
+        self.first_chunk_time: Optional[float] = None
 
     @property
     def message_id(self) -> str:
-        if self._response.request.body is None:
-            raise ValueError("The chat response from the API is malformed.")
+        if self._message_id is None:
+            if self._response.request.body is None:
+                raise ValueError("The chat response from the API is malformed.")
 
-        return json.loads(self._response.request.body)["response_message_id"]
+            # only responses built without a message_id need to parse the request body
+            self._message_id = json.loads(self._response.request.body)[
+                "response_message_id"
+            ]
+
+        return self._message_id
 
     def _match_tokens(self, text: str) -> Dict[str, Any]:
         matched = re.match(TOKEN_COUNT, text)
@@ -67,23 +187,129 @@ class ChatResponse:
 
         return self._message
 
-    def iter_content(
-        self, chunk_size: int = 256, decode_unicode: bool = True
-    ) -> Generator[str, None, None]:
-        message = ""
+    def _complete(self) -> None:
+        on_complete, self.on_complete = self.on_complete, None
+        if on_complete is not None:
+            on_complete(self)
+
+    def close(self) -> None:
+        """Close the connection without reading the rest of the response"""
+        self._response.close()
+        if self._release is not None:
+            self._release()
+
+    def _strip_trailer(self, chunk_size: int) -> Generator[bytes, None, None]:
+        trailer = TokenTrailer()
         for chunk in self._response.iter_content(
-            chunk_size=chunk_size, decode_unicode=decode_unicode
+            chunk_size=chunk_size, decode_unicode=False
         ):
-            matched = self._match_tokens(chunk)
+            data = trailer.feed(chunk)
+            if data:
+                yield data
 
-            if matched.get("used"):
-                self.tokens_used = int(matched["used"])
-                self.token_limit = int(matched["limit"])
+        data = trailer.finish()
+        self.tokens_used = trailer.tokens_used
+        self.token_limit = trailer.token_limit
+        if data:
+            yield data
 
-            message += matched["message"]
-            yield matched["message"]
+    def iter_bytes(
+        self,
+        chunk_size: Optional[int] = None,
+        stream_policy: Optional[StreamPolicy] = None,
+    ) -> Generator[bytes, None, None]:
+        """Stream the UTF-8 encoded response without decoding it
+
+        The token trailer is removed and every chunk ends on a complete
+        character, so chunks can be forwarded as-is, e.g. by a proxy.
+        Chunks are grouped according to stream_policy, which defaults to
+        the policy this response was created with."""
+        policy = stream_policy or self.stream_policy
+        if chunk_size is None:
+            chunk_size = policy.chunk_size
+
+        parts = []
+        try:
+            for data in policy.coalesce(self._strip_trailer(chunk_size)):
+                if self.first_chunk_time is None:
+                    self.first_chunk_time = monotonic()
+                parts.append(data)
+                yield data
+        finally:
+            if self._release is not None:
+                self._release()
+
+        self._message = b"".join(parts).decode("utf-8", errors="replace")
+        self._complete()
 
-        self._message = message
+    def iter_content(
+        self,
+        chunk_size: Optional[int] = None,
+        decode_unicode: bool = True,
+        stream_policy: Optional[StreamPolicy] = None,
+    ) -> Generator[str, None, None]:
+        chunks = self.iter_bytes(chunk_size=chunk_size, stream_policy=stream_policy)
+        if not decode_unicode:
+            yield from chunks  # type: ignore[misc]
+            return
+
+        for chunk in chunks:
+            yield chunk.decode("utf-8", errors="replace")
+
+    def iter_until(
+        self,
+        stop: Sequence[str],
+        stream_policy: Optional[StreamPolicy] = None,
+    ) -> Generator[str, None, None]:
+        """Stream the decoded response up to the first of the stop sequences
+
+        The stop sequence is not included. The connection is closed as soon
+        as one is found without reading the rest of the response, which
+        leaves tokens_used and token_limit at 0. Afterwards .message is the
+        text up to the stop sequence."""
+        matcher = StopSequences(stop)
+        chunks = self.iter_content(stream_policy=stream_policy)
+        parts = []
+        for chunk in chunks:
+            text = matcher.feed(chunk)
+            if text:
+                parts.append(text)
+                yield text
+            if matcher.stopped:
+                chunks.close()
+                self.close()
+                self._message = "".join(parts)
+                self._complete()
+                return
+
+        text = matcher.finish()
+        if text:
+            yield text
+
+    def iter_json(
+        self,
+        schema: Optional[Any] = None,
+        stream_policy: Optional[StreamPolicy] = None,
+    ) -> Generator[Any, None, None]:
+        """Stream the elements of a JSON array, or the (key, value) members of
+        a JSON object, as soon as each one is complete
+
+        Text around the JSON, like a markdown code fence, is ignored. When
+        schema is given each element is validated as that type, e.g. a
+        pydantic model. StructuredOutputError is raised if the response does
+        not contain complete and valid JSON."""
+        from anaconda_assistant.structured import JSONStreamParser
+
+        parser = JSONStreamParser(schema=schema)
+        if self._message is not None:
+            chunks: Iterator[str] = iter([self._message])
+        else:
+            chunks = self.iter_content(stream_policy=stream_policy)
+
+        # the whole response is read to collect the message and token count
+        for chunk in chunks:
+            yield from parser.feed(chunk)
+        parser.finish()
 
     def iter_lines(
         self,
@@ -92,19 +318,34 @@ class ChatResponse:
         delimiter: Optional[str] = None,
     ) -> Generator[str, None, None]:
         message = ""
-        for chunk in self._response.iter_lines(
-            chunk_size=chunk_size, decode_unicode=decode_unicode, delimiter=delimiter
-        ):
-            matched = self._match_tokens(chunk)
+        try:
+            for chunk in self._response.iter_lines(
+                chunk_size=chunk_size,
+                decode_unicode=decode_unicode,
+                delimiter=delimiter,
+            ):
+                matched = self._match_tokens(chunk)
+
+                if matched.get("used"):
+                    self.tokens_used = matched["used"]
+                    self.token_limit = matched["limit"]
+
+                if self.first_chunk_time is None:
+                    self.first_chunk_time = monotonic()
+                message += matched["message"]
+                yield matched["message"]
+        finally:
+            if self._release is not None:
+                self._release()
 
-            if matched.get("used"):
-                self.tokens_used = matched["used"]
-                self.token_limit = matched["limit"]
+        self._message = message
+        self._complete()
 
-            message += matched["message"]
-            yield matched["message"]
 
-        self._message = message
+def _log_response(
+    log: Callable[..., None], response: Union[ChatResponse, "AsyncChatResponse"]
+) -> None:
+    log(response=response)
 
 
 class ChatClient:
@@ -115,17 +356,41 @@ class ChatClient:
         domain: Optional[str] = None,
         api_key: Optional[str] = None,
         api_version: Optional[str] = None,
+        stream_policy: Optional[StreamPolicy] = None,
+        use_gateway: Optional[bool] = None,
+        telemetry: Optional["JSONLSink"] = None,
+        scheduler: Optional["RequestScheduler"] = None,
     ) -> None:
         """Anaconda Assistant Client
 
-        This class facilitates requesting completions for a given list of messages"""
+        This class facilitates requesting completions for a given list of messages.
+        stream_policy sets how the responses are chunked when streamed.
 
-        self.api_client: APIClient = APIClient(
-            domain=domain, api_key=api_key, api_version=api_version
-        )
-        self.auth_client: AuthClient = AuthClient(api_key=api_key)
+        With use_gateway, or use_gateway set in the config, requests are sent
+        through a running local gateway (see anaconda_assistant.gateway) and
+        the HTTP and auth clients are not created.
+
+        Each request is recorded to telemetry, a local JSONLSink, or to the
+        telemetry_path set in the config. Prompts and responses are only
+        recorded when data collection is enabled.
+
+        A RequestScheduler, which may be shared by many clients, limits the
+        number of concurrent requests by priority."""
+        from anaconda_cli_base.config import anaconda_config_path
+        from anaconda_assistant.config import AssistantConfig
+        from anaconda_assistant.config import load_config
 
-        if self.api_client._config.accepted_terms is None:
+        self._domain = domain
+        self._api_key = api_key
+        self._api_version = api_version
+        self._api_client: Optional["APIClient"] = None
+        self._auth_client: Optional["AuthClient"] = None
+        self._clients_lock = Lock()
+
+        kwargs = {} if api_version is None else {"api_version": api_version}
+        config = load_config(AssistantConfig, **kwargs)
+
+        if config.accepted_terms is None:
             msg = dedent(
                 f"""\
                 You have not accepted the terms of service.
@@ -139,12 +404,12 @@ class ChatClient:
                 """
             )
             raise UnspecifiedAcceptedTermsError(msg)
-        elif not self.api_client._config.accepted_terms:
+        elif not config.accepted_terms:
             raise NotAcceptedTermsError(
                 f"You have declined our Terms of Service and Privacy Policy in {anaconda_config_path()}"
             )
 
-        if self.api_client._config.data_collection is None:
+        if config.data_collection is None:
             msg = dedent(
                 f"""\
                 You have not declared to opt-in or opt-out of data collection. Please set this configuration in
@@ -165,22 +430,65 @@ class ChatClient:
 
         self.system_message = system_message
         self.example_messages = example_messages
-        self.skip_logging = not self.api_client._config.data_collection
+        self.stream_policy = stream_policy
+        self.skip_logging = not config.data_collection
 
-    def completions(
-        self,
-        messages: List[Dict[str, str]],
-        variables: Optional[Dict[str, Any]] = None,
-    ) -> ChatResponse:
-        """Return completions from the Anaconda Assistant as a ChatResponse type"""
+        self.gateway: Optional["GatewayClient"] = None
+        if use_gateway is None:
+            use_gateway = config.use_gateway
+        if use_gateway:
+            from anaconda_assistant.gateway import GatewayClient
 
-        response_message_id = str(uuid4())
+            self.gateway = GatewayClient.discover(config)
+
+        if telemetry is None and config.telemetry_path:
+            from anaconda_assistant.telemetry import get_sink
 
-        body = {
+            telemetry = get_sink(config.telemetry_path)
+        self.telemetry = telemetry
+        self.scheduler = scheduler
+
+    @property
+    def api_client(self) -> "APIClient":
+        """The HTTP client, created on first use"""
+        if self._api_client is None:
+            from anaconda_assistant.api_client import APIClient
+
+            with self._clients_lock:
+                if self._api_client is None:
+                    self._api_client = APIClient(
+                        domain=self._domain,
+                        api_key=self._api_key,
+                        api_version=self._api_version,
+                    )
+        return self._api_client
+
+    @property
+    def auth_client(self) -> "AuthClient":
+        """The anaconda_auth client, created on first use"""
+        if self._auth_client is None:
+            from anaconda_auth.client import BaseClient as AuthClient
+
+            with self._clients_lock:
+                if self._auth_client is None:
+                    self._auth_client = AuthClient(api_key=self._api_key)
+        return self._auth_client
+
+    def _body(
+        self,
+        messages: List[Dict[str, str]],
+        variables: Optional[Dict[str, Any]],
+        session_id: Optional[str],
+        response_message_id: str,
+        user_id: Optional[str],
+        prompt_template: Optional["PromptTemplate"] = None,
+        custom_prompt: bool = True,
+    ) -> Dict[str, Any]:
+        body: Dict[str, Any] = {
             "skip_logging": self.skip_logging,
             "session": {
-                "session_id": self.id,
-                "user_id": self.auth_client.email,
+                "session_id": self.id if session_id is None else session_id,
+                "user_id": user_id,
                 "iteration_id": 1,
             },
             "chat_context": {
@@ -191,13 +499,49 @@ class ChatClient:
             "response_message_id": response_message_id,
         }
 
-        if self.system_message:
+        if not custom_prompt:
+            return body
+
+        if prompt_template is not None:
+            prompt = prompt_template.custom_prompt(variables)
+            if prompt is not None:
+                body["custom_prompt"] = prompt
+        elif self.system_message:
             body["custom_prompt"] = {
                 "system_message": {"role": "system", "content": self.system_message},
                 "example_messages": self.example_messages,
             }
+        return body
 
-        response = self.api_client.post("/completions", json=body, stream=True)
+    def _encode_body(
+        self,
+        body: Dict[str, Any],
+        prompt_template: "PromptTemplate",
+        variables: Optional[Dict[str, Any]],
+    ) -> bytes:
+        """Serialize the body, splicing in the cached custom_prompt of the template"""
+        json_dumps = self.api_client.json_dumps
+        encoded = json_dumps(body)
+        custom_prompt = prompt_template.encoded_custom_prompt(json_dumps, variables)
+        if custom_prompt is None:
+            return encoded
+        return b"".join([encoded[:-1], b',"custom_prompt":', custom_prompt, b"}"])
+
+    def _post(self, body: Union[Dict[str, Any], bytes]) -> "Response":
+        """Send the completions request and raise for any error status
+
+        The body is either a dict or the already serialized JSON."""
+        from requests.exceptions import HTTPError
+
+        if isinstance(body, bytes):
+            response = self.api_client.post(
+                "/completions",
+                data=body,
+                headers={"Content-Type": "application/json"},
+                stream=True,
+            )
+        else:
+            response = self.api_client.post("/completions", json=body, stream=True)
         response.encoding = "utf-8"
         try:
             response.raise_for_status()
@@ -211,15 +555,196 @@ class ChatClient:
             e.args = (f"{e.args[0]}. {msg}",)
 
             if e.response.status_code == 429:
-                raise DailyQuotaExceeded(
-                    "You have reached your request limit. Please try again in 24 hours.\n"
-                    "Or visit https://anaconda.com/app/profile/subscriptions to upgrade your account"
+                raise DailyQuotaExceeded(DAILY_QUOTA_MESSAGE)
+
+            raise
+
+        return response
+
+    def _log(
+        self,
+        messages: List[Dict[str, str]],
+        session_id: str,
+        message_id: str,
+        started: float,
+        response: Union[ChatResponse, "AsyncChatResponse", None] = None,
+        error: Optional[Exception] = None,
+    ) -> None:
+        assert self.telemetry is not None
+        finished = monotonic()
+        first_chunk = None if response is None else response.first_chunk_time
+
+        record: Dict[str, Any] = {
+            "timestamp": datetime.now(timezone.utc).isoformat(),
+            "session_id": session_id,
+            "message_id": message_id,
+            "status": "ok" if error is None else "error",
+            "latency_ms": None
+            if first_chunk is None
+            else (first_chunk - started) * 1000,
+            "duration_ms": (finished - started) * 1000,
+            "tokens_used": None if response is None else response.tokens_used,
+            "token_limit": None if response is None else response.token_limit,
+        }
+        if error is not None:
+            record["error"] = f"{type(error).__name__}: {error}"
+        if not self.skip_logging:
+            record["messages"] = list(messages)
+            record["response"] = None if response is None else response._message
+
+        self.telemetry.emit(record)
+
+    def _send(
+        self,
+        messages: List[Dict[str, str]],
+        variables: Optional[Dict[str, Any]],
+        session_id: Optional[str],
+        response_message_id: str,
+        prompt_template: Optional["PromptTemplate"] = None,
+    ) -> "Response":
+        response = None
+        if self.gateway is not None:
+            # the gateway fills in the user_id of its own auth client
+            body = self._body(
+                messages,
+                variables,
+                session_id,
+                response_message_id,
+                user_id=None,
+                prompt_template=prompt_template,
+            )
+            response = self.gateway.completions(
+                body,
+                domain=self._domain,
+                api_key=self._api_key,
+                api_version=self._api_version,
+            )
+            if response is None:
+                # the gateway has stopped, stop trying it
+                self.gateway = None
+
+        if response is None:
+            user_id = self.auth_client.email
+            if prompt_template is None:
+                body = self._body(
+                    messages, variables, session_id, response_message_id, user_id
+                )
+                response = self._post(body)
+            else:
+                body = self._body(
+                    messages,
+                    variables,
+                    session_id,
+                    response_message_id,
+                    user_id,
+                    # spliced in already serialized by _encode_body
+                    custom_prompt=False,
+                )
+                response = self._post(
+                    self._encode_body(body, prompt_template, variables)
                 )
 
+        return response
+
+    def completions(
+        self,
+        messages: List[Dict[str, str]],
+        variables: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+        prompt_template: Optional["PromptTemplate"] = None,
+        priority: Optional[int] = None,
+    ) -> ChatResponse:
+        """Return completions from the Anaconda Assistant as a ChatResponse type
+
+        The session_id of the client is used unless another one is given,
+        which allows many chat sessions to share one client.
+
+        A prompt_template replaces the system and example messages of the
+        client, its templates are rendered with variables.
+
+        With a scheduler the request waits for a slot of its priority,
+        Priority.NORMAL by default, which is held until the response has
+        been consumed or closed."""
+        response_message_id = str(uuid4())
+        session_id = self.id if session_id is None else session_id
+
+        release = None
+        if self.scheduler is not None:
+            from anaconda_assistant.scheduler import Priority
+
+            release = self.scheduler.acquire(
+                Priority.NORMAL if priority is None else priority
+            )
+
+        log = None
+        if self.telemetry is not None:
+            log = partial(
+                self._log, messages, session_id, response_message_id, monotonic()
+            )
+
+        try:
+            response = self._send(
+                messages, variables, session_id, response_message_id, prompt_template
+            )
+        except Exception as e:
+            if release is not None:
+                release()
+            if log is not None:
+                log(error=e)
             raise
 
-        cp = ChatResponse(response)
-        return cp
+        return ChatResponse(
+            response,
+            message_id=response_message_id,
+            stream_policy=self.stream_policy,
+            on_complete=None if log is None else partial(_log_response, log),
+            release=release,
+        )
+
+    def batch(
+        self,
+        requests: Iterable[List[Dict[str, str]]],
+        variables: Optional[Dict[str, Any]] = None,
+        prompt_template: Optional["PromptTemplate"] = None,
+        priority: Optional[int] = None,
+        max_workers: int = 4,
+        return_exceptions: bool = False,
+        stop: Optional[Sequence[str]] = None,
+    ) -> List[Union[ChatResponse, Exception]]:
+        """Request completions for many lists of messages concurrently
+
+        The responses are returned fully read and in the order of requests.
+        Each request gets its own session id. The requests have
+        Priority.LOW by default so that they do not hold back interactive
+        requests sharing the scheduler. With return_exceptions the
+        exception of a failed request is returned in its place instead of
+        being raised. With stop sequences each response is only read up to
+        the first of them, see ChatResponse.iter_until."""
+        from concurrent.futures import ThreadPoolExecutor
+        from anaconda_assistant.scheduler import Priority
+
+        def complete(messages: List[Dict[str, str]]) -> Union[ChatResponse, Exception]:
+            try:
+                response = self.completions(
+                    messages,
+                    variables=variables,
+                    session_id=str(uuid4()),
+                    prompt_template=prompt_template,
+                    priority=Priority.LOW if priority is None else priority,
+                )
+                if stop:
+                    for _ in response.iter_until(stop):
+                        ...
+                else:
+                    response.message
+            except Exception as e:
+                if not return_exceptions:
+                    raise
+                return e
+            return response
+
+        with ThreadPoolExecutor(max_workers=max_workers) as executor:
+            return list(executor.map(complete, requests))
 
 
 class ChatSession:
@@ -238,15 +763,30 @@ class ChatSession:
         domain: Optional[str] = None,
         api_key: Optional[str] = None,
         api_version: Optional[str] = None,
+        stream_policy: Optional[StreamPolicy] = None,
+        client: Optional[ChatClient] = None,
     ) -> None:
-        self.client = ChatClient(
-            system_message=system_message,
-            domain=domain,
-            api_key=api_key,
-            api_version=api_version,
-        )
+        """An existing ChatClient can be provided as client, in which
+        case the other arguments are ignored."""
+        if client is None:
+            client = ChatClient(
+                system_message=system_message,
+                domain=domain,
+                api_key=api_key,
+                api_version=api_version,
+                stream_policy=stream_policy,
+            )
+            self.id: str = client.id
+        else:
+            self.id = str(uuid4())
+        self.client = client
         self.messages: list = []
         self.usage: dict = {"tokens_used": 0, "token_limit": 0}
+        # turns are serialized by _lock, async tasks first wait for their
+        # turn on a lock of their event loop instead of in a worker thread
+        self._lock = Lock()
+        self._turn_owner: Optional[int] = None
+        self._async_locks: "WeakKeyDictionary[asyncio.AbstractEventLoop, asyncio.Lock]" = WeakKeyDictionary()
 
     def reset(self) -> None:
         """Reset chat history
@@ -254,25 +794,30 @@ class ChatSession:
         This will remove all input messages and responses and
         create a new chat session id."""
 
-        self.id: str = str(uuid4())
-        self.messages = []
-        self.usage = {"tokens_used": 0, "token_limit": 0}
+        with self._turn():
+            self.id = str(uuid4())
+            self.messages = []
+            self.usage = {"tokens_used": 0, "token_limit": 0}
+
+    @contextmanager
+    def _turn(self, check_owner: bool = True) -> Iterator[None]:
+        """Hold the session lock for one turn of the conversation"""
+        if check_owner and self._turn_owner == get_ident():
+            raise RuntimeError(
+                "The previous streamed response of this session must be "
+                "consumed or closed before starting a new turn"
+            )
 
-    def _stream(self, response: ChatResponse) -> Generator[str, None, None]:
-        """Stream and save the response"""
-        yield from response.iter_content()
-        self.messages.append(
-            {
-                "role": "assistant",
-                "content": response.message,
-                "message_id": response.message_id,
-            }
-        )
-        self.usage["tokens_used"] = response.tokens_used
-        self.usage["token_limit"] = response.token_limit
+        with self._lock:
+            self._turn_owner = get_ident() if check_owner else None
+            try:
+                yield
+            finally:
+                self._turn_owner = None
 
-    def _text(self, response: ChatResponse) -> str:
-        """Save and return the response"""
+    def _save(self, this_message: dict, response: ChatResponse) -> None:
+        """Save the user message and the response"""
+        self.messages.append(this_message)
         self.messages.append(
             {
                 "role": "assistant",
@@ -282,20 +827,112 @@ class ChatSession:
         )
         self.usage["tokens_used"] = response.tokens_used
         self.usage["token_limit"] = response.token_limit
-        return response.message
 
-    def chat(
-        self, message: str, stream: bool = False
-    ) -> Union[str, Generator[str, None, None]]:
-        """Chat with the Assistant appending your current message to the stack"""
+    def _request(self, message: str) -> Tuple[dict, ChatResponse]:
         this_message = {"role": "user", "content": message, "message_id": str(uuid4())}
 
         messages = self.messages + [this_message]
-        response = self.client.completions(messages)
+        response = self.client.completions(messages, session_id=self.id)
+        return this_message, response
 
-        self.messages.append(this_message)
+    def _stream(
+        self,
+        message: str,
+        stream_policy: Optional[StreamPolicy] = None,
+        check_owner: bool = True,
+    ) -> Generator[str, None, None]:
+        """Send the request and return a generator streaming and saving the response
+
+        Errors from the request are raised here rather than on the first
+        iteration of the returned generator."""
+        chunks = self._stream_turn(message, stream_policy, check_owner)
+        next(chunks)
+        return chunks
+
+    def _stream_turn(
+        self,
+        message: str,
+        stream_policy: Optional[StreamPolicy],
+        check_owner: bool,
+    ) -> Generator[str, None, None]:
+        with self._turn(check_owner=check_owner):
+            this_message, response = self._request(message)
+            # _stream() resumes from here once the request has succeeded
+            yield ""
+            yield from response.iter_content(stream_policy=stream_policy)
+            self._save(this_message, response)
+
+    def _text(self, message: str) -> str:
+        """Request, save and return the response"""
+        with self._turn():
+            this_message, response = self._request(message)
+            text = response.message
+            self._save(this_message, response)
+        return text
+
+    def chat(
+        self,
+        message: str,
+        stream: bool = False,
+        stream_policy: Optional[StreamPolicy] = None,
+    ) -> Union[str, Generator[str, None, None]]:
+        """Chat with the Assistant appending your current message to the stack
+
+        Turns are serialized per session, so a session can be shared
+        between threads. A streamed turn sends the request before returning
+        and holds the session until the response is exhausted or the
+        generator is closed. The message and response are saved once the
+        response is complete.
+
+        When streaming, stream_policy overrides the policy of the session for
+        this message."""
 
         if stream:
-            return self._stream(response)
+            return self._stream(message, stream_policy=stream_policy)
         else:
-            return self._text(response)
+            return self._text(message)
+
+    def _async_lock(self) -> asyncio.Lock:
+        loop = asyncio.get_running_loop()
+        lock = self._async_locks.get(loop)
+        if lock is None:
+            lock = self._async_locks[loop] = asyncio.Lock()
+        return lock
+
+    async def achat(
+        self,
+        message: str,
+        stream: bool = False,
+        stream_policy: Optional[StreamPolicy] = None,
+    ) -> Union[str, AsyncGenerator[str, None]]:
+        """Async version of .chat()
+
+        Tasks wait for their turn on the event loop and the request runs in a
+        worker thread, so neither blocks the event loop."""
+        if stream:
+            chunks = self._astream(message, stream_policy=stream_policy)
+            await chunks.__anext__()
+            return chunks
+        else:
+            async with self._async_lock():
+                return await asyncio.to_thread(self._text, message)
+
+    async def _astream(
+        self, message: str, stream_policy: Optional[StreamPolicy] = None
+    ) -> AsyncGenerator[str, None]:
+        async with self._async_lock():
+            # the generator moves between worker threads, so the owner check
+            # that prevents a thread waiting for its own turn does not apply
+            chunks = await asyncio.to_thread(
+                self._stream, message, stream_policy, False
+            )
+            # achat() resumes from here once the request has succeeded
+            yield ""
+            try:
+                while True:
+                    chunk = await asyncio.to_thread(next, chunks, None)
+                    if chunk is None:
+                        break
+                    yield chunk
+            finally:
+                await asyncio.to_thread(chunks.close)
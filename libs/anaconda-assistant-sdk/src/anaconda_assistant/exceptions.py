@@ -11,3 +11,6 @@ class UnspecifiedDataCollectionChoice(AnacondaAssistantError): ...
 
 
 class DailyQuotaExceeded(AnacondaAssistantError): ...
+
+
+class StructuredOutputError(AnacondaAssistantError): ...
@@ -0,0 +1,322 @@
+import argparse
+import os
+import socket
+import socketserver
+import struct
+from typing import TYPE_CHECKING
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Optional
+
+from anaconda_assistant.exceptions import AnacondaAssistantError
+from anaconda_assistant.exceptions import DailyQuotaExceeded
+from anaconda_assistant.serialization import default_json_dumps
+from anaconda_assistant.serialization import json_loads
+
+if TYPE_CHECKING:
+    from requests import Response
+    from anaconda_assistant.config import AssistantConfig
+    from anaconda_assistant.pool import SessionPool
+
+# Protocol: the client sends one line of JSON with the completions request
+# body and the client settings. The gateway answers with one line of JSON
+# holding the status. A successful response body follows in frames, each a
+# 4-byte big-endian length and that many bytes. An empty frame ends the body
+# and is followed by one line of JSON with the final status, so the client
+# can tell a complete response from one that failed upstream.
+
+_FRAME_HEADER = struct.Struct("!I")
+
+
+def gateway_socket_path(config: "AssistantConfig") -> str:
+    """Return the path of the gateway socket for this configuration"""
+    if config.gateway_socket:
+        return os.path.expandvars(os.path.expanduser(config.gateway_socket))
+
+    from anaconda_cli_base.config import anaconda_config_path
+
+    return str(anaconda_config_path().parent / "assistant-gateway.sock")
+
+
+def _read_status(line: bytes) -> Dict[str, Any]:
+    try:
+        status = json_loads(line)
+        if not isinstance(status["status"], int):
+            raise TypeError("status is not an integer")
+    except (ValueError, KeyError, TypeError) as e:
+        raise AnacondaAssistantError(
+            f"Malformed status from the gateway: {line!r}"
+        ) from e
+    return status
+
+
+class _SocketStream:
+    """Return the framed response body as soon as it is available
+
+    requests reads the response body with .read(chunk_size), which on a
+    buffered socket file would wait for chunk_size bytes. An incomplete
+    body or a failure reported in the final status is raised as
+    ChunkedEncodingError, like a broken response of a direct connection."""
+
+    def __init__(self, stream: Any) -> None:
+        self._stream = stream
+        self._remaining = 0
+        self._done = False
+
+    def _incomplete(self, message: str) -> Exception:
+        from requests.exceptions import ChunkedEncodingError
+
+        return ChunkedEncodingError(message)
+
+    def read(self, size: int = -1) -> bytes:
+        if self._remaining == 0:
+            if self._done:
+                return b""
+            header = self._stream.read(_FRAME_HEADER.size)
+            if len(header) < _FRAME_HEADER.size:
+                raise self._incomplete(
+                    "The gateway closed the connection before the response was complete"
+                )
+            (self._remaining,) = _FRAME_HEADER.unpack(header)
+            if self._remaining == 0:
+                self._done = True
+                status = _read_status(self._stream.readline())
+                if status["status"] != 200:
+                    raise self._incomplete(f"{status['error']}: {status['message']}")
+                return b""
+
+        if size is None or size < 0:
+            size = self._remaining
+        data = self._stream.read1(min(size, self._remaining))
+        if not data:
+            raise self._incomplete(
+                "The gateway closed the connection before the response was complete"
+            )
+        self._remaining -= len(data)
+        return data
+
+    def close(self) -> None:
+        self._stream.close()
+
+
+class GatewayClient:
+    """Send completions requests through a local gateway"""
+
+    def __init__(self, socket_path: str) -> None:
+        self.socket_path = socket_path
+
+    @classmethod
+    def discover(cls, config: "AssistantConfig") -> Optional["GatewayClient"]:
+        """Return a client if a gateway socket exists for this configuration"""
+        if not hasattr(socket, "AF_UNIX"):
+            return None
+
+        path = gateway_socket_path(config)
+        if not os.path.exists(path):
+            return None
+        return cls(path)
+
+    def completions(
+        self,
+        body: Dict[str, Any],
+        domain: Optional[str] = None,
+        api_key: Optional[str] = None,
+        api_version: Optional[str] = None,
+    ) -> Optional["Response"]:
+        """Send the request body and return the streamed response
+
+        None is returned when the gateway cannot be reached, errors
+        reported by the gateway are raised."""
+        from requests import Response
+        from requests.exceptions import HTTPError
+
+        request = {
+            "body": body,
+            "client": {
+                "domain": domain,
+                "api_key": api_key,
+                "api_version": api_version,
+            },
+        }
+
+        try:
+            sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                sock.connect(self.socket_path)
+                sock.sendall(default_json_dumps(request) + b"\n")
+                # the file keeps the connection open after the socket is closed
+                stream = sock.makefile("rb")
+            finally:
+                sock.close()
+            status_line = stream.readline()
+        except OSError:
+            return None
+
+        if not status_line:
+            stream.close()
+            return None
+
+        try:
+            status = _read_status(status_line)
+        except AnacondaAssistantError:
+            stream.close()
+            raise
+
+        if status["status"] != 200:
+            stream.close()
+            if status["error"] == "DailyQuotaExceeded":
+                raise DailyQuotaExceeded(status["message"])
+            elif status["error"] == "HTTPError":
+                error_response = Response()
+                error_response.status_code = status["status"]
+                error_response.url = f"unix://{self.socket_path}"
+                error_response._content = status["message"].encode("utf-8")
+                raise HTTPError(status["message"], response=error_response)
+            raise AnacondaAssistantError(status["message"])
+
+        response = Response()
+        response.status_code = 200
+        response.reason = "OK"
+        response.encoding = "utf-8"
+        response.url = f"unix://{self.socket_path}"
+        response.raw = _SocketStream(stream)
+        return response
+
+
+class _GatewayHandler(socketserver.StreamRequestHandler):
+    server: "GatewayServer"
+
+    def _write_status(self, status: int, error: str = "", message: str = "") -> None:
+        line = {"status": status, "error": error, "message": message}
+        self.wfile.write(default_json_dumps(line) + b"\n")
+
+    def _write_frame(self, data: bytes) -> None:
+        self.wfile.write(_FRAME_HEADER.pack(len(data)) + data)
+
+    def _write_body(self, response: "Response") -> None:
+        chunks = response.iter_content(
+            chunk_size=self.server.chunk_size, decode_unicode=False
+        )
+        while True:
+            try:
+                chunk = next(chunks, None)
+            except Exception as e:
+                # tell the client the body is incomplete
+                self._write_frame(b"")
+                self._write_status(502, type(e).__name__, str(e))
+                return
+            if chunk is None:
+                break
+            if chunk:
+                self._write_frame(chunk)
+        self._write_frame(b"")
+        self._write_status(200)
+
+    def handle(self) -> None:
+        from requests.exceptions import HTTPError
+
+        line = self.rfile.readline()
+        if not line:
+            return
+
+        try:
+            request = json_loads(line)
+            client = self.server.pool.client(**request["client"])
+            body = request["body"]
+            body["session"]["user_id"] = client.auth_client.email
+            response = client._post(body)
+        except DailyQuotaExceeded as e:
+            self._write_status(429, "DailyQuotaExceeded", str(e))
+            return
+        except HTTPError as e:
+            status = 502 if e.response is None else e.response.status_code
+            self._write_status(status, "HTTPError", str(e))
+            return
+        except Exception as e:
+            self._write_status(500, type(e).__name__, str(e))
+            return
+
+        try:
+            self._write_status(200)
+            self._write_body(response)
+        except (BrokenPipeError, ConnectionResetError):
+            # the client went away
+            pass
+        finally:
+            response.close()
+
+
+class GatewayServer(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+    """A local daemon sending completions requests for many processes
+
+    The gateway keeps one ChatClient per credential in a SessionPool, so
+    its config, authentication and HTTP connections are reused by every
+    short-lived process that sends its requests through the socket.
+
+    The socket is only accessible to the user running the gateway."""
+
+    daemon_threads = True
+
+    def __init__(
+        self,
+        socket_path: str,
+        pool: Optional["SessionPool"] = None,
+        chunk_size: int = 256,
+    ) -> None:
+        from anaconda_assistant.pool import SessionPool
+
+        self.socket_path = socket_path
+        self.pool = SessionPool(use_gateway=False) if pool is None else pool
+        self.chunk_size = chunk_size
+
+        if os.path.exists(socket_path):
+            probe = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+            try:
+                probe.connect(socket_path)
+            except OSError:
+                # left behind by a gateway that did not shut down cleanly
+                os.unlink(socket_path)
+            else:
+                raise AnacondaAssistantError(
+                    f"A gateway is already running on {socket_path}"
+                )
+            finally:
+                probe.close()
+
+        umask = os.umask(0o177)
+        try:
+            super().__init__(socket_path, _GatewayHandler)
+        finally:
+            os.umask(umask)
+
+    def server_close(self) -> None:
+        super().server_close()
+        try:
+            os.unlink(self.socket_path)
+        except FileNotFoundError:
+            pass
+
+
+def main(argv: Optional[List[str]] = None) -> None:
+    from anaconda_assistant.config import AssistantConfig
+    from anaconda_assistant.config import load_config
+
+    parser = argparse.ArgumentParser(
+        prog="python -m anaconda_assistant.gateway",
+        description="Run a local Anaconda Assistant gateway shared by all processes of this user",
+    )
+    parser.add_argument("--socket", help="Path of the Unix socket to listen on")
+    args = parser.parse_args(argv)
+
+    socket_path = args.socket or gateway_socket_path(load_config(AssistantConfig))
+    with GatewayServer(socket_path) as server:
+        print(f"Anaconda Assistant gateway listening on {socket_path}")
+        try:
+            server.serve_forever()
+        except KeyboardInterrupt:
+            pass
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,6 @@
+from threading import Lock
 from uuid import uuid4
-from typing import Callable, Any, List, Optional, Dict, Tuple
+from typing import Callable, Any, List, Optional, Dict, Tuple, Union
 from warnings import warn
 
 import ell
@@ -8,12 +9,63 @@ from ell.types import Message, ContentBlock
 from ell.types._lstr import _lstr
 
 from anaconda_assistant.core import ChatClient, ChatResponse
+from anaconda_assistant.pool import SessionPool
+
+# models registered with the same settings share one ChatClient
+_pool = SessionPool()
+
+
+class AnacondaAssistantClient:
+    """The client of an ell model, which creates its ChatClient on the first call
+
+    Registering a model does not load the config, authenticate or check
+    the terms of service. The ChatClient is taken from pool, so every
+    model registered with the same settings uses the same connections."""
+
+    def __init__(
+        self,
+        system_message: Optional[str] = None,
+        domain: Optional[str] = None,
+        api_key: Optional[str] = None,
+        api_version: Optional[str] = None,
+        pool: Optional[SessionPool] = None,
+    ) -> None:
+        self.system_message = system_message
+        self.domain = domain
+        self.api_key = api_key
+        self.api_version = api_version
+        self.pool = _pool if pool is None else pool
+        self._client: Optional[ChatClient] = None
+        self._lock = Lock()
+
+    @property
+    def client(self) -> ChatClient:
+        if self._client is None:
+            with self._lock:
+                if self._client is None:
+                    self._client = self.pool.client(
+                        system_message=self.system_message,
+                        domain=self.domain,
+                        api_key=self.api_key,
+                        api_version=self.api_version,
+                    )
+        return self._client
+
+    def completions(
+        self,
+        messages: List[Dict[str, str]],
+        variables: Optional[Dict[str, Any]] = None,
+        session_id: Optional[str] = None,
+    ) -> ChatResponse:
+        return self.client.completions(
+            messages, variables=variables, session_id=session_id
+        )
 
 
 class AnacondaAssistantProvider(Provider):
     def provider_call_function(
         self,
-        client: ChatClient,
+        client: Union[ChatClient, AnacondaAssistantClient],
         api_call_params: Optional[Dict[str, Any]] = None,
     ) -> Callable[..., Any]:
         return client.completions
@@ -84,12 +136,29 @@ def format_messages(message: Message) -> Dict[str, Any]:
     return converse_message
 
 
+def register_model(
+    name: str = "anaconda-assistant",
+    system_message: Optional[str] = None,
+    domain: Optional[str] = None,
+    api_key: Optional[str] = None,
+    api_version: Optional[str] = None,
+) -> AnacondaAssistantClient:
+    """Register an ell model name whose calls are sent with these settings
+
+    The client is created when the model is first called."""
+    client = AnacondaAssistantClient(
+        system_message=system_message,
+        domain=domain,
+        api_key=api_key,
+        api_version=api_version,
+    )
+    ell.config.register_model(name=name, default_client=client, supports_streaming=True)
+    return client
+
+
 anaconda_assistant_provider = AnacondaAssistantProvider()
 
 ell.register_provider(anaconda_assistant_provider, ChatClient)
+ell.register_provider(anaconda_assistant_provider, AnacondaAssistantClient)
 
-client = ChatClient()
-
-ell.config.register_model(
-    name="anaconda-assistant", default_client=client, supports_streaming=True
-)
+client = register_model()
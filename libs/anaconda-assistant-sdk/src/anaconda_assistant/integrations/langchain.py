@@ -1,24 +1,55 @@
+import asyncio
+from collections.abc import AsyncIterator
 from collections.abc import Iterator
+from collections.abc import Sequence
+from threading import Lock
 from typing import Any
 from typing import Dict
 from typing import List
 from typing import Optional
+from typing import Set
+from typing import Union
 from typing import cast
 from uuid import uuid4
+from weakref import WeakKeyDictionary
 
+from langchain_core.caches import BaseCache
+from langchain_core.callbacks.manager import AsyncCallbackManager
+from langchain_core.callbacks.manager import AsyncCallbackManagerForLLMRun
+from langchain_core.callbacks.manager import CallbackManager
 from langchain_core.callbacks.manager import CallbackManagerForLLMRun
+from langchain_core.globals import get_llm_cache
 from langchain_core.language_models import BaseChatModel
+from langchain_core.language_models import LanguageModelInput
+from langchain_core.load import dumpd
 from langchain_core.messages import AIMessage, AIMessageChunk
 from langchain_core.messages import BaseMessage
 from langchain_core.messages import ChatMessage
 from langchain_core.messages import HumanMessage
 from langchain_core.messages import SystemMessage
+from langchain_core.messages.ai import UsageMetadata
 from langchain_core.outputs import ChatGenerationChunk, ChatResult
 from langchain_core.outputs import ChatGeneration
+from langchain_core.outputs import LLMResult
+from langchain_core.runnables import RunnableConfig
+from langchain_core.runnables.config import get_config_list
+from pydantic import PrivateAttr
+from pydantic import SecretStr
 
+from anaconda_assistant.async_client import AsyncChatClient
+from anaconda_assistant.async_client import AsyncChatResponse
 from anaconda_assistant.core import ChatClient
+from anaconda_assistant.core import ChatResponse
+from anaconda_assistant.scheduler import RequestScheduler
+from anaconda_assistant.streaming import StreamPolicy
 
 SUPPORTED_ROLES: List[str] = ["user", "assistant", "system"]
+MODEL_NAME = "anaconda-assistant"
+
+# call keyword arguments .batch() and .abatch() send with every request,
+# others, e.g. session_id for .batch(), use the per-input path of BaseChatModel
+_BATCH_KWARGS = {"stop", "variables", "prompt_template", "priority"}
+_ABATCH_KWARGS = {"stop", "variables", "prompt_template", "session_id"}
 
 
 def _convert_message_to_dict(message: BaseMessage) -> Dict:
@@ -46,11 +77,296 @@ def _format_messages(messages: List[BaseMessage]) -> List[dict]:
     return chat_messages
 
 
+def _llm_output(response: Union[ChatResponse, AsyncChatResponse]) -> Dict[str, Any]:
+    return {
+        "model_name": MODEL_NAME,
+        "tokens_used": response.tokens_used,
+        "token_limit": response.token_limit,
+    }
+
+
+def _usage_metadata(
+    response: Union[ChatResponse, AsyncChatResponse],
+) -> Optional[UsageMetadata]:
+    """The token count of the response trailer
+
+    The API reports a single count, which is used as the output tokens.
+    Input tokens are not reported, UsageMetadata requires the field so it
+    is always 0. None is returned when the response was closed before the
+    trailer."""
+    if not response.token_limit:
+        return None
+    return UsageMetadata(
+        input_tokens=0,
+        output_tokens=response.tokens_used,
+        total_tokens=response.tokens_used,
+    )
+
+
+def _usage_chunk(
+    response: Union[ChatResponse, AsyncChatResponse],
+) -> Optional[ChatGenerationChunk]:
+    """The last chunk of a stream, sent once the trailer has been read"""
+    usage_metadata = _usage_metadata(response)
+    if usage_metadata is None:
+        return None
+    llm_output = _llm_output(response)
+    return ChatGenerationChunk(
+        message=AIMessageChunk(
+            content="", usage_metadata=usage_metadata, response_metadata=llm_output
+        ),
+        generation_info=llm_output,
+    )
+
+
+def _chat_result(response: Union[ChatResponse, AsyncChatResponse]) -> ChatResult:
+    """Convert a response, reading the rest of it first"""
+    # the token count is only known once the message has been read
+    content = response.message
+    llm_output = _llm_output(response)
+    message = AIMessage(
+        content=content,
+        response_metadata=llm_output,
+        usage_metadata=_usage_metadata(response),
+    )
+    return ChatResult(
+        generations=[ChatGeneration(message=message)],
+        llm_output=llm_output,
+    )
+
+
+def _llm_result(result: ChatResult) -> LLMResult:
+    return LLMResult(
+        generations=[list(result.generations)], llm_output=result.llm_output
+    )
+
+
 class AnacondaAssistant(BaseChatModel):
+    """LangChain chat model of the Anaconda Assistant
+
+    The client is created on first use from the fields below and reused
+    by every call of the model. Keyword arguments of a call, e.g.
+    session_id or variables, are passed to ChatClient.completions.
+    stream_policy groups the chunks of .stream() and .astream().
+
+    .batch() and .abatch() send at most max_concurrency requests at once,
+    or fewer when the max_concurrency of the config is lower. Give models
+    that share a quota the same scheduler to bound the combined concurrency
+    of their .batch() calls, batch requests have Priority.LOW. .abatch()
+    runs on the event loop and does not use the scheduler. With an LLM
+    cache or a rate_limiter, or keyword arguments they cannot send with
+    every request, they fall back to the BaseChatModel implementation,
+    which calls .invoke() for each input."""
+
+    domain: Optional[str] = None
+    api_key: Optional[SecretStr] = None
+    api_version: Optional[str] = None
+    system_message: Optional[str] = None
+    max_concurrency: int = 4
+    scheduler: Optional[RequestScheduler] = None
+    stream_policy: Optional[StreamPolicy] = None
+
+    _client: Optional[ChatClient] = PrivateAttr(default=None)
+    _client_lock: Lock = PrivateAttr(default_factory=Lock)
+    # httpx clients are bound to the event loop they were first used on
+    _async_clients: "WeakKeyDictionary[asyncio.AbstractEventLoop, AsyncChatClient]" = (
+        PrivateAttr(default_factory=WeakKeyDictionary)
+    )
+
     @property
     def _llm_type(self) -> str:
         """Returns the type of LLM."""
-        return "anaconda-assistant"
+        return MODEL_NAME
+
+    @property
+    def _identifying_params(self) -> Dict[str, Any]:
+        return {"domain": self.domain, "api_version": self.api_version}
+
+    @property
+    def client(self) -> ChatClient:
+        """The ChatClient, created on first use"""
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = ChatClient(
+                        system_message=self.system_message,
+                        domain=self.domain,
+                        api_key=(
+                            None
+                            if self.api_key is None
+                            else self.api_key.get_secret_value()
+                        ),
+                        api_version=self.api_version,
+                        scheduler=self.scheduler,
+                        stream_policy=self.stream_policy,
+                    )
+        return self._client
+
+    @property
+    def async_client(self) -> AsyncChatClient:
+        """The AsyncChatClient of the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncChatClient(client=self.client)
+            self._async_clients[loop] = client
+        return client
+
+    def _batch_messages(
+        self, inputs: Sequence[LanguageModelInput]
+    ) -> List[List[BaseMessage]]:
+        return [self._convert_input(input).to_messages() for input in inputs]
+
+    def _native_batch(self, kwargs: Dict[str, Any], supported: Set[str]) -> bool:
+        """Whether the batch can skip the cache and rate limiter of BaseChatModel"""
+        if not kwargs.keys() <= supported or self.rate_limiter is not None:
+            return False
+        if isinstance(self.cache, BaseCache):
+            return False
+        return self.cache is False or get_llm_cache() is None
+
+    def _max_concurrency(self, configs: List[RunnableConfig]) -> int:
+        """The concurrency of a batch, like LangChain read from the first config"""
+        limit = configs[0].get("max_concurrency") or self.max_concurrency
+        return min(limit, self.max_concurrency)
+
+    def batch(
+        self,
+        inputs: List[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> List[Any]:
+        """Request completions for all inputs with ChatClient.batch"""
+        if not inputs:
+            return []
+        if not self._native_batch(kwargs, _BATCH_KWARGS):
+            return super().batch(
+                inputs, config, return_exceptions=return_exceptions, **kwargs
+            )
+
+        message_lists = self._batch_messages(inputs)
+        configs = get_config_list(config, len(inputs))
+        run_managers = [
+            CallbackManager.configure(
+                c.get("callbacks"),
+                self.callbacks,
+                self.verbose,
+                c.get("tags"),
+                self.tags,
+                c.get("metadata"),
+                self.metadata,
+            ).on_chat_model_start(
+                dumpd(self),
+                [messages],
+                invocation_params=self._get_invocation_params(**kwargs),
+                name=c.get("run_name"),
+                run_id=c.get("run_id"),
+                batch_size=len(inputs),
+            )[0]
+            for c, messages in zip(configs, message_lists)
+        ]
+
+        try:
+            responses = self.client.batch(
+                [_format_messages(messages) for messages in message_lists],
+                max_workers=self._max_concurrency(configs),
+                return_exceptions=True,
+                **kwargs,
+            )
+        except BaseException as e:
+            for run_manager in run_managers:
+                run_manager.on_llm_error(e)
+            raise
+
+        outputs: List[Any] = []
+        for run_manager, response in zip(run_managers, responses):
+            if isinstance(response, Exception):
+                run_manager.on_llm_error(response)
+                outputs.append(response)
+                continue
+            result = _chat_result(response)
+            run_manager.on_llm_end(_llm_result(result))
+            outputs.append(result.generations[0].message)
+
+        if not return_exceptions:
+            for output in outputs:
+                if isinstance(output, Exception):
+                    raise output
+        return outputs
+
+    async def abatch(
+        self,
+        inputs: List[LanguageModelInput],
+        config: Optional[Union[RunnableConfig, List[RunnableConfig]]] = None,
+        *,
+        return_exceptions: bool = False,
+        **kwargs: Any,
+    ) -> List[Any]:
+        """Request completions for all inputs on the event loop
+
+        At most max_concurrency requests are in flight at once, the
+        scheduler is not used. Each request gets its own session id unless
+        session_id is given."""
+        if not inputs:
+            return []
+        if not self._native_batch(kwargs, _ABATCH_KWARGS):
+            return await super().abatch(
+                inputs, config, return_exceptions=return_exceptions, **kwargs
+            )
+
+        kwargs = dict(kwargs)
+        stop = kwargs.pop("stop", None)
+        configs = get_config_list(config, len(inputs))
+        semaphore = asyncio.Semaphore(self._max_concurrency(configs))
+
+        async def complete(
+            messages: List[BaseMessage], config: RunnableConfig
+        ) -> BaseMessage:
+            callback_manager = AsyncCallbackManager.configure(
+                config.get("callbacks"),
+                self.callbacks,
+                self.verbose,
+                config.get("tags"),
+                self.tags,
+                config.get("metadata"),
+                self.metadata,
+            )
+            (run_manager,) = await callback_manager.on_chat_model_start(
+                dumpd(self),
+                [messages],
+                invocation_params=self._get_invocation_params(stop=stop, **kwargs),
+                name=config.get("run_name"),
+                run_id=config.get("run_id"),
+                batch_size=len(inputs),
+            )
+            request_kwargs = dict(kwargs)
+            request_kwargs.setdefault("session_id", str(uuid4()))
+            try:
+                async with semaphore:
+                    response = await self.async_client.completions(
+                        _format_messages(messages), **request_kwargs
+                    )
+                    if stop:
+                        async for _ in response.aiter_until(stop):
+                            ...
+                    else:
+                        await response.aread()
+            except BaseException as e:
+                await run_manager.on_llm_error(e)
+                raise
+            result = _chat_result(response)
+            await run_manager.on_llm_end(_llm_result(result))
+            return result.generations[0].message
+
+        return await asyncio.gather(
+            *(
+                complete(messages, c)
+                for messages, c in zip(self._batch_messages(inputs), configs)
+            ),
+            return_exceptions=return_exceptions,
+        )
 
     def _generate(
         self,
@@ -59,20 +375,12 @@ class AnacondaAssistant(BaseChatModel):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> ChatResult:
-        client = ChatClient(**kwargs)
-
         payload = _format_messages(messages)
-        response = client.completions(messages=payload)
-
-        content = response.message
-        llm_output = {
-            "tokens_used": response.tokens_used,
-            "token_limit": response.token_limit,
-        }
-        return ChatResult(
-            generations=[ChatGeneration(message=AIMessage(content=content))],
-            llm_output=llm_output,
-        )
+        response = self.client.completions(messages=payload, **kwargs)
+        if stop:
+            for _ in response.iter_until(stop):
+                ...
+        return _chat_result(response)
 
     def _stream(
         self,
@@ -81,26 +389,65 @@ class AnacondaAssistant(BaseChatModel):
         run_manager: Optional[CallbackManagerForLLMRun] = None,
         **kwargs: Any,
     ) -> Iterator[ChatGenerationChunk]:
-        client = ChatClient(**kwargs)
-
         payload = _format_messages(messages)
-        response = client.completions(messages=payload)
-
-        for delta in response.iter_content():
-            if response.tokens_used:
-                response_metadata = {
-                    "tokens_used": response.tokens_used,
-                    "token_limit": response.token_limit,
-                }
-            else:
-                response_metadata = {}
-
-            chunk = ChatGenerationChunk(
-                message=AIMessageChunk(
-                    content=delta,
-                ),
-                generation_info=response_metadata,
-            )
+        response = self.client.completions(messages=payload, **kwargs)
+        policy = self.stream_policy
+        if stop:
+            deltas = response.iter_until(stop, stream_policy=policy)
+        else:
+            deltas = response.iter_content(stream_policy=policy)
+
+        for delta in deltas:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=delta))
             if run_manager is not None:
                 run_manager.on_llm_new_token(token=delta, chunk=chunk)
             yield chunk
+
+        usage_chunk = _usage_chunk(response)
+        if usage_chunk is not None:
+            if run_manager is not None:
+                run_manager.on_llm_new_token(token="", chunk=usage_chunk)
+            yield usage_chunk
+
+    async def _agenerate(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> ChatResult:
+        payload = _format_messages(messages)
+        response = await self.async_client.completions(messages=payload, **kwargs)
+        if stop:
+            async for _ in response.aiter_until(stop):
+                ...
+        else:
+            await response.aread()
+        return _chat_result(response)
+
+    async def _astream(
+        self,
+        messages: List[BaseMessage],
+        stop: Optional[List[str]] = None,
+        run_manager: Optional[AsyncCallbackManagerForLLMRun] = None,
+        **kwargs: Any,
+    ) -> AsyncIterator[ChatGenerationChunk]:
+        payload = _format_messages(messages)
+        response = await self.async_client.completions(messages=payload, **kwargs)
+        policy = self.stream_policy
+        if stop:
+            deltas = response.aiter_until(stop, stream_policy=policy)
+        else:
+            deltas = response.aiter_content(stream_policy=policy)
+
+        async for delta in deltas:
+            chunk = ChatGenerationChunk(message=AIMessageChunk(content=delta))
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(token=delta, chunk=chunk)
+            yield chunk
+
+        usage_chunk = _usage_chunk(response)
+        if usage_chunk is not None:
+            if run_manager is not None:
+                await run_manager.on_llm_new_token(token="", chunk=usage_chunk)
+            yield usage_chunk
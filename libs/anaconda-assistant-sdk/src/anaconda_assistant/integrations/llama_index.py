@@ -1,18 +1,33 @@
-from typing import Any, Dict, Optional, Sequence, List, cast
+import asyncio
+from abc import abstractmethod
+from typing import Any, AsyncGenerator, ClassVar, Dict, Iterator, Optional, Sequence
+from typing import List, cast
+from weakref import WeakKeyDictionary
 
 from llama_index.core.llms.custom import CustomLLM
 from llama_index.core.base.llms.types import (
     ChatMessage,
+    ChatResponse as LlamaChatResponse,
+    ChatResponseAsyncGen,
+    ChatResponseGen,
     CompletionResponse,
+    CompletionResponseAsyncGen,
     CompletionResponseGen,
     LLMMetadata,
     MessageRole,
 )
 
 from llama_index.core.callbacks import CallbackManager
+from llama_index.core.llms.callbacks import llm_chat_callback
 from llama_index.core.llms.callbacks import llm_completion_callback
+from pydantic import BaseModel
+from pydantic import PrivateAttr
+from pydantic import SerializerFunctionWrapHandler
+from pydantic import model_serializer
 
+from anaconda_assistant.async_client import AsyncChatClient, AsyncChatResponse
 from anaconda_assistant.core import ChatClient, ChatResponse
+from anaconda_assistant.streaming import StreamPolicy
 
 
 def messages_to_prompt(messages: Sequence[ChatMessage]) -> List[dict]:
@@ -23,6 +38,99 @@ def messages_to_prompt(messages: Sequence[ChatMessage]) -> List[dict]:
     return formatted
 
 
+class _StreamedText:
+    """The text of a streamed response, joined only when it is read
+
+    Every streamed response refers to the number of deltas it includes.
+    Consumers that only read .delta never join the text, and reading the
+    text of every response in order extends the last joined text instead
+    of starting over."""
+
+    def __init__(self) -> None:
+        self._parts: List[str] = []
+        self._text = ""
+        self._joined = 0
+
+    def append(self, delta: str) -> int:
+        self._parts.append(delta)
+        return len(self._parts)
+
+    def text(self, size: int) -> str:
+        """The text of the first size deltas"""
+        if size < self._joined:
+            return "".join(self._parts[:size])
+        if size > self._joined:
+            self._text = "".join([self._text, *self._parts[self._joined : size]])
+            self._joined = size
+        return self._text
+
+
+class _LazyResponse(BaseModel):
+    """Create the field _lazy_field of a streamed response on first access
+
+    Subclasses create the value of the field in ._materialize()."""
+
+    _lazy_field: ClassVar[str]
+    _stream: _StreamedText = PrivateAttr()
+    _size: int = PrivateAttr()
+
+    @abstractmethod
+    def _materialize(self) -> Any: ...
+
+    def __getattr__(self, name: str) -> Any:
+        if name == self._lazy_field:
+            value = self._materialize()
+            self.__dict__[name] = value
+            return value
+        return super().__getattr__(name)  # type: ignore[misc]
+
+    @model_serializer(mode="wrap")
+    def _serialize(self, handler: SerializerFunctionWrapHandler) -> Any:
+        getattr(self, self._lazy_field)
+        return handler(self)
+
+    def __repr_args__(self) -> Any:
+        getattr(self, self._lazy_field)
+        return super().__repr_args__()
+
+    @classmethod
+    def streamed(cls, stream: _StreamedText, delta: str) -> Any:
+        response = cls.model_construct(delta=delta)
+        response._stream = stream
+        response._size = stream.append(delta)
+        return response
+
+
+class _StreamedCompletionResponse(_LazyResponse, CompletionResponse):
+    _lazy_field: ClassVar[str] = "text"
+
+    def _materialize(self) -> str:
+        return self._stream.text(self._size)
+
+
+class _StreamedChatResponse(_LazyResponse, LlamaChatResponse):
+    _lazy_field: ClassVar[str] = "message"
+
+    def _materialize(self) -> ChatMessage:
+        return ChatMessage(
+            role=MessageRole.ASSISTANT, content=self._stream.text(self._size)
+        )
+
+
+def _stream_responses(chunks: Iterator[str], cls: Any) -> Iterator[Any]:
+    stream = _StreamedText()
+    for chunk in chunks:
+        yield cls.streamed(stream, chunk)
+
+
+async def _astream_responses(
+    chunks: AsyncGenerator[str, None], cls: Any
+) -> AsyncGenerator[Any, None]:
+    stream = _StreamedText()
+    async for chunk in chunks:
+        yield cls.streamed(stream, chunk)
+
+
 class AnacondaAssistant(CustomLLM):
     def __init__(
         self,
@@ -32,7 +140,14 @@ class AnacondaAssistant(CustomLLM):
         api_key: Optional[str] = None,
         api_version: Optional[str] = None,
         callback_manager: Optional[CallbackManager] = None,
+        stream_policy: Optional[StreamPolicy] = None,
+        stop: Optional[List[str]] = None,
     ) -> None:
+        """Responses are cut at the first of the stop sequences, which can
+        also be given to each call as stop=[...].
+
+        Streamed tokens are forwarded as they arrive unless stream_policy
+        groups them, for the sync and the async methods alike."""
         super().__init__(
             system_prompt=system_prompt,
             callback_manager=callback_manager,
@@ -44,7 +159,13 @@ class AnacondaAssistant(CustomLLM):
             domain=domain,
             api_key=api_key,
             api_version=api_version,
+            stream_policy=stream_policy,
         )
+        self._stop = stop
+        # httpx clients are bound to the event loop they were first used on
+        self._async_clients: WeakKeyDictionary[
+            asyncio.AbstractEventLoop, AsyncChatClient
+        ] = WeakKeyDictionary()
 
     @property
     def metadata(self) -> LLMMetadata:
@@ -59,19 +180,54 @@ class AnacondaAssistant(CustomLLM):
     def class_name(cls) -> str:
         return "AnacondaAssistant"
 
-    def _complete(self, prompt: str, formatted: bool = False) -> ChatResponse:
+    @property
+    def _async_model(self) -> AsyncChatClient:
+        """The AsyncChatClient of the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncChatClient(client=self._model)
+            self._async_clients[loop] = client
+        return client
+
+    def _prompt_messages(self, prompt: str, formatted: bool) -> List[dict]:
         if formatted:
-            messages = cast(List[dict], prompt)
-        else:
-            messages = [{"role": "user", "content": prompt, "message_id": "0"}]
+            return cast(List[dict], prompt)
+        return [{"role": "user", "content": prompt, "message_id": "0"}]
+
+    def _complete(self, prompt: str, formatted: bool = False) -> ChatResponse:
+        messages = self._prompt_messages(prompt, formatted)
         response = self._model.completions(messages=messages)
         return response
 
+    def _iter_content(
+        self, response: ChatResponse, stop: Optional[List[str]]
+    ) -> Iterator[str]:
+        return response.iter_until(stop) if stop else response.iter_content()
+
+    def _aiter_content(
+        self, response: AsyncChatResponse, stop: Optional[List[str]]
+    ) -> AsyncGenerator[str, None]:
+        policy = self._model.stream_policy
+        if stop:
+            return response.aiter_until(stop, stream_policy=policy)
+        return response.aiter_content(stream_policy=policy)
+
+    async def _aread(
+        self, response: AsyncChatResponse, stop: Optional[List[str]]
+    ) -> str:
+        if stop:
+            return "".join([chunk async for chunk in response.aiter_until(stop)])
+        return await response.aread()
+
     @llm_completion_callback()
     def complete(
         self, prompt: str, formatted: bool = False, **kwargs: Any
     ) -> CompletionResponse:
         response = self._complete(prompt, formatted)
+        stop = kwargs.get("stop", self._stop)
+        if stop:
+            return CompletionResponse(text="".join(response.iter_until(stop)))
         return CompletionResponse(text=response.message)
 
     @llm_completion_callback()
@@ -79,7 +235,66 @@ class AnacondaAssistant(CustomLLM):
         self, prompt: str, formatted: bool = False, **kwargs: Any
     ) -> CompletionResponseGen:
         response = self._complete(prompt, formatted)
-        full = ""
-        for chunk in response.iter_content():
-            full += chunk
-            yield CompletionResponse(text=full, delta=chunk)
+        chunks = self._iter_content(response, kwargs.get("stop", self._stop))
+        yield from _stream_responses(chunks, _StreamedCompletionResponse)
+
+    @llm_chat_callback()
+    def chat(self, messages: Sequence[ChatMessage], **kwargs: Any) -> LlamaChatResponse:
+        response = self._model.completions(messages=messages_to_prompt(messages))
+        chunks = self._iter_content(response, kwargs.get("stop", self._stop))
+        content = "".join(chunks)
+        return LlamaChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=content)
+        )
+
+    @llm_chat_callback()
+    def stream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseGen:
+        response = self._model.completions(messages=messages_to_prompt(messages))
+        chunks = self._iter_content(response, kwargs.get("stop", self._stop))
+        yield from _stream_responses(chunks, _StreamedChatResponse)
+
+    @llm_completion_callback()
+    async def acomplete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponse:
+        messages = self._prompt_messages(prompt, formatted)
+        response = await self._async_model.completions(messages=messages)
+        text = await self._aread(response, kwargs.get("stop", self._stop))
+        return CompletionResponse(text=text)
+
+    @llm_completion_callback()
+    async def astream_complete(
+        self, prompt: str, formatted: bool = False, **kwargs: Any
+    ) -> CompletionResponseAsyncGen:
+        messages = self._prompt_messages(prompt, formatted)
+        response = await self._async_model.completions(messages=messages)
+        stop = kwargs.get("stop", self._stop)
+
+        chunks = self._aiter_content(response, stop)
+        return _astream_responses(chunks, _StreamedCompletionResponse)
+
+    @llm_chat_callback()
+    async def achat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> LlamaChatResponse:
+        response = await self._async_model.completions(
+            messages=messages_to_prompt(messages)
+        )
+        content = await self._aread(response, kwargs.get("stop", self._stop))
+        return LlamaChatResponse(
+            message=ChatMessage(role=MessageRole.ASSISTANT, content=content)
+        )
+
+    @llm_chat_callback()
+    async def astream_chat(
+        self, messages: Sequence[ChatMessage], **kwargs: Any
+    ) -> ChatResponseAsyncGen:
+        response = await self._async_model.completions(
+            messages=messages_to_prompt(messages)
+        )
+        stop = kwargs.get("stop", self._stop)
+
+        chunks = self._aiter_content(response, stop)
+        return _astream_responses(chunks, _StreamedChatResponse)
@@ -1,23 +1,191 @@
-from typing import Iterator, Union, Callable
+import asyncio
+from collections import OrderedDict
+from threading import Lock
+from typing import Any, AsyncGenerator, Dict, Iterator, List, NamedTuple, Optional
+from typing import Sequence, Tuple, Union, Callable, cast
 from uuid import uuid4
+from weakref import WeakKeyDictionary
 
 import llm
+from pydantic import Field
 
+from anaconda_assistant.async_client import AsyncChatClient
 from anaconda_assistant.core import ChatClient
+from anaconda_assistant.streaming import StreamPolicy
+
+# the messages of the most recently used conversations are kept
+MAX_CACHED_CONVERSATIONS = 32
 
 
 @llm.hookimpl
 def register_models(register: Callable) -> None:
-    register(AnacondaAssistantChat())
+    register(AnacondaAssistantChat(), AsyncAnacondaAssistantChat())
+
+
+class AnacondaAssistantOptions(llm.Options):
+    stop: Optional[str] = Field(
+        description="Stop the response at the first occurrence of this text",
+        default=None,
+    )
+    history: Optional[int] = Field(
+        description="Only send this many previous exchanges of the conversation",
+        default=None,
+        ge=0,
+    )
+
+
+class _Turn(NamedTuple):
+    system: Optional[Dict[str, str]]
+    """The system message sent before this turn, if it changed"""
+    active_system: Optional[Dict[str, str]]
+    """The system message in effect for this turn"""
+    user: Dict[str, str]
+    assistant: Dict[str, str]
+
+
+class _ConversationMessages:
+    """The messages of a conversation, extended as responses are added
+
+    Every message gets its id once, so ids are stable from turn to turn
+    and the previous responses are only read once."""
+
+    def __init__(self) -> None:
+        self._reset()
+
+    def _reset(self) -> None:
+        self.turns: List[_Turn] = []
+        self._system: Optional[Dict[str, str]] = None
+        # the number of responses seen and the last of them
+        self._count = 0
+        self._last: Any = None
+        # the messages of the prompt that has not been answered yet
+        self._pending: Optional[Tuple[Any, Any, Dict[str, str]]] = None
+
+    def _prompt_messages(
+        self, prompt: llm.Prompt
+    ) -> Tuple[Optional[Dict[str, str]], Dict[str, str]]:
+        """The system message, if it changed, and user message of prompt"""
+        if self._pending is not None and self._pending[0] is prompt:
+            return self._pending[1], self._pending[2]
+
+        system = None
+        if prompt.system and (
+            self._system is None or prompt.system != self._system["content"]
+        ):
+            system = {
+                "role": "system",
+                "content": prompt.system,
+                "message_id": str(uuid4()),
+            }
+        user = {"role": "user", "content": prompt.prompt, "message_id": str(uuid4())}
+        self._pending = (prompt, system, user)
+        return system, user
+
+    def update(self, responses: Sequence[Any]) -> None:
+        """Add the turns of the responses that were not seen before"""
+        if len(responses) < self._count or (
+            self._count and responses[self._count - 1] is not self._last
+        ):
+            # the history was changed, start over
+            self._reset()
+
+        for response in responses[self._count :]:
+            system, user = self._prompt_messages(response.prompt)
+            if system is not None:
+                self._system = system
+            assistant = {
+                "role": "assistant",
+                "content": response.text_or_raise(),
+                "message_id": str(uuid4()),
+            }
+            self.turns.append(_Turn(system, self._system, user, assistant))
+
+        self._count = len(responses)
+        self._last = responses[-1] if responses else None
 
+    def messages(
+        self, prompt: llm.Prompt, history: Optional[int] = None
+    ) -> List[Dict[str, str]]:
+        """The messages to send for prompt
+
+        With history only the last history turns are included, preceded by
+        the system message in effect for them."""
+        turns = self.turns
+        if history is not None:
+            turns = turns[len(turns) - history :] if history else []
+
+        messages = []
+        if turns and turns[0].system is None and turns[0].active_system is not None:
+            messages.append(turns[0].active_system)
+        for turn in turns:
+            if turn.system is not None:
+                messages.append(turn.system)
+            messages.append(turn.user)
+            messages.append(turn.assistant)
+
+        system, user = self._prompt_messages(prompt)
+        if system is not None:
+            messages.append(system)
+        elif self._system is not None and not turns:
+            messages.append(self._system)
+        messages.append(user)
+        return messages
+
+
+class _AnacondaAssistantModel:
+    """Shared by the sync and async models
+
+    The ChatClient is created on first use and reused by every prompt sent
+    with this model instance."""
 
-class AnacondaAssistantChat(llm.Model):
     can_stream: bool = True
     model_id = "anaconda-assistant"
+    stream_policy: Optional[StreamPolicy] = None
+
+    def __init__(self) -> None:
+        self._client: Optional[ChatClient] = None
+        self._client_lock = Lock()
+        self._conversations: "OrderedDict[str, _ConversationMessages]" = OrderedDict()
+        self._conversations_lock = Lock()
 
     def __str__(self) -> str:
         return f"AnacondaAssistant Chat: {self.model_id}"
 
+    @property
+    def client(self) -> ChatClient:
+        if self._client is None:
+            with self._client_lock:
+                if self._client is None:
+                    self._client = ChatClient(stream_policy=self.stream_policy)
+        return self._client
+
+    def _stop(self, prompt: llm.Prompt) -> Optional[str]:
+        return cast(AnacondaAssistantOptions, prompt.options).stop
+
+    def build_messages(
+        self,
+        prompt: llm.Prompt,
+        conversation: Union[llm.Conversation, llm.AsyncConversation, None],
+    ) -> List[Dict[str, str]]:
+        options = cast(AnacondaAssistantOptions, prompt.options)
+        if not conversation:
+            return _ConversationMessages().messages(prompt, options.history)
+
+        with self._conversations_lock:
+            cached = self._conversations.pop(conversation.id, None)
+            if cached is None:
+                cached = _ConversationMessages()
+            self._conversations[conversation.id] = cached
+            while len(self._conversations) > MAX_CACHED_CONVERSATIONS:
+                self._conversations.popitem(last=False)
+
+        cached.update(conversation.responses)
+        return cached.messages(prompt, options.history)
+
+
+class AnacondaAssistantChat(_AnacondaAssistantModel, llm.Model):
+    class Options(AnacondaAssistantOptions): ...
+
     def execute(
         self,
         prompt: llm.Prompt,
@@ -26,68 +194,67 @@ class AnacondaAssistantChat(llm.Model):
         conversation: Union[llm.Conversation, None],
     ) -> Iterator[str]:
         messages = self.build_messages(prompt, conversation)
-        response._prompt_json = {"messages": messages}
+        response._prompt_json = {"messages": messages}  # type: ignore[assignment]
 
-        client = ChatClient()
+        response_stream = self.client.completions(messages=messages)
 
-        response_stream = client.completions(messages=messages)
+        stop = self._stop(prompt)
+        if stop:
+            chunks = response_stream.iter_until([stop])
+        else:
+            chunks = response_stream.iter_content()
 
         if stream:
-            yield from response_stream.iter_content()
+            yield from chunks
         else:
-            response.response_json = {"message": {"content": response_stream.message}}
+            response.response_json = {"message": {"content": "".join(chunks)}}
             yield response.response_json["message"]["content"]
 
-    def build_messages(
-        self, prompt: llm.Prompt, conversation: Union[llm.Conversation, None]
-    ) -> list[dict[str, str]]:
-        messages = []
-        if not conversation:
-            if prompt.system:
-                messages.append(
-                    {
-                        "role": "system",
-                        "content": prompt.system,
-                        "message_id": str(uuid4()),
-                    }
-                )
-            messages.append(
-                {"role": "user", "content": prompt.prompt, "message_id": str(uuid4())}
-            )
-            return messages
-        current_system = None
-        for prev_response in conversation.responses:
-            if (
-                prev_response.prompt.system
-                and prev_response.prompt.system != current_system
-            ):
-                messages.append(
-                    {
-                        "role": "system",
-                        "content": prev_response.prompt.system,
-                        "message_id": str(uuid4()),
-                    },
-                )
-                current_system = prev_response.prompt.system
-            messages.append(
-                {
-                    "role": "user",
-                    "content": prev_response.prompt.prompt,
-                    "message_id": str(uuid4()),
-                }
-            )
-            messages.append(
-                {
-                    "role": "assistant",
-                    "content": prev_response.text(),
-                    "message_id": str(uuid4()),
-                }
-            )
-        if prompt.system and prompt.system != current_system:
-            messages.append(
-                {"role": "system", "content": prompt.system, "message_id": str(uuid4())}
+
+class AsyncAnacondaAssistantChat(_AnacondaAssistantModel, llm.AsyncModel):
+    class Options(AnacondaAssistantOptions): ...
+
+    def __init__(self) -> None:
+        super().__init__()
+        # httpx clients are bound to the event loop they were first used on
+        self._async_clients: WeakKeyDictionary[
+            asyncio.AbstractEventLoop, AsyncChatClient
+        ] = WeakKeyDictionary()
+
+    @property
+    def async_client(self) -> AsyncChatClient:
+        """The AsyncChatClient of the running event loop, created on first use"""
+        loop = asyncio.get_running_loop()
+        client = self._async_clients.get(loop)
+        if client is None:
+            client = AsyncChatClient(client=self.client)
+            self._async_clients[loop] = client
+        return client
+
+    async def execute(
+        self,
+        prompt: llm.Prompt,
+        stream: bool,
+        response: llm.AsyncResponse,
+        conversation: Union[llm.AsyncConversation, None],
+    ) -> AsyncGenerator[str, None]:
+        messages = self.build_messages(prompt, conversation)
+        response._prompt_json = {"messages": messages}  # type: ignore[assignment]
+
+        response_stream = await self.async_client.completions(messages=messages)
+
+        stop = self._stop(prompt)
+        if stop:
+            chunks = response_stream.aiter_until(
+                [stop], stream_policy=self.stream_policy
             )
-        messages.append(
-            {"role": "user", "content": prompt.prompt, "message_id": str(uuid4())}
-        )
-        return messages
+        else:
+            chunks = response_stream.aiter_content(stream_policy=self.stream_policy)
+
+        if stream:
+            async for chunk in chunks:
+                yield chunk
+        else:
+            content = "".join([chunk async for chunk in chunks])
+            response.response_json = {"message": {"content": content}}
+            yield content
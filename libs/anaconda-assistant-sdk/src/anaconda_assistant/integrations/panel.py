@@ -4,23 +4,31 @@ from typing import Any, Optional
 from typing import AsyncGenerator
 
 from anaconda_assistant.core import ChatSession
+from anaconda_assistant.streaming import StreamPolicy
 
 HERE = os.path.dirname(__file__)
 
 
 class AnacondaAssistantCallbackHandler:
-    def __init__(self, session: Optional[ChatSession] = None) -> None:
+    def __init__(
+        self,
+        session: Optional[ChatSession] = None,
+        stream_policy: Optional[StreamPolicy] = None,
+    ) -> None:
         if session is None:
             self.session = ChatSession()
         else:
             self.session = session
         self.assistant_avatar = os.path.join(HERE, "Anaconda_Logo.png")
         self.assistant_name = "Anaconda Assistant"
+        self.stream_policy = stream_policy
 
     async def __call__(self, contents: str, *_: Any) -> AsyncGenerator[dict, None]:
         await sleep(0.1)
         full_text = ""
-        for chunk in self.session.chat(contents, stream=True):
+        for chunk in self.session.chat(
+            contents, stream=True, stream_policy=self.stream_policy
+        ):
             full_text += chunk
             yield {
                 "user": self.assistant_name,
@@ -0,0 +1,204 @@
+import sys
+from collections import OrderedDict
+from dataclasses import dataclass
+from threading import Lock
+from typing import Any
+from typing import Dict
+from typing import MutableMapping
+from typing import Optional
+from typing import Tuple
+
+from anaconda_assistant.core import ChatClient
+from anaconda_assistant.core import ChatSession
+from anaconda_assistant.streaming import StreamPolicy
+
+ClientKey = Tuple[Optional[str], Optional[str], Optional[str], Optional[str]]
+
+
+@dataclass
+class PoolStats:
+    """Counters and sizes reported by SessionPool.stats()"""
+
+    hits: int = 0
+    misses: int = 0
+    evictions: int = 0
+    restores: int = 0
+    sessions: int = 0
+    stored_sessions: int = 0
+    clients: int = 0
+    memory_bytes: int = 0
+
+
+def _messages_size(messages: list) -> int:
+    """Approximate the memory held by a list of chat messages"""
+    size = sys.getsizeof(messages)
+    for message in messages:
+        size += sys.getsizeof(message)
+        size += sum(sys.getsizeof(v) for v in message.values())
+    return size
+
+
+class SessionPool:
+    """A pool of ChatSessions for serving many users from one process
+
+    Sessions are identified by a key chosen by the caller, e.g. a user or
+    conversation id. ChatClients are created once per credential and system
+    message and shared by all sessions using them, so creating a session
+    does not load config or build new HTTP clients.
+
+    At most max_sessions sessions are kept in memory. The least recently used
+    session is evicted into store, a mapping of session key to the session id,
+    messages and usage, and restored from it when requested again. Any
+    MutableMapping can be used as store to keep the evicted sessions elsewhere.
+    Sessions in the middle of a turn are not evicted, so the pool can hold
+    more than max_sessions while many turns are in flight.
+
+    use_gateway is passed to the ChatClients created by the pool.
+    """
+
+    def __init__(
+        self,
+        max_sessions: int = 1024,
+        max_clients: int = 128,
+        store: Optional[MutableMapping[str, Dict[str, Any]]] = None,
+        stream_policy: Optional[StreamPolicy] = None,
+        use_gateway: Optional[bool] = None,
+    ) -> None:
+        self.max_sessions = max_sessions
+        self.max_clients = max_clients
+        self.store: MutableMapping[str, Dict[str, Any]] = {} if store is None else store
+        self.stream_policy = stream_policy
+        self.use_gateway = use_gateway
+
+        self._sessions: "OrderedDict[str, ChatSession]" = OrderedDict()
+        self._clients: "OrderedDict[ClientKey, ChatClient]" = OrderedDict()
+        self._lock = Lock()
+        self._stats = PoolStats()
+
+    def client(
+        self,
+        system_message: Optional[str] = None,
+        domain: Optional[str] = None,
+        api_key: Optional[str] = None,
+        api_version: Optional[str] = None,
+    ) -> ChatClient:
+        """Return the shared ChatClient for these settings"""
+        key: ClientKey = (system_message, domain, api_key, api_version)
+        with self._lock:
+            client = self._clients.get(key)
+            if client is not None:
+                self._clients.move_to_end(key)
+                return client
+
+        # constructing the client is slow, don't hold the lock meanwhile
+        client = ChatClient(
+            system_message=system_message,
+            domain=domain,
+            api_key=api_key,
+            api_version=api_version,
+            stream_policy=self.stream_policy,
+            use_gateway=self.use_gateway,
+        )
+
+        with self._lock:
+            client = self._clients.setdefault(key, client)
+            self._clients.move_to_end(key)
+            while len(self._clients) > self.max_clients:
+                # sessions still using the client keep their reference
+                self._clients.popitem(last=False)
+        return client
+
+    def get(
+        self,
+        session_key: str,
+        system_message: Optional[str] = None,
+        domain: Optional[str] = None,
+        api_key: Optional[str] = None,
+        api_version: Optional[str] = None,
+    ) -> ChatSession:
+        """Return the session for session_key, creating or restoring it if needed"""
+        with self._lock:
+            session = self._sessions.get(session_key)
+            if session is not None:
+                self._sessions.move_to_end(session_key)
+                self._stats.hits += 1
+                return session
+            self._stats.misses += 1
+
+        client = self.client(
+            system_message=system_message,
+            domain=domain,
+            api_key=api_key,
+            api_version=api_version,
+        )
+        session = ChatSession(client=client)
+
+        with self._lock:
+            existing = self._sessions.get(session_key)
+            if existing is not None:
+                # created by another thread in the meantime
+                return existing
+
+            state = self.store.pop(session_key, None)
+            if state is not None:
+                session.id = state["id"]
+                session.messages = list(state["messages"])
+                session.usage = dict(state["usage"])
+                self._stats.restores += 1
+
+            self._sessions[session_key] = session
+            self._evict()
+
+        return session
+
+    def _evict(self) -> None:
+        """Move the least recently used idle sessions into store
+
+        Called with the pool lock held. The state is copied while holding
+        the lock of the session, so a restored session never shares its
+        history with the evicted one."""
+        for key in list(self._sessions):
+            if len(self._sessions) <= self.max_sessions:
+                break
+
+            evicted = self._sessions[key]
+            if not evicted._lock.acquire(blocking=False):
+                # in the middle of a turn
+                continue
+            try:
+                self.store[key] = {
+                    "id": evicted.id,
+                    "messages": list(evicted.messages),
+                    "usage": dict(evicted.usage),
+                }
+            finally:
+                evicted._lock.release()
+            del self._sessions[key]
+            self._stats.evictions += 1
+
+    def discard(self, session_key: str) -> None:
+        """Remove the session and any stored state for session_key"""
+        with self._lock:
+            self._sessions.pop(session_key, None)
+            self.store.pop(session_key, None)
+
+    def __contains__(self, session_key: str) -> bool:
+        with self._lock:
+            return session_key in self._sessions or session_key in self.store
+
+    def __len__(self) -> int:
+        with self._lock:
+            return len(self._sessions)
+
+    def stats(self) -> PoolStats:
+        """Return the pool counters and the approximate memory used by the
+        message histories of sessions held in memory"""
+        with self._lock:
+            stats = PoolStats(**vars(self._stats))
+            stats.sessions = len(self._sessions)
+            stats.stored_sessions = len(self.store)
+            stats.clients = len(self._clients)
+            stats.memory_bytes = sum(
+                _messages_size(s.messages) for s in self._sessions.values()
+            )
+        return stats
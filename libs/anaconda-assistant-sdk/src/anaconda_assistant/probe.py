@@ -0,0 +1,287 @@
+import argparse
+import json
+import socket
+import ssl
+import sys
+from dataclasses import asdict
+from dataclasses import dataclass
+from datetime import datetime
+from datetime import timezone
+from threading import Event
+from time import perf_counter
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from urllib.parse import urlsplit
+
+from anaconda_assistant.api_client import APIClient
+
+TIMINGS = ("dns_ms", "connect_ms", "tls_ms", "ttfb_ms", "total_ms")
+
+
+@dataclass
+class ProbeResult:
+    """Timings in milliseconds of a single probe
+
+    dns_ms, connect_ms and tls_ms are measured on a separate connection to
+    the API host, tls_ms is None for plain HTTP. ttfb_ms and total_ms are
+    the time to the first byte and to the end of the response of the
+    request sent through the APIClient. A probe is ok when the service
+    answered with a 2xx status or with 405 to the default GET request."""
+
+    timestamp: str
+    url: str
+    ok: bool = False
+    status_code: Optional[int] = None
+    dns_ms: Optional[float] = None
+    connect_ms: Optional[float] = None
+    tls_ms: Optional[float] = None
+    ttfb_ms: Optional[float] = None
+    total_ms: Optional[float] = None
+    error: Optional[str] = None
+
+    def to_dict(self) -> Dict[str, Any]:
+        return asdict(self)
+
+
+def _ssl_context(api_client: APIClient) -> ssl.SSLContext:
+    verify = api_client.verify
+    if verify is False:
+        context = ssl.create_default_context()
+        context.check_hostname = False
+        context.verify_mode = ssl.CERT_NONE
+        return context
+    return ssl.create_default_context(
+        cafile=verify if isinstance(verify, str) else None
+    )
+
+
+def _elapsed(start: float) -> float:
+    return (perf_counter() - start) * 1000
+
+
+def _measure_connection(
+    api_client: APIClient, url: str, result: ProbeResult, timeout: float
+) -> None:
+    parts = urlsplit(url)
+    host = parts.hostname or ""
+    port = parts.port or (443 if parts.scheme == "https" else 80)
+
+    start = perf_counter()
+    family, kind, proto, _, address = socket.getaddrinfo(
+        host, port, type=socket.SOCK_STREAM
+    )[0]
+    result.dns_ms = _elapsed(start)
+
+    sock = socket.socket(family, kind, proto)
+    try:
+        sock.settimeout(timeout)
+        start = perf_counter()
+        sock.connect(address)
+        result.connect_ms = _elapsed(start)
+
+        if parts.scheme == "https":
+            start = perf_counter()
+            sock = _ssl_context(api_client).wrap_socket(sock, server_hostname=host)
+            result.tls_ms = _elapsed(start)
+    finally:
+        sock.close()
+
+
+def probe(
+    api_client: Optional[APIClient] = None,
+    path: str = "/completions",
+    method: str = "GET",
+    timeout: float = 10.0,
+) -> ProbeResult:
+    """Measure the latency of the Assistant API
+
+    By default a GET request is sent to the completions endpoint, which
+    exercises DNS, TLS, authentication and routing without generating a
+    completion or counting towards the daily quota. Errors are reported in
+    the result rather than raised."""
+    from requests import RequestException
+
+    if api_client is None:
+        api_client = APIClient()
+
+    url = api_client.urljoin(path)
+    result = ProbeResult(timestamp=datetime.now(timezone.utc).isoformat(), url=url)
+    try:
+        _measure_connection(api_client, url, result, timeout)
+
+        start = perf_counter()
+        response = api_client.request(method, url, stream=True, timeout=timeout)
+        try:
+            chunks = response.iter_content(chunk_size=1024)
+            next(chunks, None)
+            result.ttfb_ms = _elapsed(start)
+            for _ in chunks:
+                pass
+            result.total_ms = _elapsed(start)
+        finally:
+            response.close()
+    except (OSError, RequestException) as e:
+        result.error = f"{type(e).__name__}: {e}"
+        return result
+
+    result.status_code = response.status_code
+    # 401, 404 and the like mean the probe did not reach a working endpoint
+    result.ok = 200 <= response.status_code < 300 or response.status_code == 405
+    return result
+
+
+class Prober:
+    """Probe the Assistant API periodically
+
+    Every interval seconds a probe is sent and exponential moving averages
+    of its timings are updated, weighting the newest probe by alpha. The
+    state can be exported with .to_dict() or .to_json()."""
+
+    def __init__(
+        self,
+        api_client: Optional[APIClient] = None,
+        interval: float = 60.0,
+        alpha: float = 0.2,
+        path: str = "/completions",
+        method: str = "GET",
+        timeout: float = 10.0,
+    ) -> None:
+        if not 0 < alpha <= 1:
+            raise ValueError("alpha must be greater than 0 and at most 1")
+
+        self.api_client = APIClient() if api_client is None else api_client
+        self.interval = interval
+        self.alpha = alpha
+        self.path = path
+        self.method = method
+        self.timeout = timeout
+
+        self.probes = 0
+        self.failures = 0
+        self.last: Optional[ProbeResult] = None
+        self.averages: Dict[str, Optional[float]] = dict.fromkeys(TIMINGS)
+        self._stop = Event()
+
+    def update(self, result: ProbeResult) -> None:
+        """Add a probe result to the counters and moving averages"""
+        self.probes += 1
+        if not result.ok:
+            self.failures += 1
+        self.last = result
+
+        for name in TIMINGS:
+            value = getattr(result, name)
+            if value is None:
+                continue
+            average = self.averages[name]
+            self.averages[name] = (
+                value
+                if average is None
+                else self.alpha * value + (1 - self.alpha) * average
+            )
+
+    def probe(self) -> ProbeResult:
+        result = probe(
+            self.api_client, path=self.path, method=self.method, timeout=self.timeout
+        )
+        self.update(result)
+        return result
+
+    def run(
+        self,
+        count: Optional[int] = None,
+        callback: Optional[Callable[["Prober"], None]] = None,
+    ) -> None:
+        """Probe every interval seconds, count times or until .stop() is called"""
+        self._stop.clear()
+        done = 0
+        while not self._stop.is_set():
+            self.probe()
+            done += 1
+            if callback is not None:
+                callback(self)
+            if count is not None and done >= count:
+                break
+            self._stop.wait(self.interval)
+
+    def stop(self) -> None:
+        self._stop.set()
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "probes": self.probes,
+            "failures": self.failures,
+            "alpha": self.alpha,
+            "averages": self.averages,
+            "last": None if self.last is None else self.last.to_dict(),
+        }
+
+    def to_json(self) -> str:
+        return json.dumps(self.to_dict())
+
+
+def main(argv: Optional[List[str]] = None) -> int:
+    parser = argparse.ArgumentParser(
+        prog="python -m anaconda_assistant.probe",
+        description="Measure the latency of the Anaconda Assistant API",
+    )
+    parser.add_argument("--domain", help="Domain of the Anaconda API")
+    parser.add_argument(
+        "--base-uri", help="Base URI of the API, e.g. a local mock server"
+    )
+    parser.add_argument(
+        "--path", default="/completions", help="Path of the endpoint to probe"
+    )
+    parser.add_argument("--method", default="GET", help="HTTP method of the probe")
+    parser.add_argument(
+        "--timeout", type=float, default=10.0, help="Timeout in seconds"
+    )
+    parser.add_argument(
+        "--interval", type=float, default=60.0, help="Seconds between probes"
+    )
+    parser.add_argument(
+        "--count",
+        type=int,
+        default=1,
+        help="Number of probes, 0 to run until interrupted",
+    )
+    parser.add_argument(
+        "--alpha",
+        type=float,
+        default=0.2,
+        help="Weight of the newest probe in the moving averages",
+    )
+    parser.add_argument(
+        "--output", help="Also write the latest state as JSON to this file"
+    )
+    args = parser.parse_args(argv)
+
+    prober = Prober(
+        APIClient(domain=args.domain, base_uri=args.base_uri),
+        interval=args.interval,
+        alpha=args.alpha,
+        path=args.path,
+        method=args.method,
+        timeout=args.timeout,
+    )
+
+    def report(prober: Prober) -> None:
+        state = prober.to_json()
+        print(state, flush=True)
+        if args.output:
+            with open(args.output, "w") as f:
+                f.write(state)
+
+    try:
+        prober.run(count=args.count or None, callback=report)
+    except KeyboardInterrupt:
+        pass
+
+    return 0 if prober.last is not None and prober.last.ok else 1
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,112 @@
+from collections import deque
+from enum import IntEnum
+from itertools import count
+from threading import Condition
+from threading import Lock
+from typing import Callable
+from typing import Deque
+from typing import Dict
+from typing import Optional
+
+
+class Priority(IntEnum):
+    """Priority of a completions request, lower values are served first"""
+
+    HIGH = 0
+    NORMAL = 1
+    LOW = 2
+
+
+class RequestScheduler:
+    """Admit concurrent completions requests by priority
+
+    At most max_concurrency requests run at once, a request holds its slot
+    until the response has been consumed or closed. Waiting requests are
+    admitted in priority order and first come first served within the same
+    priority.
+
+    reserved sets the number of slots kept free for each priority, which
+    only it and higher priorities may use, e.g. {Priority.HIGH: 2} keeps
+    two slots for interactive requests however many batch requests are
+    waiting. caps limits how many requests of a priority run at once."""
+
+    def __init__(
+        self,
+        max_concurrency: int = 8,
+        reserved: Optional[Dict[int, int]] = None,
+        caps: Optional[Dict[int, int]] = None,
+    ) -> None:
+        self.max_concurrency = max_concurrency
+        self.reserved = (
+            {Priority.HIGH: max(1, max_concurrency // 4)}
+            if reserved is None
+            else reserved
+        )
+        self.caps = {} if caps is None else caps
+        if sum(self.reserved.values()) > max_concurrency:
+            raise ValueError("More slots are reserved than max_concurrency")
+
+        self._active: Dict[int, int] = {}
+        self._waiting: Dict[int, Deque[int]] = {}
+        self._tickets = count()
+        self._condition = Condition()
+
+    @property
+    def active(self) -> int:
+        return sum(self._active.values())
+
+    def _limit(self, priority: int) -> int:
+        """The number of slots requests of this priority may fill"""
+        reserved = sum(n for p, n in self.reserved.items() if p < priority)
+        return self.max_concurrency - reserved
+
+    def _admissible(self, priority: int) -> bool:
+        cap = self.caps.get(priority)
+        if cap is not None and self._active.get(priority, 0) >= cap:
+            return False
+        return self.active < self._limit(priority)
+
+    def _can_start(self, priority: int, ticket: int) -> bool:
+        if self._waiting[priority][0] != ticket or not self._admissible(priority):
+            return False
+        # a more important request that could start goes first
+        return not any(
+            p < priority and waiting and self._admissible(p)
+            for p, waiting in self._waiting.items()
+        )
+
+    def acquire(
+        self, priority: int = Priority.NORMAL, timeout: Optional[float] = None
+    ) -> Callable[[], None]:
+        """Wait for a slot and return the function releasing it
+
+        TimeoutError is raised if no slot is available within timeout seconds."""
+        with self._condition:
+            ticket = next(self._tickets)
+            waiting = self._waiting.setdefault(priority, deque())
+            waiting.append(ticket)
+            try:
+                started = self._condition.wait_for(
+                    lambda: self._can_start(priority, ticket), timeout=timeout
+                )
+            finally:
+                waiting.remove(ticket)
+                # the next request in line may be able to start now
+                self._condition.notify_all()
+
+            if not started:
+                raise TimeoutError(
+                    f"No request slot became available within {timeout}s"
+                )
+            self._active[priority] = self._active.get(priority, 0) + 1
+
+        released = Lock()
+
+        def release() -> None:
+            if not released.acquire(blocking=False):
+                return
+            with self._condition:
+                self._active[priority] -= 1
+                self._condition.notify_all()
+
+        return release
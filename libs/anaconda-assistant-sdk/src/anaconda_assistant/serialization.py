@@ -0,0 +1,29 @@
+import json
+from typing import Any, Callable, Union
+
+try:
+    import orjson
+except ImportError:  # pragma: nocover
+    orjson = None  # type: ignore
+
+JSONSerializer = Callable[[Any], bytes]
+
+
+def default_json_dumps(obj: Any) -> bytes:
+    """Serialize obj to compact UTF-8 encoded JSON
+
+    orjson is used when it is installed, falling back to the
+    standard library for objects orjson cannot encode."""
+    if orjson is not None:
+        try:
+            return orjson.dumps(obj)
+        except TypeError:
+            pass
+    return json.dumps(obj, separators=(",", ":"), ensure_ascii=False).encode("utf-8")
+
+
+def json_loads(data: Union[bytes, str]) -> Any:
+    """Deserialize JSON text or UTF-8 encoded JSON, using orjson when it is installed"""
+    if orjson is not None:
+        return orjson.loads(data)
+    return json.loads(data)
@@ -0,0 +1,221 @@
+from time import monotonic
+from typing import AsyncGenerator
+from typing import AsyncIterable
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Sequence
+
+
+class StreamPolicy:
+    """Control how a streamed response is read and grouped into chunks
+
+    The response is read from the connection chunk_size bytes at a time
+    and .coalesce() decides how those chunks are grouped before they are
+    handed to the consumer. This default policy forwards every chunk as
+    soon as it is read.
+
+    Chunks passed to .coalesce() are UTF-8 encoded and end on a complete
+    character, policies must preserve that. .acoalesce() groups the chunks
+    of async responses the same way, policies that only override
+    .coalesce() forward every async chunk as it arrives."""
+
+    def __init__(self, chunk_size: int = 256) -> None:
+        self.chunk_size = chunk_size
+
+    def coalesce(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        yield from chunks
+
+    async def acoalesce(
+        self, chunks: AsyncIterable[bytes]
+    ) -> AsyncGenerator[bytes, None]:
+        async for chunk in chunks:
+            yield chunk
+
+    def __repr__(self) -> str:
+        attrs = ", ".join(f"{k}={v!r}" for k, v in vars(self).items())
+        return f"{self.__class__.__name__}({attrs})"
+
+
+class FixedSizePolicy(StreamPolicy):
+    """Forward every chunk of chunk_size bytes as it is read"""
+
+
+class CoalesceBytesPolicy(StreamPolicy):
+    """Join chunks until at least min_bytes are available"""
+
+    def __init__(self, min_bytes: int = 1024, chunk_size: int = 256) -> None:
+        super().__init__(chunk_size=chunk_size)
+        self.min_bytes = min_bytes
+
+    def coalesce(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        buffer = []
+        size = 0
+        for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= self.min_bytes:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+
+        if buffer:
+            yield b"".join(buffer)
+
+    async def acoalesce(
+        self, chunks: AsyncIterable[bytes]
+    ) -> AsyncGenerator[bytes, None]:
+        buffer = []
+        size = 0
+        async for chunk in chunks:
+            buffer.append(chunk)
+            size += len(chunk)
+            if size >= self.min_bytes:
+                yield b"".join(buffer)
+                buffer = []
+                size = 0
+
+        if buffer:
+            yield b"".join(buffer)
+
+
+class CoalesceTimePolicy(StreamPolicy):
+    """Join chunks until interval milliseconds have passed since the last one
+
+    The first chunk is forwarded immediately so that the time to the first
+    update is not increased. Chunks are only forwarded when a new chunk
+    arrives or the stream ends."""
+
+    def __init__(self, interval: float = 50.0, chunk_size: int = 256) -> None:
+        super().__init__(chunk_size=chunk_size)
+        self.interval = interval
+
+    def coalesce(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        buffer = []
+        last = None
+        for chunk in chunks:
+            buffer.append(chunk)
+            now = monotonic()
+            if last is None or (now - last) * 1000 >= self.interval:
+                yield b"".join(buffer)
+                buffer = []
+                last = now
+
+        if buffer:
+            yield b"".join(buffer)
+
+    async def acoalesce(
+        self, chunks: AsyncIterable[bytes]
+    ) -> AsyncGenerator[bytes, None]:
+        buffer = []
+        last = None
+        async for chunk in chunks:
+            buffer.append(chunk)
+            now = monotonic()
+            if last is None or (now - last) * 1000 >= self.interval:
+                yield b"".join(buffer)
+                buffer = []
+                last = now
+
+        if buffer:
+            yield b"".join(buffer)
+
+
+class _BoundaryPolicy(StreamPolicy):
+    separators: bytes = b""
+
+    def _split(self, data: bytes) -> int:
+        """Return the index after the last separator in data or -1"""
+        idx = max(data.rfind(s) for s in (bytes([c]) for c in self.separators))
+        return idx + 1 if idx != -1 else -1
+
+    def coalesce(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+        pending = b""
+        for chunk in chunks:
+            data = pending + chunk if pending else chunk
+            idx = self._split(data)
+            if idx == -1:
+                pending = data
+                continue
+
+            pending = data[idx:]
+            yield data[:idx]
+
+        if pending:
+            yield pending
+
+    async def acoalesce(
+        self, chunks: AsyncIterable[bytes]
+    ) -> AsyncGenerator[bytes, None]:
+        pending = b""
+        async for chunk in chunks:
+            data = pending + chunk if pending else chunk
+            idx = self._split(data)
+            if idx == -1:
+                pending = data
+                continue
+
+            pending = data[idx:]
+            yield data[:idx]
+
+        if pending:
+            yield pending
+
+
+class WordBoundaryPolicy(_BoundaryPolicy):
+    """Forward chunks ending on whitespace so that words are never split"""
+
+    separators = b" \t\n\r"
+
+
+class LineBoundaryPolicy(_BoundaryPolicy):
+    """Forward complete lines only"""
+
+    separators = b"\n"
+
+
+class StopSequences:
+    """Cut streamed text at the first occurrence of any stop sequence
+
+    Text is fed chunk by chunk and the text that is known to come before
+    a stop sequence is returned. The end of a chunk that could be the
+    start of a stop sequence is held back until the next chunk, so stop
+    sequences are found across chunk boundaries. Once one is found
+    .stopped is set and the rest of the stream is ignored."""
+
+    def __init__(self, stop: Sequence[str]) -> None:
+        self.stop: List[str] = [s for s in stop if s]
+        self.stopped = False
+        self._pending = ""
+
+    def _held(self, data: str) -> int:
+        """The length of the longest end of data that starts a stop sequence"""
+        longest = max(len(s) for s in self.stop)
+        for size in range(min(len(data), longest - 1), 0, -1):
+            end = data[-size:]
+            if any(s.startswith(end) for s in self.stop):
+                return size
+        return 0
+
+    def feed(self, text: str) -> str:
+        if self.stopped or not self.stop:
+            return "" if self.stopped else text
+
+        data = self._pending + text
+        found = [idx for idx in (data.find(s) for s in self.stop) if idx != -1]
+        if found:
+            self.stopped = True
+            self._pending = ""
+            return data[: min(found)]
+
+        held = self._held(data)
+        self._pending = data[len(data) - held :]
+        return data[: len(data) - held]
+
+    def finish(self) -> str:
+        """Return the text held back at the end of the stream"""
+        data, self._pending = self._pending, ""
+        return data
+
+
+DEFAULT_STREAM_POLICY = StreamPolicy()
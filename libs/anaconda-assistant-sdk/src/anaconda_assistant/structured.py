@@ -0,0 +1,131 @@
+import re
+from typing import Any
+from typing import Callable
+from typing import List
+from typing import Optional
+
+from anaconda_assistant.exceptions import StructuredOutputError
+from anaconda_assistant.serialization import json_loads
+
+_OPENER = re.compile(r"[\[{]")
+_STRUCTURAL = re.compile(r'["\[\]{},]')
+_STRING_SPECIAL = re.compile(r'["\\]')
+
+
+class JSONStreamParser:
+    """Incrementally parse a JSON array or object from a stream of text
+
+    Text is passed to .feed() as it arrives and every element of the
+    outermost array is returned as soon as it is complete. For an object
+    each member is returned as a (key, value) tuple. Any text before the
+    first [ or {, e.g. a sentence or a markdown code fence, is skipped, as
+    is anything after the closing bracket.
+
+    When schema is given every element, or member value, is validated
+    with a pydantic TypeAdapter for that type. Call .finish() once the
+    stream is exhausted to check that the JSON was complete."""
+
+    def __init__(self, schema: Optional[Any] = None) -> None:
+        self._validate: Optional[Callable[[Any], Any]] = None
+        if schema is not None:
+            from pydantic import TypeAdapter
+
+            self._validate = TypeAdapter(schema).validate_python
+
+        self.container: Optional[str] = None
+        self.done = False
+        self._buffer = ""
+        self._pos = 0
+        self._depth = 0
+        self._in_string = False
+
+    def feed(self, text: str) -> List[Any]:
+        if self.done:
+            return []
+
+        buffer = self._buffer + text
+        pos = self._pos
+        if self.container is None:
+            match = _OPENER.search(buffer)
+            if match is None:
+                return []
+            self.container = match.group()
+            self._depth = 1
+            buffer = buffer[match.end() :]
+            pos = 0
+
+        items: List[Any] = []
+        start = 0
+        depth = self._depth
+        in_string = self._in_string
+        while pos < len(buffer):
+            if in_string:
+                match = _STRING_SPECIAL.search(buffer, pos)
+                if match is None:
+                    pos = len(buffer)
+                elif match.group() == '"':
+                    in_string = False
+                    pos = match.end()
+                elif match.end() < len(buffer):
+                    # skip the escaped character
+                    pos = match.end() + 1
+                else:
+                    # the escaped character has not arrived yet
+                    pos = match.start()
+                    break
+                continue
+
+            match = _STRUCTURAL.search(buffer, pos)
+            if match is None:
+                pos = len(buffer)
+                break
+
+            char = match.group()
+            pos = match.end()
+            if char == '"':
+                in_string = True
+            elif char in "[{":
+                depth += 1
+            elif char in "]}":
+                depth -= 1
+                if depth == 0:
+                    self._parse(buffer[start : match.start()], items)
+                    self.done = True
+                    break
+            elif depth == 1:
+                self._parse(buffer[start : match.start()], items)
+                start = pos
+
+        # only the element that is still incomplete is kept
+        self._buffer = "" if self.done else buffer[start:]
+        self._pos = pos - start
+        self._depth = depth
+        self._in_string = in_string
+        return items
+
+    def _parse(self, text: str, items: List[Any]) -> None:
+        text = text.strip()
+        if not text:
+            return
+
+        try:
+            if self.container == "[":
+                item = json_loads(text)
+            else:
+                ((key, item),) = json_loads("{" + text + "}").items()
+        except ValueError as e:
+            raise StructuredOutputError(f"Invalid JSON in the response: {text}") from e
+
+        if self._validate is not None:
+            item = self._validate(item)
+        items.append(item if self.container == "[" else (key, item))
+
+    def finish(self) -> None:
+        if self.container is None:
+            raise StructuredOutputError(
+                "The response does not contain a JSON array or object"
+            )
+        if not self.done:
+            raise StructuredOutputError(
+                "The response ended before the JSON was complete"
+            )
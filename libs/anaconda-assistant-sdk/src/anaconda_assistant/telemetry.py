@@ -0,0 +1,166 @@
+import atexit
+import os
+from collections import deque
+from pathlib import Path
+from threading import Condition
+from threading import Lock
+from threading import Thread
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
+
+from anaconda_assistant.serialization import default_json_dumps
+
+
+class JSONLSink:
+    """Append telemetry records to a local JSON lines file
+
+    Records passed to .emit() are queued and written in batches by a
+    background thread, so logging never waits on the disk. At most
+    max_queue records are held, the oldest ones are dropped when the
+    writer falls behind and counted in .dropped.
+
+    The file is rotated once it grows past max_bytes, keeping backup_count
+    older files named path.1, path.2, ..."""
+
+    def __init__(
+        self,
+        path: Union[str, Path],
+        max_bytes: int = 10 * 1024 * 1024,
+        backup_count: int = 3,
+        max_queue: int = 10000,
+        batch_size: int = 100,
+        flush_interval: float = 1.0,
+    ) -> None:
+        self.path = Path(path).expanduser()
+        self.max_bytes = max_bytes
+        self.backup_count = backup_count
+        self.batch_size = batch_size
+        self.flush_interval = flush_interval
+        self.dropped = 0
+
+        self._queue: Deque[Dict[str, Any]] = deque(maxlen=max_queue)
+        self._writing = 0
+        self._closed = False
+        self._condition = Condition()
+        self._thread: Optional[Thread] = None
+
+    def emit(self, record: Dict[str, Any]) -> None:
+        """Queue a record to be written"""
+        with self._condition:
+            if self._closed:
+                return
+            if len(self._queue) == self._queue.maxlen:
+                self.dropped += 1
+            self._queue.append(record)
+
+            if self._thread is None:
+                self._thread = Thread(
+                    target=self._run, name="anaconda-assistant-telemetry", daemon=True
+                )
+                self._thread.start()
+                atexit.register(self.close)
+            elif len(self._queue) == 1 or len(self._queue) >= self.batch_size:
+                self._condition.notify_all()
+
+    def _take_batch(self) -> Optional[List[Dict[str, Any]]]:
+        with self._condition:
+            while not self._queue and not self._closed:
+                self._condition.wait()
+            if not self._queue:
+                return None
+
+            if len(self._queue) < self.batch_size and not self._closed:
+                # give the batch some time to fill up
+                self._condition.wait(self.flush_interval)
+
+            batch: List[Dict[str, Any]] = []
+            while self._queue and len(batch) < self.batch_size:
+                batch.append(self._queue.popleft())
+            self._writing = len(batch)
+            return batch
+
+    def _run(self) -> None:
+        while True:
+            batch = self._take_batch()
+            if batch is None:
+                return
+
+            # telemetry must never break the client or stop the writer
+            failed = 0
+            try:
+                lines = []
+                for record in batch:
+                    try:
+                        lines.append(default_json_dumps(record) + b"\n")
+                    except Exception:
+                        failed += 1
+                if lines:
+                    self._write(b"".join(lines))
+            except Exception:
+                failed = len(batch)
+            finally:
+                with self._condition:
+                    self.dropped += failed
+                    self._writing = 0
+                    self._condition.notify_all()
+
+    def _write(self, data: bytes) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        try:
+            size = self.path.stat().st_size
+        except FileNotFoundError:
+            size = 0
+
+        if size and size + len(data) > self.max_bytes:
+            self._rotate()
+
+        with self.path.open("ab") as f:
+            f.write(data)
+
+    def _rotate(self) -> None:
+        if self.backup_count <= 0:
+            self.path.unlink()
+            return
+
+        for i in range(self.backup_count - 1, 0, -1):
+            source = self.path.with_name(f"{self.path.name}.{i}")
+            if source.exists():
+                os.replace(source, self.path.with_name(f"{self.path.name}.{i + 1}"))
+        os.replace(self.path, self.path.with_name(f"{self.path.name}.1"))
+
+    def flush(self, timeout: Optional[float] = None) -> bool:
+        """Wait until all queued records are written, return False on timeout"""
+        with self._condition:
+            self._condition.notify_all()
+            return self._condition.wait_for(
+                lambda: (not self._queue and not self._writing) or self._thread is None,
+                timeout=timeout,
+            )
+
+    def close(self, timeout: Optional[float] = 5.0) -> None:
+        """Write the queued records and stop the writer thread"""
+        with self._condition:
+            self._closed = True
+            self._condition.notify_all()
+            thread = self._thread
+
+        if thread is not None:
+            thread.join(timeout)
+
+
+_SINKS: Dict[Path, JSONLSink] = {}
+_SINKS_LOCK = Lock()
+
+
+def get_sink(path: Union[str, Path]) -> JSONLSink:
+    """Return the sink shared by all clients writing to path"""
+    path = Path(path).expanduser().resolve()
+    with _SINKS_LOCK:
+        sink = _SINKS.get(path)
+        if sink is None or sink._closed:
+            sink = _SINKS[path] = JSONLSink(path)
+        return sink
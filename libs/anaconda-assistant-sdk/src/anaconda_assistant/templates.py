@@ -0,0 +1,161 @@
+from collections import OrderedDict
+from string import Formatter
+from threading import Lock
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import Mapping
+from typing import Optional
+from typing import Tuple
+
+from anaconda_assistant.serialization import JSONSerializer
+
+
+class _Template:
+    """A str.format template parsed once"""
+
+    def __init__(self, template: str) -> None:
+        self.template = template
+        parsed = list(Formatter().parse(template))
+        # the variable names used, e.g. user for {user.name} or {user[0]}
+        self.fields = tuple(
+            dict.fromkeys(
+                field.split(".", 1)[0].split("[", 1)[0]
+                for _, field, _, _ in parsed
+                if field is not None
+            )
+        )
+        # templates only using {name} fields are rendered by joining the parts,
+        # anything else, like {name!r} or {user.name}, falls back to str.format
+        self.simple = all(
+            field is None or (field.isidentifier() and not spec and conversion is None)
+            for _, field, spec, conversion in parsed
+        )
+        self.parts = [(literal, field) for literal, field, _, _ in parsed]
+        self.static: Optional[str] = (
+            "".join(literal for literal, _ in self.parts) if not self.fields else None
+        )
+
+    def render(self, variables: Mapping[str, Any]) -> str:
+        if self.static is not None:
+            return self.static
+        if not self.simple:
+            return self.template.format_map(variables)
+
+        rendered = []
+        for literal, field in self.parts:
+            rendered.append(literal)
+            if field is not None:
+                rendered.append(str(variables[field]))
+        return "".join(rendered)
+
+
+class PromptTemplate:
+    """System, example and user messages compiled once and rendered per request
+
+    The messages are str.format templates, e.g. "Explain the {language}
+    error", filled in with the variables passed to ChatClient.completions
+    or .user_message(). Static parts of the request body are serialized
+    once and cached, up to cache_size renderings of the system and example
+    messages are kept for the type and value of the variables they use, so
+    variables must not be mutated between requests."""
+
+    def __init__(
+        self,
+        system_message: Optional[str] = None,
+        example_messages: Optional[List[Dict[str, str]]] = None,
+        user_message: Optional[str] = None,
+        cache_size: int = 128,
+    ) -> None:
+        self.system_message = system_message
+        self.example_messages = example_messages
+        self.user_message_template = user_message
+        self.cache_size = cache_size
+
+        self._system = None if system_message is None else _Template(system_message)
+        self._examples = [
+            (message, _Template(message["content"]))
+            for message in (example_messages or [])
+        ]
+        self._user = None if user_message is None else _Template(user_message)
+
+        fields: Dict[str, None] = {}
+        for template in [self._system, *(t for _, t in self._examples)]:
+            if template is not None:
+                fields.update(dict.fromkeys(template.fields))
+        self.prompt_variables = tuple(fields)
+        self.variables = tuple(
+            dict.fromkeys(
+                self.prompt_variables + (self._user.fields if self._user else ())
+            )
+        )
+
+        self._encoded: "OrderedDict[Tuple[Any, ...], bytes]" = OrderedDict()
+        self._lock = Lock()
+
+    def custom_prompt(
+        self, variables: Optional[Mapping[str, Any]] = None
+    ) -> Optional[Dict[str, Any]]:
+        """Return the custom_prompt of the request body or None without a system message"""
+        if self._system is None:
+            return None
+
+        variables = {} if variables is None else variables
+        return {
+            "system_message": {
+                "role": "system",
+                "content": self._system.render(variables),
+            },
+            "example_messages": [
+                {**message, "content": template.render(variables)}
+                for message, template in self._examples
+            ]
+            if self.example_messages is not None
+            else None,
+        }
+
+    def encoded_custom_prompt(
+        self,
+        json_dumps: JSONSerializer,
+        variables: Optional[Mapping[str, Any]] = None,
+    ) -> Optional[bytes]:
+        """Return the serialized custom_prompt, cached for the variables it uses"""
+        if self._system is None:
+            return None
+
+        variables = {} if variables is None else variables
+        key: Tuple[Any, ...] = (json_dumps,)
+        for name in self.prompt_variables:
+            value = variables[name]
+            # 1, 1.0 and True are equal keys but render differently
+            key += ((type(value), value),)
+        try:
+            hash(key)
+        except TypeError:
+            return json_dumps(self.custom_prompt(variables))
+
+        with self._lock:
+            encoded = self._encoded.get(key)
+            if encoded is not None:
+                self._encoded.move_to_end(key)
+                return encoded
+
+        encoded = json_dumps(self.custom_prompt(variables))
+        with self._lock:
+            self._encoded[key] = encoded
+            while len(self._encoded) > self.cache_size:
+                self._encoded.popitem(last=False)
+        return encoded
+
+    def user_message(self, **variables: Any) -> Dict[str, str]:
+        """Render the user message template"""
+        if self._user is None:
+            raise ValueError("This PromptTemplate has no user_message template")
+        return {"role": "user", "content": self._user.render(variables)}
+
+    def __repr__(self) -> str:
+        return (
+            f"{self.__class__.__name__}(system_message={self.system_message!r}, "
+            f"example_messages={self.example_messages!r}, "
+            f"user_message={self.user_message_template!r})"
+        )
@@ -1,8 +1,15 @@
+import json
 from pathlib import Path
 from typing import Any
+from typing import Generator
 
 import pytest
+import responses
+import responses.matchers
 from pytest import MonkeyPatch
+from pytest_mock import MockerFixture
+
+from anaconda_assistant.api_client import APIClient
 
 
 @pytest.fixture()
@@ -40,3 +47,52 @@ def fake_config_toml(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
 
     monkeypatch.delenv("ANACONDA_ASSISTANT_ACCEPTED_TERMS", raising=False)
     monkeypatch.delenv("ANACONDA_ASSISTANT_DATA_COLLECTION", raising=False)
+
+
+@pytest.fixture
+def accepted_terms_and_data_collection(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("ANACONDA_ASSISTANT_ACCEPTED_TERMS", "true")
+    monkeypatch.setenv("ANACONDA_ASSISTANT_DATA_COLLECTION", "true")
+
+
+@pytest.fixture
+def mocked_api_domain(mocker: MockerFixture) -> Generator[str, None, None]:
+    mocker.patch(
+        "anaconda_auth.client.BaseClient.email",
+        return_value="me@example.com",
+        new_callable=mocker.PropertyMock,
+    )
+
+    api_client = APIClient(domain="mocking-assistant")
+
+    with responses.RequestsMock(assert_all_requests_are_fired=False) as resp:
+        resp.add(
+            responses.POST,
+            api_client.urljoin("/completions"),
+            status=429,
+            body=json.dumps({"message": "Too many requests"}),
+            match=[
+                responses.matchers.json_params_matcher(
+                    {
+                        "messages": [
+                            {
+                                "role": "user",
+                                "content": "I've said too much",
+                                "message_id": "0",
+                            }
+                        ]
+                    },
+                    strict_match=False,
+                )
+            ],
+        )
+        resp.add(
+            responses.POST,
+            api_client.urljoin("/completions"),
+            body=(
+                "I am Anaconda Assistant, an AI designed to help you with a variety of tasks, "
+                "answer questions, and provide information on a wide range of topics. How can "
+                "I assist you today?__TOKENS_42/424242__"
+            ),
+        )
+        yield "mocking-assistant"
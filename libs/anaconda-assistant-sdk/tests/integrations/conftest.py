@@ -0,0 +1,57 @@
+import json
+from typing import Any
+from typing import AsyncIterator
+from typing import Dict
+from typing import List
+
+import httpx
+import pytest
+from pytest_mock import MockerFixture
+
+# the response of the mocked_api_domain fixture
+MESSAGE = (
+    "I am Anaconda Assistant, an AI designed to help you with a variety of tasks, "
+    "answer questions, and provide information on a wide range of topics. How can "
+    "I assist you today?"
+)
+
+
+@pytest.fixture
+def message() -> str:
+    """The message answered to every request"""
+    return MESSAGE
+
+
+@pytest.fixture
+def async_requests(mocker: MockerFixture) -> List[Dict[str, Any]]:
+    """Answer the requests of every AsyncChatClient like mocked_api_domain
+
+    The bodies of the requests are appended to the returned list."""
+    bodies: List[Dict[str, Any]] = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        body = json.loads(request.content)
+        bodies.append(body)
+        if body["messages"][-1]["content"] == "I've said too much":
+            return httpx.Response(429, json={"message": "Too many requests"})
+
+        data = f"{MESSAGE}__TOKENS_42/424242__".encode()
+
+        async def stream() -> AsyncIterator[bytes]:
+            for i in range(0, len(data), 16):
+                yield data[i : i + 16]
+
+        return httpx.Response(200, content=stream())
+
+    transport = httpx.MockTransport(handler)
+    async_client = httpx.AsyncClient
+    mocker.patch(
+        "anaconda_assistant.async_client.httpx.AsyncClient",
+        side_effect=lambda **kwargs: async_client(**{**kwargs, "transport": transport}),
+    )
+    mocker.patch(
+        "anaconda_auth.client.BaseClient.email",
+        return_value="me@example.com",
+        new_callable=mocker.PropertyMock,
+    )
+    return bodies
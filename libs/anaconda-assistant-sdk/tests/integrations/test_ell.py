@@ -0,0 +1,75 @@
+from typing import Any
+
+import pytest
+from pytest_mock import MockerFixture
+
+ell = pytest.importorskip("ell")
+
+from anaconda_assistant.core import ChatClient  # noqa: E402
+from anaconda_assistant.integrations.ell import AnacondaAssistantClient  # noqa: E402
+from anaconda_assistant.integrations.ell import anaconda_assistant_provider  # noqa: E402
+from anaconda_assistant.integrations.ell import client  # noqa: E402
+from anaconda_assistant.integrations.ell import register_model  # noqa: E402
+from anaconda_assistant.pool import SessionPool  # noqa: E402
+
+
+def test_import_does_not_create_client() -> None:
+    # the terms of service have not been accepted in this test
+    assert isinstance(client, AnacondaAssistantClient)
+    assert client._client is None
+    assert ell.config.get_client_for("anaconda-assistant")[0] is client
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_register_model(mocked_api_domain: str, message: str) -> None:
+    brief = register_model(
+        "anaconda-assistant-brief", system_message="Be brief", domain=mocked_api_domain
+    )
+    assert ell.config.get_client_for("anaconda-assistant-brief")[0] is brief
+    assert brief._client is None
+
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    assert brief.completions(messages).message == message
+    assert brief.client.system_message == "Be brief"
+
+    # models registered with the same settings share the ChatClient
+    again = register_model(
+        "anaconda-assistant-short", system_message="Be brief", domain=mocked_api_domain
+    )
+    assert again.client is brief.client
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_client_pool(mocked_api_domain: str, mocker: MockerFixture) -> None:
+    pool = SessionPool()
+    create = mocker.spy(pool, "client")
+    model_client = AnacondaAssistantClient(domain=mocked_api_domain, pool=pool)
+
+    assert isinstance(model_client.client, ChatClient)
+    assert model_client.client is model_client.client
+    create.assert_called_once_with(
+        system_message=None, domain=mocked_api_domain, api_key=None, api_version=None
+    )
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_provider(mocked_api_domain: str, message: str, mocker: MockerFixture) -> None:
+    model_client = AnacondaAssistantClient(domain=mocked_api_domain)
+    ell_call: Any = mocker.Mock(
+        messages=[ell.user("Who are you?")],
+        api_params={"api_params": {}},
+        tools=None,
+    )
+
+    params = anaconda_assistant_provider.translate_to_provider(ell_call)
+    assert params["messages"] == [
+        {"role": "user", "content": "Who are you?", "message_id": mocker.ANY}
+    ]
+
+    call = anaconda_assistant_provider.provider_call_function(model_client)
+    response = call(**params)
+    results, metadata = anaconda_assistant_provider.translate_from_provider(
+        response, ell_call, params
+    )
+    assert results[0].text_only == message
+    assert metadata["usage"]["total_tokens"] == 42
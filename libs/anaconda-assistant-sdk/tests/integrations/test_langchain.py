@@ -0,0 +1,300 @@
+import asyncio
+from typing import Any
+from typing import Dict
+from typing import List
+
+import pytest
+from pytest_mock import MockerFixture
+
+pytest.importorskip("langchain_core")
+
+from langchain_core.caches import InMemoryCache  # noqa: E402
+from langchain_core.callbacks import BaseCallbackHandler  # noqa: E402
+from langchain_core.callbacks import get_usage_metadata_callback  # noqa: E402
+from langchain_core.language_models import LanguageModelInput  # noqa: E402
+from langchain_core.messages import AIMessage  # noqa: E402
+from langchain_core.messages import AIMessageChunk  # noqa: E402
+
+from anaconda_assistant.async_client import AsyncChatClient  # noqa: E402
+from anaconda_assistant.core import ChatClient  # noqa: E402
+from anaconda_assistant.exceptions import DailyQuotaExceeded  # noqa: E402
+from anaconda_assistant.integrations.langchain import AnacondaAssistant  # noqa: E402
+from anaconda_assistant.streaming import CoalesceBytesPolicy  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures("accepted_terms_and_data_collection")
+
+
+def test_invoke(mocked_api_domain: str, message: str, mocker: MockerFixture) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain, system_message="Be brief")
+    completions = mocker.spy(ChatClient, "completions")
+
+    result = model.invoke("Who are you?")
+    assert isinstance(result, AIMessage)
+    assert result.content == message
+
+    client = model.client
+    assert client.system_message == "Be brief"
+    model.invoke("Who are you?", session_id="s1")
+    assert model.client is client
+
+    assert completions.call_count == 2
+    assert completions.call_args.kwargs["session_id"] == "s1"
+    assert completions.call_args.kwargs["messages"] == [
+        {"role": "user", "content": "Who are you?", "message_id": mocker.ANY}
+    ]
+
+
+def test_stream(mocked_api_domain: str, message: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    chunks = list(model.stream("Who are you?"))
+    assert "".join(str(chunk.content) for chunk in chunks) == message
+
+
+def test_stream_policy(
+    mocked_api_domain: str, async_requests: List[Dict[str, Any]], message: str
+) -> None:
+    model = AnacondaAssistant(
+        domain=mocked_api_domain, stream_policy=CoalesceBytesPolicy(min_bytes=64)
+    )
+    assert model.client.stream_policy is model.stream_policy
+
+    def contents(chunks: List[AIMessageChunk]) -> List[str]:
+        return [str(chunk.content) for chunk in chunks if chunk.content]
+
+    deltas = contents(list(model.stream("Who are you?")))
+    assert "".join(deltas) == message
+    assert all(len(delta) >= 64 for delta in deltas[:-1])
+
+    async def run() -> List[str]:
+        return contents([chunk async for chunk in model.astream("Who are you?")])
+
+    # the async responses arrive 16 bytes at a time
+    deltas = asyncio.run(run())
+    assert "".join(deltas) == message
+    assert len(deltas) == 3
+
+
+def test_ainvoke(async_requests: List[Dict[str, Any]], message: str) -> None:
+    model = AnacondaAssistant(domain="mocking-assistant")
+
+    async def run() -> Any:
+        result = await model.ainvoke("Who are you?", session_id="s1")
+        chunks = [chunk async for chunk in model.astream("Who are you?")]
+        return result, chunks
+
+    result, chunks = asyncio.run(run())
+    assert result.content == message
+    assert "".join(str(chunk.content) for chunk in chunks) == message
+    assert async_requests[0]["session"]["session_id"] == "s1"
+    assert async_requests[1]["session"]["session_id"] == model.client.id
+
+
+class _RunRecorder(BaseCallbackHandler):
+    def __init__(self) -> None:
+        self.started = 0
+        self.ended = 0
+        self.errors: List[BaseException] = []
+
+    def on_chat_model_start(self, *args: Any, **kwargs: Any) -> None:
+        self.started += 1
+
+    def on_llm_end(self, *args: Any, **kwargs: Any) -> None:
+        self.ended += 1
+
+    def on_llm_error(self, error: BaseException, **kwargs: Any) -> None:
+        self.errors.append(error)
+
+
+@pytest.fixture
+def quota_exceeded(mocker: MockerFixture) -> Any:
+    """Fail the sync requests of "I've said too much" with DailyQuotaExceeded"""
+    completions = ChatClient.completions
+
+    def side_effect(self: ChatClient, messages: Any, *args: Any, **kwargs: Any) -> Any:
+        if messages[-1]["content"] == "I've said too much":
+            raise DailyQuotaExceeded("Too many requests")
+        return completions(self, messages, *args, **kwargs)
+
+    return mocker.patch.object(
+        ChatClient, "completions", autospec=True, side_effect=side_effect
+    )
+
+
+def test_batch(mocked_api_domain: str, message: str, mocker: MockerFixture) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    batch = mocker.spy(ChatClient, "batch")
+    recorder = _RunRecorder()
+
+    results = model.batch(
+        ["Who are you?", "What do you want?"],
+        {"callbacks": [recorder]},
+        stop=["Assistant"],
+        variables={"name": "value"},
+    )
+
+    assert [result.content for result in results] == ["I am Anaconda "] * 2
+    assert batch.call_args.kwargs["stop"] == ["Assistant"]
+    assert batch.call_args.kwargs["variables"] == {"name": "value"}
+    assert recorder.started == recorder.ended == 2
+
+
+def test_batch_max_concurrency(mocked_api_domain: str, mocker: MockerFixture) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain, max_concurrency=4)
+    batch = mocker.spy(ChatClient, "batch")
+    inputs: List[LanguageModelInput] = ["Who are you?"] * 3
+
+    model.batch(inputs)
+    assert batch.call_args.kwargs["max_workers"] == 4
+    model.batch(inputs, {"max_concurrency": 2})
+    assert batch.call_args.kwargs["max_workers"] == 2
+    model.batch(inputs, [{"max_concurrency": 1}, {}, {}])
+    assert batch.call_args.kwargs["max_workers"] == 1
+    # the config cannot raise the limit of the model
+    model.batch(inputs, {"max_concurrency": 8})
+    assert batch.call_args.kwargs["max_workers"] == 4
+
+
+def test_abatch_max_concurrency(
+    async_requests: List[Dict[str, Any]], mocker: MockerFixture
+) -> None:
+    model = AnacondaAssistant(domain="mocking-assistant", max_concurrency=4)
+    completions = AsyncChatClient.completions
+    in_flight = 0
+    peak: List[int] = []
+
+    async def slow(self: AsyncChatClient, *args: Any, **kwargs: Any) -> Any:
+        nonlocal in_flight
+        in_flight += 1
+        peak.append(in_flight)
+        await asyncio.sleep(0.01)
+        in_flight -= 1
+        return await completions(self, *args, **kwargs)
+
+    mocker.patch.object(AsyncChatClient, "completions", slow)
+    inputs: List[LanguageModelInput] = ["Who are you?"] * 6
+
+    asyncio.run(model.abatch(inputs))
+    assert max(peak) == 4
+    peak.clear()
+    asyncio.run(model.abatch(inputs, {"max_concurrency": 2}))
+    assert max(peak) == 2
+
+
+def test_batch_session_id(
+    mocked_api_domain: str, message: str, mocker: MockerFixture
+) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    batch = mocker.spy(ChatClient, "batch")
+    completions = mocker.spy(ChatClient, "completions")
+
+    results = model.batch(["Who are you?", "What do you want?"], session_id="s1")
+
+    assert [result.content for result in results] == [message] * 2
+    assert batch.call_count == 0
+    assert [c.kwargs["session_id"] for c in completions.call_args_list] == ["s1"] * 2
+
+
+def test_batch_return_exceptions(
+    mocked_api_domain: str, message: str, quota_exceeded: Any
+) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    recorder = _RunRecorder()
+    inputs: List[LanguageModelInput] = ["Who are you?", "I've said too much"]
+
+    results = model.batch(inputs, {"callbacks": [recorder]}, return_exceptions=True)
+    assert results[0].content == message
+    assert isinstance(results[1], DailyQuotaExceeded)
+    assert recorder.ended == 1
+    assert len(recorder.errors) == 1
+
+    with pytest.raises(DailyQuotaExceeded):
+        model.batch(inputs)
+
+
+def test_batch_error_closes_runs(mocked_api_domain: str, mocker: MockerFixture) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    mocker.patch.object(ChatClient, "batch", side_effect=RuntimeError("broken"))
+    recorder = _RunRecorder()
+
+    with pytest.raises(RuntimeError):
+        model.batch(["Who are you?", "What do you want?"], {"callbacks": [recorder]})
+    assert recorder.started == 2
+    assert len(recorder.errors) == 2
+
+
+def test_batch_cache(mocked_api_domain: str, mocker: MockerFixture) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain, cache=InMemoryCache())
+    completions = mocker.spy(ChatClient, "completions")
+
+    first = model.batch(["Who are you?"])
+    second = model.batch(["Who are you?"])
+    assert first[0].content == second[0].content
+    assert completions.call_count == 1
+
+
+def test_abatch(async_requests: List[Dict[str, Any]], message: str) -> None:
+    model = AnacondaAssistant(domain="mocking-assistant")
+    recorder = _RunRecorder()
+    inputs: List[LanguageModelInput] = [
+        "Who are you?",
+        "What do you want?",
+        "I've said too much",
+    ]
+
+    async def run(**kwargs: Any) -> List[Any]:
+        return await model.abatch(
+            inputs, {"callbacks": [recorder]}, return_exceptions=True, **kwargs
+        )
+
+    results = asyncio.run(run())
+    assert [r.content for r in results[:2]] == [message] * 2
+    assert isinstance(results[2], DailyQuotaExceeded)
+    assert recorder.started == 3
+    assert recorder.ended == 2
+    assert len(recorder.errors) == 1
+    session_ids = {body["session"]["session_id"] for body in async_requests}
+    assert len(session_ids) == 3
+
+    async_requests.clear()
+    results = asyncio.run(run(session_id="s1", stop=["Assistant"]))
+    assert [r.content for r in results[:2]] == ["I am Anaconda "] * 2
+    assert {body["session"]["session_id"] for body in async_requests} == {"s1"}
+
+    with pytest.raises(DailyQuotaExceeded):
+        asyncio.run(model.abatch(inputs))
+
+
+def test_usage_metadata(mocked_api_domain: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+
+    with get_usage_metadata_callback() as callback:
+        result = model.invoke("Who are you?")
+    assert result.response_metadata["tokens_used"] == 42
+    assert result.response_metadata["token_limit"] == 424242
+    assert isinstance(result, AIMessage)
+    assert result.usage_metadata == {
+        "input_tokens": 0,
+        "output_tokens": 42,
+        "total_tokens": 42,
+    }
+    assert callback.usage_metadata["anaconda-assistant"]["total_tokens"] == 42
+
+
+def test_stream_usage_chunk(mocked_api_domain: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    chunks = list(model.stream("Who are you?"))
+
+    (usage,) = [chunk for chunk in chunks if chunk.usage_metadata is not None]
+    assert usage.content == ""
+    assert usage.usage_metadata is not None
+    assert usage.usage_metadata["output_tokens"] == 42
+    assert usage.response_metadata["model_name"] == "anaconda-assistant"
+
+
+def test_stream_stopped_without_usage(mocked_api_domain: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    chunks = list(model.stream("Who are you?", stop=["Assistant"]))
+
+    assert "".join(str(chunk.content) for chunk in chunks) == "I am Anaconda "
+    # the response was closed before its token count
+    assert all(chunk.usage_metadata is None for chunk in chunks)
@@ -0,0 +1,160 @@
+import asyncio
+from typing import Any
+from typing import Dict
+from typing import List
+
+import pytest
+
+pytest.importorskip("llama_index.core")
+
+from llama_index.core.base.llms.types import ChatMessage  # noqa: E402
+from llama_index.core.base.llms.types import MessageRole  # noqa: E402
+
+from anaconda_assistant.integrations.llama_index import AnacondaAssistant  # noqa: E402
+from anaconda_assistant.integrations.llama_index import _StreamedText  # noqa: E402
+from anaconda_assistant.integrations.llama_index import (  # noqa: E402
+    _StreamedCompletionResponse,
+)
+from anaconda_assistant.streaming import CoalesceBytesPolicy  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures("accepted_terms_and_data_collection")
+
+MESSAGES = [ChatMessage(role=MessageRole.USER, content="Who are you?")]
+
+
+def test_complete(mocked_api_domain: str, message: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    assert model.complete("Who are you?").text == message
+
+
+def test_stream_complete(mocked_api_domain: str, message: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    responses = list(model.stream_complete("Who are you?"))
+
+    assert "".join(r.delta or "" for r in responses) == message
+    assert responses[-1].text == message
+
+
+def test_chat(mocked_api_domain: str, message: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    response = model.chat(MESSAGES)
+    assert response.message.role == MessageRole.ASSISTANT
+    assert response.message.content == message
+
+
+def test_stream_chat(mocked_api_domain: str, message: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain)
+    responses = list(model.stream_chat(MESSAGES))
+
+    assert "".join(r.delta or "" for r in responses) == message
+    assert responses[-1].message.content == message
+
+
+def test_stop(mocked_api_domain: str) -> None:
+    model = AnacondaAssistant(domain=mocked_api_domain, stop=[", an AI"])
+    assert model.complete("Who are you?").text == "I am Anaconda Assistant"
+    assert model.chat(MESSAGES).message.content == "I am Anaconda Assistant"
+
+    responses = list(model.stream_complete("Who are you?", stop=[" Assistant"]))
+    assert responses[-1].text == "I am Anaconda"
+
+
+def test_async(async_requests: List[Dict[str, Any]], message: str) -> None:
+    model = AnacondaAssistant(domain="mocking-assistant")
+
+    async def run() -> List[str]:
+        texts = [
+            (await model.acomplete("Who are you?")).text,
+            str((await model.achat(MESSAGES)).message.content),
+        ]
+        responses = [r async for r in await model.astream_complete("Who are you?")]
+        texts.append(responses[-1].text)
+        responses = [r async for r in await model.astream_chat(MESSAGES)]
+        texts.append(str(responses[-1].message.content))
+        texts.append("".join(r.delta or "" for r in responses))
+        return texts
+
+    assert asyncio.run(run()) == [message] * 5
+    assert len(async_requests) == 4
+    assert async_requests[1]["messages"] == [
+        {"role": "user", "content": "Who are you?", "message_id": "0"}
+    ]
+
+
+def test_async_stop(async_requests: List[Dict[str, Any]]) -> None:
+    model = AnacondaAssistant(domain="mocking-assistant", stop=[", an AI"])
+
+    async def run() -> List[str]:
+        responses = [r async for r in await model.astream_chat(MESSAGES)]
+        return [
+            (await model.acomplete("Who are you?")).text,
+            (await model.acomplete("Who are you?", stop=[" Assistant"])).text,
+            str(responses[-1].message.content),
+        ]
+
+    assert asyncio.run(run()) == [
+        "I am Anaconda Assistant",
+        "I am Anaconda",
+        "I am Anaconda Assistant",
+    ]
+
+
+def test_streamed_text() -> None:
+    stream = _StreamedText()
+    assert [stream.append(delta) for delta in ["I ", "am ", "Anaconda"]] == [1, 2, 3]
+
+    assert stream.text(2) == "I am "
+    assert stream.text(3) == "I am Anaconda"
+    assert stream.text(1) == "I "
+    assert stream.text(0) == ""
+    assert stream.text(3) == "I am Anaconda"
+
+
+def test_streamed_response_text_is_lazy() -> None:
+    stream = _StreamedText()
+    first = _StreamedCompletionResponse.streamed(stream, "I am")
+    second = _StreamedCompletionResponse.streamed(stream, " Anaconda")
+
+    assert second.delta == " Anaconda"
+    assert "text" not in second.__dict__
+    assert second.text == "I am Anaconda"
+    assert "text" in second.__dict__
+    assert first.model_dump()["text"] == "I am"
+
+
+def test_stream_not_coalesced_by_default(
+    async_requests: List[Dict[str, Any]], message: str
+) -> None:
+    model = AnacondaAssistant(domain="mocking-assistant")
+    assert model._model.stream_policy is None
+
+    async def run() -> List[str]:
+        responses = [r async for r in await model.astream_complete("Who are you?")]
+        return [r.delta or "" for r in responses]
+
+    # every 16 byte chunk is forwarded as it arrives
+    deltas = asyncio.run(run())
+    assert "".join(deltas) == message
+    assert len(deltas) == -(-len(message) // 16)
+
+
+def test_stream_policy(
+    mocked_api_domain: str, async_requests: List[Dict[str, Any]], message: str
+) -> None:
+    model = AnacondaAssistant(
+        domain=mocked_api_domain, stream_policy=CoalesceBytesPolicy(min_bytes=64)
+    )
+    responses = list(model.stream_complete("Who are you?"))
+    deltas = [r.delta or "" for r in responses]
+    assert "".join(deltas) == message
+    assert all(len(delta) >= 64 for delta in deltas[:-1])
+
+    async def run() -> List[str]:
+        responses = [r async for r in await model.astream_chat(MESSAGES)]
+        return [r.delta or "" for r in responses]
+
+    # the async responses arrive 16 bytes at a time
+    deltas = asyncio.run(run())
+    assert "".join(deltas) == message
+    assert len(deltas) == 3
+    assert all(len(delta) >= 64 for delta in deltas[:-1])
@@ -0,0 +1,173 @@
+import asyncio
+from typing import Any
+from typing import Dict
+from typing import List
+from typing import cast
+
+import pytest
+from pytest import MonkeyPatch
+from pytest_mock import MockerFixture
+
+llm = pytest.importorskip("llm")
+
+from anaconda_assistant.integrations.llm import AnacondaAssistantChat  # noqa: E402
+from anaconda_assistant.integrations.llm import AsyncAnacondaAssistantChat  # noqa: E402
+from anaconda_assistant.streaming import CoalesceBytesPolicy  # noqa: E402
+
+pytestmark = pytest.mark.usefixtures("accepted_terms_and_data_collection")
+
+
+@pytest.fixture
+def model(mocked_api_domain: str, monkeypatch: MonkeyPatch) -> AnacondaAssistantChat:
+    monkeypatch.setenv("ANACONDA_AUTH_DOMAIN", mocked_api_domain)
+    return AnacondaAssistantChat()
+
+
+def test_prompt(model: AnacondaAssistantChat, message: str) -> None:
+    response = model.prompt("Who are you?", system="Be brief", stream=False)
+    assert response.text() == message
+    assert response.json() == {"message": {"content": message}}
+    assert response._prompt_json is not None
+    assert [m["role"] for m in response._prompt_json["messages"]] == [
+        "system",
+        "user",
+    ]
+
+    assert "".join(model.prompt("Who are you?")) == message
+
+
+def test_prompt_stop(model: AnacondaAssistantChat) -> None:
+    response = model.prompt("Who are you?", stream=False, stop=", an AI")
+    assert response.text() == "I am Anaconda Assistant"
+    assert "".join(model.prompt("Who are you?", stop=" Assistant")) == "I am Anaconda"
+
+
+def test_client_reused(model: AnacondaAssistantChat) -> None:
+    model.prompt("Who are you?").text()
+    client = model.client
+    model.prompt("Who are you?").text()
+    assert model.client is client
+    assert AnacondaAssistantChat().client is not client
+
+
+def test_async_prompt(async_requests: List[Dict[str, Any]], message: str) -> None:
+    model = AsyncAnacondaAssistantChat()
+
+    async def run() -> List[str]:
+        texts = [await model.prompt("Who are you?", system="Be brief").text()]
+        client = model.async_client
+        streamed = model.prompt("Who are you?", stop=", an AI")
+        texts.append("".join([chunk async for chunk in streamed]))
+        assert model.async_client is client
+        return texts
+
+    assert asyncio.run(run()) == [message, "I am Anaconda Assistant"]
+    assert [m["role"] for m in async_requests[0]["messages"]] == ["system", "user"]
+
+    # a new event loop gets its own httpx client sharing the ChatClient
+    client = model.client
+    assert asyncio.run(run()) == [message, "I am Anaconda Assistant"]
+    assert model.client is client
+    assert len(async_requests) == 4
+
+
+def _messages(response: Any) -> List[Dict[str, str]]:
+    return cast(List[Dict[str, str]], response._prompt_json["messages"])
+
+
+def test_conversation_message_ids(
+    model: AnacondaAssistantChat, message: str, mocker: MockerFixture
+) -> None:
+    text_or_raise = mocker.spy(llm.Response, "text_or_raise")
+    conversation = model.conversation()
+    first = conversation.prompt("Hi", system="Be brief")
+    first.text()
+    second = conversation.prompt("Again", system="Be brief")
+    second.text()
+    third = conversation.prompt("Once more", system="Be brief")
+    third.text()
+
+    system, user = _messages(first)
+    assert [m["role"] for m in _messages(third)] == [
+        "system",
+        "user",
+        "assistant",
+        "user",
+        "assistant",
+        "user",
+    ]
+    # the history keeps the ids it was sent with
+    assert _messages(third)[:4] == _messages(second)
+    assert _messages(second)[:2] == [system, user]
+    assert _messages(second)[2]["content"] == message
+    # every previous response is read once
+    assert text_or_raise.call_count == 2
+
+    conversation.prompt("Change", system="Be verbose").text()
+    assert [m["content"] for m in _messages(conversation.responses[-1])][-2:] == [
+        "Be verbose",
+        "Change",
+    ]
+
+
+def test_conversation_history_option(model: AnacondaAssistantChat) -> None:
+    conversation = model.conversation()
+    for prompt in ["One", "Two", "Three"]:
+        conversation.prompt(prompt, system="Be brief").text()
+
+    response = conversation.prompt("Four", system="Be brief", history=1)
+    response.text()
+    assert [m["content"] for m in _messages(response) if m["role"] != "assistant"] == [
+        "Be brief",
+        "Three",
+        "Four",
+    ]
+
+    response = conversation.prompt("Five", system="Be brief", history=0)
+    response.text()
+    assert [m["content"] for m in _messages(response)] == ["Be brief", "Five"]
+
+
+def test_conversation_rebuilt_when_history_changes(
+    model: AnacondaAssistantChat,
+) -> None:
+    conversation = model.conversation()
+    conversation.prompt("One").text()
+    conversation.prompt("Two").text()
+
+    conversation.responses.pop(0)
+    response = conversation.prompt("Three")
+    response.text()
+    assert [m["content"] for m in _messages(response) if m["role"] == "user"] == [
+        "Two",
+        "Three",
+    ]
+
+
+def test_conversation_cache_limit(
+    model: AnacondaAssistantChat, monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.setattr(
+        "anaconda_assistant.integrations.llm.MAX_CACHED_CONVERSATIONS", 2
+    )
+    conversations = [model.conversation() for _ in range(3)]
+    for conversation in conversations:
+        conversation.prompt("Hi").text()
+    conversations[0].prompt("Again").text()
+
+    assert list(model._conversations) == [conversations[2].id, conversations[0].id]
+
+
+def test_async_stream_policy(
+    async_requests: List[Dict[str, Any]], message: str
+) -> None:
+    model = AsyncAnacondaAssistantChat()
+    model.stream_policy = CoalesceBytesPolicy(min_bytes=64)
+
+    async def run() -> List[str]:
+        return [chunk async for chunk in model.prompt("Who are you?")]
+
+    # the async responses arrive 16 bytes at a time
+    chunks = asyncio.run(run())
+    assert "".join(chunks) == message
+    assert len(chunks) == 3
@@ -0,0 +1,251 @@
+import asyncio
+import json
+import ssl
+import threading
+from pathlib import Path
+from typing import Any
+from typing import AsyncIterator
+from typing import List
+
+import httpx
+import certifi
+import pytest
+from pytest import MonkeyPatch
+from pytest_mock import MockerFixture
+from requests.exceptions import ChunkedEncodingError
+from requests.exceptions import ConnectionError
+from requests.exceptions import HTTPError
+
+from anaconda_assistant.async_client import AsyncChatClient
+from anaconda_assistant.async_client import _RequestsAuth
+from anaconda_assistant.async_client import _ssl_verify
+from anaconda_assistant.exceptions import DailyQuotaExceeded
+from anaconda_assistant.streaming import CoalesceBytesPolicy
+
+MESSAGE = "I am Anaconda Assistant, how can I assist you today?"
+
+
+def _handler(request: httpx.Request) -> httpx.Response:
+    body = json.loads(request.content)
+    content = body["messages"][0]["content"]
+    if content == "I've said too much":
+        return httpx.Response(429, json={"message": "Too many requests"})
+    elif content == "Fail":
+        return httpx.Response(500, json={"message": "Internal server error"})
+    elif content == "Unreachable":
+        raise httpx.ConnectError("Connection refused", request=request)
+    elif content == "Break":
+
+        async def broken() -> AsyncIterator[bytes]:
+            yield MESSAGE[:10].encode()
+            raise httpx.ReadError("Connection reset", request=request)
+
+        return httpx.Response(200, content=broken())
+
+    # split the token trailer across chunks
+    data = f"{MESSAGE}__TOKENS_42/424242__".encode()
+    chunks = [data[:10], data[10:-12], data[-12:]]
+
+    async def stream() -> AsyncIterator[bytes]:
+        for chunk in chunks:
+            yield chunk
+
+    return httpx.Response(200, content=stream())
+
+
+@pytest.fixture
+def async_client(mocker: MockerFixture) -> AsyncChatClient:
+    mocker.patch(
+        "anaconda_auth.client.BaseClient.email",
+        return_value="me@example.com",
+        new_callable=mocker.PropertyMock,
+    )
+    return AsyncChatClient(
+        domain="mocking-assistant",
+        httpx_kwargs={"transport": httpx.MockTransport(_handler)},
+    )
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_completions(async_client: AsyncChatClient) -> None:
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+
+    async def run() -> List[str]:
+        async with async_client:
+            response = await async_client.completions(messages)
+            chunks = [chunk async for chunk in response.aiter_content()]
+            assert response.message == MESSAGE
+            assert response.tokens_used == 42
+            assert response.token_limit == 424242
+            return chunks
+
+    chunks = asyncio.run(run())
+    assert "".join(chunks) == MESSAGE
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_completions_read(async_client: AsyncChatClient) -> None:
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+
+    async def run() -> str:
+        async with async_client:
+            response = await async_client.completions(messages)
+            with pytest.raises(ValueError):
+                response.message
+            return await response.aread()
+
+    assert asyncio.run(run()) == MESSAGE
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_daily_quota_exceeded(async_client: AsyncChatClient) -> None:
+    messages = [{"role": "user", "content": "I've said too much", "message_id": "0"}]
+
+    async def run() -> None:
+        async with async_client:
+            await async_client.completions(messages)
+
+    with pytest.raises(DailyQuotaExceeded):
+        asyncio.run(run())
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_iter_until(async_client: AsyncChatClient) -> None:
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+
+    async def run() -> str:
+        async with async_client:
+            response = await async_client.completions(messages)
+            text = "".join([chunk async for chunk in response.aiter_until([", how"])])
+            assert response.message == text
+            assert response.tokens_used == 0
+            return text
+
+    assert asyncio.run(run()) == "I am Anaconda Assistant"
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_stream_policy(async_client: AsyncChatClient) -> None:
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    policy = CoalesceBytesPolicy(min_bytes=20)
+
+    async def run() -> List[List[str]]:
+        async with async_client:
+            response = await async_client.completions(messages)
+            chunks = [chunk async for chunk in response.aiter_content(policy)]
+            assert response.message == MESSAGE
+            assert response.tokens_used == 42
+
+            response = await async_client.completions(messages)
+            until = response.aiter_until([", how"], stream_policy=policy)
+            return [chunks, [chunk async for chunk in until]]
+
+    chunks, until = asyncio.run(run())
+    # the first chunk of 10 bytes is joined with the next one
+    assert chunks == [MESSAGE]
+    assert until == ["I am Anaconda Assistant"]
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_errors_match_sync_client(async_client: AsyncChatClient) -> None:
+    async def run(content: str) -> str:
+        messages = [{"role": "user", "content": content, "message_id": "0"}]
+        async with async_client:
+            response = await async_client.completions(messages)
+            return await response.aread()
+
+    with pytest.raises(HTTPError) as e:
+        asyncio.run(run("Fail"))
+    assert e.value.response is not None
+    assert e.value.response.status_code == 500
+    assert e.value.response.json() == {"message": "Internal server error"}
+
+    with pytest.raises(ConnectionError):
+        asyncio.run(run("Unreachable"))
+
+    with pytest.raises(ChunkedEncodingError):
+        asyncio.run(run("Break"))
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_auth_off_event_loop(
+    async_client: AsyncChatClient, mocker: MockerFixture
+) -> None:
+    threads = []
+
+    def authorization(self: _RequestsAuth) -> str:
+        threads.append(threading.get_ident())
+        return "Bearer token"
+
+    mocker.patch.object(_RequestsAuth, "_authorization", authorization)
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+
+    async def run() -> str:
+        async with async_client:
+            response = await async_client.completions(messages)
+            return await response.aread()
+
+    assert asyncio.run(run()) == MESSAGE
+    assert threads and threading.get_ident() not in threads
+
+
+def _ssl_context(client: AsyncChatClient) -> ssl.SSLContext:
+    transport = client.http_client._transport
+    assert isinstance(transport, httpx.AsyncHTTPTransport)
+    assert transport._pool._ssl_context is not None
+    return transport._pool._ssl_context
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_ssl_verify_false(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("ANACONDA_AUTH_SSL_VERIFY", "0")
+    client = AsyncChatClient(domain="mocking-assistant")
+
+    context = _ssl_context(client)
+    assert context.verify_mode == ssl.CERT_NONE
+    assert not context.check_hostname
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_ssl_ca_bundle(monkeypatch: MonkeyPatch, tmp_path: Path) -> None:
+    bundle = Path(certifi.where()).read_text()
+    end = "-----END CERTIFICATE-----\n"
+    ca_path = tmp_path / "ca.pem"
+    ca_path.write_text(
+        bundle[bundle.index("-----BEGIN") : bundle.index(end) + len(end)]
+    )
+    monkeypatch.setenv("ANACONDA_AUTH_SSL_VERIFY", str(ca_path))
+    client = AsyncChatClient(domain="mocking-assistant")
+
+    context = _ssl_context(client)
+    assert context.verify_mode == ssl.CERT_REQUIRED
+    assert len(context.get_ca_certs()) == 1
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_async_proxies(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("ANACONDA_AUTH_SSL_VERIFY", "0")
+    monkeypatch.setenv(
+        "ANACONDA_AUTH_PROXY_SERVERS",
+        json.dumps({"https": "http://proxy.example.com:3128"}),
+    )
+    client = AsyncChatClient(domain="mocking-assistant")
+
+    mounts = client.http_client._mounts
+    [(pattern, transport)] = [(p, t) for p, t in mounts.items() if p.scheme]
+    assert pattern.pattern == "https://"
+    assert isinstance(transport, httpx.AsyncHTTPTransport)
+    pool: Any = transport._pool
+    assert pool._proxy_url.host == b"proxy.example.com"
+    assert pool._ssl_context.verify_mode == ssl.CERT_NONE
+
+
+def test_async_client_cert(mocker: MockerFixture) -> None:
+    context: Any = mocker.Mock(spec=ssl.SSLContext)
+    create = mocker.patch("ssl.create_default_context", return_value=context)
+    api_client: Any = mocker.Mock(_ssl=None, verify=False, cert=("c.pem", "k.pem"))
+
+    assert _ssl_verify(api_client) == context
+    create.assert_called_once_with()
+    assert context.verify_mode == ssl.CERT_NONE
+    context.load_cert_chain.assert_called_once_with("c.pem", "k.pem")
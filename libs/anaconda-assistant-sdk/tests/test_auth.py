@@ -0,0 +1,143 @@
+from threading import Thread
+from time import sleep
+from time import time
+from typing import Any
+from typing import List
+
+import jwt
+import pytest
+from pytest import MonkeyPatch
+from pytest_mock import MockerFixture
+from requests import PreparedRequest
+
+from anaconda_auth.exceptions import TokenExpiredError
+
+from anaconda_assistant.api_client import APIClient
+from anaconda_assistant.auth import RefreshingBearerAuth
+from anaconda_assistant.auth import token_expiry
+
+
+def _token(expires_in: float) -> str:
+    return jwt.encode(
+        {"exp": int(time() + expires_in)},
+        "a-test-secret-that-is-long-enough-for-hs256",
+        algorithm="HS256",
+    )
+
+
+class _TokenInfo:
+    def __init__(self, api_key: str) -> None:
+        self.api_key = api_key
+
+
+@pytest.fixture
+def tokens(mocker: MockerFixture) -> List[str]:
+    """Tokens returned by TokenInfo.load, the last one is returned repeatedly"""
+    tokens: List[str] = []
+
+    def load(*args: Any, **kwargs: Any) -> _TokenInfo:
+        sleep(0.05)
+        return _TokenInfo(tokens.pop(0) if len(tokens) > 1 else tokens[0])
+
+    mocker.patch("anaconda_auth.token.TokenInfo.load", side_effect=load)
+    return tokens
+
+
+def _authorize(auth: RefreshingBearerAuth) -> str:
+    request = PreparedRequest()
+    request.prepare(method="GET", url="https://example.com")
+    return auth(request).headers["Authorization"]
+
+
+def test_token_expiry() -> None:
+    token = _token(60)
+    assert token_expiry(token) == pytest.approx(time() + 60, abs=2)
+    assert token_expiry("not-a-jwt") is None
+
+
+def test_auth_reuses_token(tokens: List[str]) -> None:
+    first = _token(3600)
+    tokens.extend([first, _token(7200)])
+    auth = RefreshingBearerAuth("example.com")
+
+    assert _authorize(auth) == f"Bearer {first}"
+    assert _authorize(auth) == f"Bearer {first}"
+
+    assert auth._timer is not None
+    assert auth._timer.interval == pytest.approx(3600 - 300, abs=2)
+    auth.close()
+
+
+def test_auth_refreshes_ahead_of_expiry(tokens: List[str]) -> None:
+    second = _token(3600)
+    tokens.extend([_token(10), second])
+    auth = RefreshingBearerAuth("example.com", min_interval=0.1)
+
+    _authorize(auth)
+    assert auth._timer is not None
+    assert auth._timer.interval == 0.1
+
+    sleep(0.5)
+    assert auth.token == second
+    assert _authorize(auth) == f"Bearer {second}"
+    auth.close()
+
+
+def test_auth_single_flight(tokens: List[str], mocker: MockerFixture) -> None:
+    tokens.append(_token(3600))
+    auth = RefreshingBearerAuth("example.com")
+    load = mocker.spy(auth, "_load")
+
+    threads = [Thread(target=_authorize, args=(auth,)) for _ in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert load.call_count == 1
+    auth.close()
+
+
+def test_auth_expired_token_not_reloaded_repeatedly(tokens: List[str]) -> None:
+    tokens.append(_token(-10))
+    auth = RefreshingBearerAuth("example.com")
+
+    with pytest.raises(TokenExpiredError):
+        _authorize(auth)
+    loaded_at = auth._loaded_at
+    with pytest.raises(TokenExpiredError):
+        _authorize(auth)
+    assert auth._loaded_at == loaded_at
+    assert auth._timer is None
+    auth.close()
+
+
+def test_auth_stops_refreshing_expired_token(tokens: List[str]) -> None:
+    # exp is truncated to whole seconds, this one expires in 0.5 to 1.5 seconds
+    tokens.extend([_token(1.5), _token(-10), _token(-10), _token(3600)])
+    auth = RefreshingBearerAuth("example.com", refresh_margin=0, min_interval=0.1)
+
+    _authorize(auth)
+    sleep(2)
+    # the timer reloaded the expired token from the keyring and stopped
+    assert auth._timer is None
+    with pytest.raises(TokenExpiredError):
+        _authorize(auth)
+    assert auth._timer is None
+
+    # a new login is picked up by the next request after min_interval
+    sleep(0.2)
+    assert _authorize(auth) == f"Bearer {tokens[0]}"
+    auth.close()
+
+
+def test_api_client_token_refresh(monkeypatch: MonkeyPatch) -> None:
+    assert not isinstance(APIClient().auth, RefreshingBearerAuth)
+
+    monkeypatch.setenv("ANACONDA_ASSISTANT_TOKEN_REFRESH", "true")
+    client = APIClient(domain="example.com")
+    assert isinstance(client.auth, RefreshingBearerAuth)
+    assert APIClient(domain="example.com").auth is client.auth
+    assert not isinstance(
+        APIClient(domain="example.com", api_key="key").auth, RefreshingBearerAuth
+    )
@@ -0,0 +1,58 @@
+import os
+from pathlib import Path
+
+import pytest
+from anaconda_cli_base.exceptions import AnacondaConfigTomlSyntaxError
+from pytest import MonkeyPatch
+
+from anaconda_assistant.config import AssistantConfig
+from anaconda_assistant.config import clear_config_cache
+from anaconda_assistant.config import load_config
+
+
+def test_load_config_cached() -> None:
+    config = load_config(AssistantConfig)
+    assert load_config(AssistantConfig) is config
+    assert load_config(AssistantConfig, api_version="v4") is not config
+    assert load_config(AssistantConfig, api_version="v4").api_version == "v4"
+
+
+def test_load_config_env_change(monkeypatch: MonkeyPatch) -> None:
+    config = load_config(AssistantConfig)
+    assert config.accepted_terms is None
+
+    monkeypatch.setenv("ANACONDA_ASSISTANT_ACCEPTED_TERMS", "true")
+    updated = load_config(AssistantConfig)
+    assert updated is not config
+    assert updated.accepted_terms is True
+
+
+def test_load_config_file_change(tmp_path: Path) -> None:
+    config_toml = tmp_path / "config.toml"
+    config_toml.write_text("[plugin.assistant]\naccepted_terms = false\n")
+
+    config = load_config(AssistantConfig)
+    assert config.accepted_terms is False
+    assert load_config(AssistantConfig) is config
+
+    config_toml.write_text("[plugin.assistant]\naccepted_terms = true\n")
+    # make sure the change is visible even on filesystems with coarse mtimes
+    stat = config_toml.stat()
+    os.utime(config_toml, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))
+
+    updated = load_config(AssistantConfig)
+    assert updated is not config
+    assert updated.accepted_terms is True
+
+
+def test_clear_config_cache() -> None:
+    config = load_config(AssistantConfig)
+    clear_config_cache()
+    assert load_config(AssistantConfig) is not config
+
+
+def test_load_config_invalid_toml(tmp_path: Path) -> None:
+    (tmp_path / "config.toml").write_text("[plugin.assistant\n")
+
+    with pytest.raises(AnacondaConfigTomlSyntaxError):
+        load_config(AssistantConfig)
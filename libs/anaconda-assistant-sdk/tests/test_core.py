@@ -18,6 +18,7 @@ from anaconda_assistant.exceptions import (
 )
 from anaconda_assistant.core import ChatSession, ChatClient
 from anaconda_assistant.api_client import APIClient
+from anaconda_assistant.streaming import FixedSizePolicy
 
 
 def test_unspecified_accepted_terms_error() -> None:
@@ -37,49 +38,6 @@ def test_unspecified_data_collection(monkeypatch: MonkeyPatch) -> None:
         _ = ChatClient()
 
 
-@pytest.fixture
-def mocked_api_domain(mocker: MockerFixture) -> Generator[str, None, None]:
-    mocker.patch(
-        "anaconda_auth.client.BaseClient.email",
-        return_value="me@example.com",
-        new_callable=mocker.PropertyMock,
-    )
-
-    api_client = APIClient(domain="mocking-assistant")
-
-    with responses.RequestsMock(assert_all_requests_are_fired=False) as resp:
-        resp.add(
-            responses.POST,
-            api_client.urljoin("/completions"),
-            status=429,
-            body=json.dumps({"message": "Too many requests"}),
-            match=[
-                responses.matchers.json_params_matcher(
-                    {
-                        "messages": [
-                            {
-                                "role": "user",
-                                "content": "I've said too much",
-                                "message_id": "0",
-                            }
-                        ]
-                    },
-                    strict_match=False,
-                )
-            ],
-        )
-        resp.add(
-            responses.POST,
-            api_client.urljoin("/completions"),
-            body=(
-                "I am Anaconda Assistant, an AI designed to help you with a variety of tasks, "
-                "answer questions, and provide information on a wide range of topics. How can "
-                "I assist you today?__TOKENS_42/424242__"
-            ),
-        )
-        yield "mocking-assistant"
-
-
 @pytest.fixture
 def mocked_api_client(
     mocked_api_domain: str,
@@ -140,12 +98,6 @@ def test_chat_client_no_skip_logging(
     assert body.get("skip_logging") is False
 
 
-@pytest.fixture
-def accepted_terms_and_data_collection(monkeypatch: MonkeyPatch) -> None:
-    monkeypatch.setenv("ANACONDA_ASSISTANT_ACCEPTED_TERMS", "true")
-    monkeypatch.setenv("ANACONDA_ASSISTANT_DATA_COLLECTION", "true")
-
-
 @pytest.mark.usefixtures("accepted_terms_and_data_collection")
 def test_token_regex(mocked_chat_client: ChatClient) -> None:
     messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
@@ -160,6 +112,30 @@ def test_token_regex(mocked_chat_client: ChatClient) -> None:
     assert res.token_limit == 424242
 
 
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_iter_until_stop_sequence(mocked_chat_client: ChatClient) -> None:
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    res = mocked_chat_client.completions(messages=messages)
+
+    chunks = list(
+        res.iter_until([", an AI", "never"], stream_policy=FixedSizePolicy(4))
+    )
+    assert "".join(chunks) == "I am Anaconda Assistant"
+    assert res.message == "I am Anaconda Assistant"
+    assert res.tokens_used == 0
+    assert res._response.raw.closed
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_iter_until_no_stop_sequence(mocked_chat_client: ChatClient) -> None:
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    res = mocked_chat_client.completions(messages=messages)
+
+    assert "".join(res.iter_until(["never"])) == res.message
+    assert res.message.endswith("I assist you today?")
+    assert res.tokens_used == 42
+
+
 @pytest.mark.usefixtures("accepted_terms_and_data_collection")
 def test_consume_stream_cached_message(mocked_chat_client: ChatClient) -> None:
     messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
@@ -241,3 +217,242 @@ def test_chat_client_429(mocked_chat_client: ChatClient) -> None:
     messages = [{"role": "user", "content": "I've said too much", "message_id": "0"}]
     with pytest.raises(DailyQuotaExceeded):
         _ = mocked_chat_client.completions(messages=messages)
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_response_message_id_from_request(
+    mocked_chat_client: ChatClient, mocker: MockerFixture
+) -> None:
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    res = mocked_chat_client.completions(messages=messages)
+
+    loads = mocker.spy(json, "loads")
+    assert res._response.request.body is not None
+    body = json.loads(res._response.request.body)
+    assert res.message_id == body["response_message_id"]
+    assert loads.call_count == 1
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_api_client_json_dumps(mocked_api_domain: str) -> None:
+    def dumps(obj: Any) -> bytes:
+        return json.dumps(obj, indent=2).encode("utf-8")
+
+    client = ChatClient(domain=mocked_api_domain)
+    client.api_client.json_dumps = dumps
+
+    messages = [{"role": "user", "content": "Who are you? π", "message_id": "0"}]
+    res = client.completions(messages=messages)
+
+    request = res._response.request
+    assert request.headers["Content-Type"] == "application/json"
+    assert isinstance(request.body, bytes)
+    assert request.body.startswith(b'{\n  "skip_logging"')
+    assert json.loads(request.body)["messages"] == messages
+
+
+def test_default_json_dumps_compact() -> None:
+    from anaconda_assistant.api_client import default_json_dumps
+
+    encoded = default_json_dumps({"content": "π", "big": 2**70})
+    assert json.loads(encoded) == {"content": "π", "big": 2**70}
+    assert b" " not in encoded
+
+
+@pytest.mark.parametrize("encoding", ["gzip", "zstd"])
+def test_api_client_request_compression(encoding: str) -> None:
+    import gzip
+
+    import zstandard
+
+    decompress = {
+        "gzip": gzip.decompress,
+        "zstd": zstandard.ZstdDecompressor().decompressobj().decompress,
+    }
+
+    def echo(request: Any) -> Any:
+        body = request.body
+        if "Content-Encoding" in request.headers:
+            assert request.headers["Content-Encoding"] == encoding
+            body = decompress[encoding](body)
+        return 200, {}, body
+
+    api_client = APIClient(
+        domain="mocking-assistant",
+        request_compression=encoding,  # type: ignore
+        request_compression_threshold=1024,
+    )
+
+    with responses.RequestsMock() as resp:
+        resp.add_callback(
+            responses.POST, api_client.urljoin("/completions"), callback=echo
+        )
+
+        small = {"messages": ["hi"]}
+        res = api_client.post("/completions", json=small)
+        assert "Content-Encoding" not in res.request.headers
+        assert res.json() == small
+
+        large = {"messages": ["hi" * 1024]}
+        res = api_client.post("/completions", json=large)
+        assert res.request.headers["Content-Encoding"] == encoding
+        assert len(res.request.body or b"") < 1024
+        assert res.json() == large
+
+
+def test_api_client_request_compression_from_config(monkeypatch: MonkeyPatch) -> None:
+    monkeypatch.setenv("ANACONDA_ASSISTANT_REQUEST_COMPRESSION", "gzip")
+    api_client = APIClient(domain="mocking-assistant")
+    assert api_client._config.request_compression == "gzip"
+    assert api_client._config.request_compression_threshold == 16384
+
+
+def _feed_all(data: bytes, size: int) -> tuple:
+    from anaconda_assistant.core import TokenTrailer
+
+    trailer = TokenTrailer()
+    chunks = [trailer.feed(data[i : i + size]) for i in range(0, len(data), size)]
+    chunks.append(trailer.finish())
+    return trailer, [c for c in chunks if c]
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 5, 7, 64])
+def test_token_trailer_split_chunks(size: int) -> None:
+    text = "Ünïcode π is 3.14 ✨ __TOKENS_ in the text"
+    trailer, chunks = _feed_all(f"{text}__TOKENS_42/424242__".encode(), size)
+
+    for chunk in chunks:
+        chunk.decode("utf-8")
+    assert b"".join(chunks).decode("utf-8") == text
+    assert trailer.tokens_used == 42
+    assert trailer.token_limit == 424242
+
+
+def test_token_trailer_missing() -> None:
+    trailer, chunks = _feed_all(b"no trailer __TOKENS_1/", 4)
+    assert b"".join(chunks) == b"no trailer __TOKENS_1/"
+    assert trailer.tokens_used == 0
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_response_iter_bytes(mocked_chat_client: ChatClient) -> None:
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    res = mocked_chat_client.completions(messages=messages)
+
+    chunks = list(res.iter_bytes(chunk_size=10))
+    assert all(isinstance(chunk, bytes) for chunk in chunks)
+    assert b"".join(chunks).decode("utf-8") == res.message
+    assert not res.message.endswith("__")
+    assert res.tokens_used == 42
+    assert res.token_limit == 424242
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_session_stream_policy(mocked_api_domain: str) -> None:
+    from anaconda_assistant.streaming import LineBoundaryPolicy
+    from anaconda_assistant.streaming import WordBoundaryPolicy
+
+    session = ChatSession(
+        domain=mocked_api_domain, stream_policy=WordBoundaryPolicy(chunk_size=4)
+    )
+    assert session.client.stream_policy is not None
+    assert session.client.stream_policy.chunk_size == 4
+
+    chunks = list(session.chat("Who are you?", stream=True))
+    assert all(chunk.endswith(" ") for chunk in chunks[:-1])
+    assert "".join(chunks) == session.messages[-1]["content"]
+    assert session.usage == {"tokens_used": 42, "token_limit": 424242}
+
+    chunks = list(
+        session.chat("Who are you?", stream=True, stream_policy=LineBoundaryPolicy())
+    )
+    assert len(chunks) == 1
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_session_threads(
+    mocked_chat_session: ChatSession, mocker: MockerFixture
+) -> None:
+    from concurrent.futures import ThreadPoolExecutor
+
+    post = mocker.spy(mocked_chat_session.client.api_client, "post")
+
+    def turn(i: int) -> None:
+        if i % 2:
+            _ = mocked_chat_session.chat(f"message {i}")
+        else:
+            for _ in mocked_chat_session.chat(f"message {i}", stream=True):
+                pass
+
+    with ThreadPoolExecutor(max_workers=8) as pool:
+        list(pool.map(turn, range(24)))
+
+    messages = mocked_chat_session.messages
+    assert len(messages) == 48
+    assert [m["role"] for m in messages] == ["user", "assistant"] * 24
+
+    sent = sorted(len(call.kwargs["json"]["messages"]) for call in post.mock_calls)
+    assert sent == list(range(1, 48, 2))
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_session_unfinished_stream(mocked_chat_session: ChatSession) -> None:
+    chunks = mocked_chat_session.chat("Who are you?", stream=True)
+    next(chunks)  # type: ignore
+
+    with pytest.raises(RuntimeError):
+        mocked_chat_session.chat("What do you want?")
+
+    chunks.close()  # type: ignore
+    assert mocked_chat_session.messages == []
+
+    _ = mocked_chat_session.chat("What do you want?")
+    assert len(mocked_chat_session.messages) == 2
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_session_stream_raises_on_call(
+    mocked_chat_session: ChatSession,
+) -> None:
+    import asyncio
+    from unittest import mock
+
+    with mock.patch.object(
+        mocked_chat_session.client,
+        "completions",
+        side_effect=DailyQuotaExceeded("Too many requests"),
+    ) as completions:
+        with pytest.raises(DailyQuotaExceeded):
+            mocked_chat_session.chat("Who are you?", stream=True)
+        assert completions.call_count == 1
+
+        with pytest.raises(DailyQuotaExceeded):
+            asyncio.run(mocked_chat_session.achat("Who are you?", stream=True))
+        assert completions.call_count == 2
+
+    # the failed turns did not keep the session
+    _ = mocked_chat_session.chat("What do you want?")
+    assert len(mocked_chat_session.messages) == 2
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_session_achat(mocked_chat_session: ChatSession) -> None:
+    import asyncio
+
+    async def turns() -> list:
+        async def stream(i: int) -> str:
+            chunks = await mocked_chat_session.achat(f"stream {i}", stream=True)
+            return "".join([c async for c in chunks])  # type: ignore
+
+        return await asyncio.gather(
+            *(stream(i) for i in range(4)),
+            *(mocked_chat_session.achat(f"text {i}") for i in range(4)),
+        )
+
+    results = asyncio.run(turns())
+    assert len(set(results)) == 1
+    assert len(mocked_chat_session.messages) == 16
+    assert [m["role"] for m in mocked_chat_session.messages] == [
+        "user",
+        "assistant",
+    ] * 8
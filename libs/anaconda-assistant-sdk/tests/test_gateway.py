@@ -0,0 +1,164 @@
+import socketserver
+from pathlib import Path
+from threading import Thread
+from typing import Generator
+
+import pytest
+from pytest import MonkeyPatch
+from pytest_mock import MockerFixture
+from requests import Response
+from requests.exceptions import ChunkedEncodingError
+from requests.exceptions import HTTPError
+
+from anaconda_assistant.core import ChatClient
+from anaconda_assistant.exceptions import AnacondaAssistantError
+from anaconda_assistant.exceptions import DailyQuotaExceeded
+from anaconda_assistant.gateway import GatewayClient
+from anaconda_assistant.gateway import GatewayServer
+
+pytestmark = pytest.mark.usefixtures("accepted_terms_and_data_collection")
+
+
+@pytest.fixture
+def socket_path(monkeypatch: MonkeyPatch, tmp_path: Path) -> str:
+    path = str(tmp_path / "gateway.sock")
+    monkeypatch.setenv("ANACONDA_ASSISTANT_GATEWAY_SOCKET", path)
+    monkeypatch.setenv("ANACONDA_ASSISTANT_USE_GATEWAY", "true")
+    return path
+
+
+@pytest.fixture
+def gateway(
+    socket_path: str, mocked_api_domain: str
+) -> Generator[GatewayServer, None, None]:
+    server = GatewayServer(socket_path)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield server
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_gateway_completions(gateway: GatewayServer, mocked_api_domain: str) -> None:
+    client = ChatClient(domain=mocked_api_domain)
+    assert client.gateway is not None
+
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    response = client.completions(messages)
+
+    assert response.message.startswith("I am Anaconda Assistant")
+    assert response.tokens_used == 42
+    assert response.token_limit == 424242
+    assert client._api_client is None
+    assert client._auth_client is None
+
+    # the gateway fills in the user of its own client
+    gateway_client = gateway.pool.client(domain=mocked_api_domain)
+    assert gateway_client.gateway is None
+    assert gateway_client._auth_client is not None
+
+
+def test_gateway_429(gateway: GatewayServer, mocked_api_domain: str) -> None:
+    client = ChatClient(domain=mocked_api_domain)
+    messages = [{"role": "user", "content": "I've said too much", "message_id": "0"}]
+    with pytest.raises(DailyQuotaExceeded):
+        client.completions(messages)
+
+
+def test_gateway_stale_socket(socket_path: str, mocked_api_domain: str) -> None:
+    Path(socket_path).touch()
+
+    client = ChatClient(domain=mocked_api_domain)
+    assert client.gateway is not None
+
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    response = client.completions(messages)
+
+    assert response.message.startswith("I am Anaconda Assistant")
+    assert response.tokens_used == 42
+    assert client.gateway is None
+    assert client._api_client is not None
+
+
+def test_gateway_disabled(gateway: GatewayServer, mocked_api_domain: str) -> None:
+    client = ChatClient(domain=mocked_api_domain, use_gateway=False)
+    assert client.gateway is None
+
+
+def test_gateway_disabled_by_default(
+    gateway: GatewayServer, mocked_api_domain: str, monkeypatch: MonkeyPatch
+) -> None:
+    monkeypatch.delenv("ANACONDA_ASSISTANT_USE_GATEWAY")
+    client = ChatClient(domain=mocked_api_domain)
+    assert client.gateway is None
+
+
+def test_gateway_http_error(
+    gateway: GatewayServer, mocked_api_domain: str, mocker: MockerFixture
+) -> None:
+    upstream = Response()
+    upstream.status_code = 503
+    mocker.patch.object(
+        gateway.pool.client(domain=mocked_api_domain),
+        "_post",
+        side_effect=HTTPError("503 Server Error", response=upstream),
+    )
+
+    client = ChatClient(domain=mocked_api_domain)
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    with pytest.raises(HTTPError) as e:
+        client.completions(messages)
+    assert e.value.response is not None
+    assert e.value.response.status_code == 503
+
+
+class _BrokenRaw:
+    """A response body that fails after its first chunk"""
+
+    def __init__(self) -> None:
+        self.chunks = [b"I am Anaconda Assistant"]
+
+    def read(self, size: int = -1) -> bytes:
+        if not self.chunks:
+            raise ConnectionResetError("upstream reset")
+        return self.chunks.pop(0)
+
+    def close(self) -> None:
+        pass
+
+
+def test_gateway_upstream_failure(
+    gateway: GatewayServer, mocked_api_domain: str, mocker: MockerFixture
+) -> None:
+    upstream = Response()
+    upstream.status_code = 200
+    upstream.raw = _BrokenRaw()
+    mocker.patch.object(
+        gateway.pool.client(domain=mocked_api_domain), "_post", return_value=upstream
+    )
+
+    client = ChatClient(domain=mocked_api_domain)
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    response = client.completions(messages)
+    with pytest.raises(ChunkedEncodingError, match="upstream reset"):
+        _ = response.message
+
+
+def test_gateway_malformed_status(socket_path: str) -> None:
+    class Handler(socketserver.StreamRequestHandler):
+        def handle(self) -> None:
+            self.rfile.readline()
+            self.wfile.write(b"not json\n")
+
+    with socketserver.UnixStreamServer(socket_path, Handler) as server:
+        thread = Thread(target=server.handle_request, daemon=True)
+        thread.start()
+        with pytest.raises(AnacondaAssistantError, match="Malformed status"):
+            GatewayClient(socket_path).completions({"session": {}})
+        thread.join()
+
+
+def test_gateway_already_running(gateway: GatewayServer, socket_path: str) -> None:
+    with pytest.raises(AnacondaAssistantError):
+        GatewayServer(socket_path)
@@ -0,0 +1,54 @@
+import os
+import subprocess
+import sys
+from typing import Set
+
+import anaconda_assistant
+
+HEAVY_MODULES = ["requests", "anaconda_auth", "anaconda_cli_base", "pydantic"]
+
+
+def _imported_modules(statement: str) -> Set[str]:
+    """Return the names of all modules imported by statement using -X importtime"""
+    src = os.path.dirname(os.path.dirname(anaconda_assistant.__file__))
+    env = {**os.environ, "PYTHONPATH": src}
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", statement],
+        capture_output=True,
+        text=True,
+        env=env,
+        check=True,
+    )
+
+    modules = set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        name = line.rsplit("|", 1)[-1].strip()
+        modules.add(name)
+    return modules
+
+
+def test_import_does_not_load_heavy_modules() -> None:
+    modules = _imported_modules("import anaconda_assistant")
+
+    assert "anaconda_assistant" in modules
+    assert "anaconda_assistant.core" not in modules
+    for heavy in HEAVY_MODULES:
+        assert heavy not in modules
+
+
+def test_import_core_does_not_load_heavy_modules() -> None:
+    modules = _imported_modules("import anaconda_assistant.core")
+
+    assert "anaconda_assistant.core" in modules
+    for heavy in HEAVY_MODULES:
+        assert heavy not in modules
+
+
+def test_lazy_attributes() -> None:
+    from anaconda_assistant import core
+
+    assert anaconda_assistant.ChatSession is core.ChatSession
+    assert anaconda_assistant.ChatClient is core.ChatClient
+    assert "ChatClient" in dir(anaconda_assistant)
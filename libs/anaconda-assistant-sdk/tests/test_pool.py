@@ -0,0 +1,116 @@
+import pytest
+from pytest_mock import MockerFixture
+
+from anaconda_assistant.core import ChatClient
+from anaconda_assistant.pool import SessionPool
+
+pytestmark = pytest.mark.usefixtures("accepted_terms_and_data_collection")
+
+
+def test_session_pool_shares_clients(mocked_api_domain: str) -> None:
+    pool = SessionPool()
+
+    alice = pool.get("alice", domain=mocked_api_domain, api_key="alice-key")
+    bob = pool.get("bob", domain=mocked_api_domain, api_key="bob-key")
+    carol = pool.get("carol", domain=mocked_api_domain, api_key="alice-key")
+
+    assert alice.client is carol.client
+    assert alice.client is not bob.client
+    assert alice.id != carol.id
+    assert pool.get("alice") is alice
+
+    stats = pool.stats()
+    assert stats.hits == 1
+    assert stats.misses == 3
+    assert stats.sessions == 3
+    assert stats.clients == 2
+
+
+def test_session_pool_session_creation_is_cheap(
+    mocked_api_domain: str, mocker: MockerFixture
+) -> None:
+    pool = SessionPool()
+    pool.get("alice", domain=mocked_api_domain)
+
+    init = mocker.spy(ChatClient, "__init__")
+    for i in range(10):
+        pool.get(f"user-{i}", domain=mocked_api_domain)
+    assert init.call_count == 0
+
+
+def test_session_pool_session_ids(
+    mocked_api_domain: str, mocker: MockerFixture
+) -> None:
+    pool = SessionPool()
+    alice = pool.get("alice", domain=mocked_api_domain)
+    bob = pool.get("bob", domain=mocked_api_domain)
+    assert alice.id != bob.id
+
+    post = mocker.spy(alice.client.api_client, "post")
+    alice.chat("Who are you?")
+    bob.chat("Who are you?")
+
+    sessions = [
+        call.kwargs["json"]["session"]["session_id"] for call in post.mock_calls
+    ]
+    assert sessions == [alice.id, bob.id]
+
+
+def test_session_pool_eviction_and_restore(mocked_api_domain: str) -> None:
+    store: dict = {}
+    pool = SessionPool(max_sessions=2, store=store)
+
+    alice = pool.get("alice", domain=mocked_api_domain)
+    alice.chat("Who are you?")
+    pool.get("bob", domain=mocked_api_domain)
+    pool.get("carol", domain=mocked_api_domain)
+
+    assert len(pool) == 2
+    assert list(store) == ["alice"]
+    assert store["alice"]["messages"] == alice.messages
+    assert "alice" in pool
+
+    restored = pool.get("alice", domain=mocked_api_domain)
+    assert restored is not alice
+    assert restored.id == alice.id
+    assert restored.messages == alice.messages
+    assert restored.usage == {"tokens_used": 42, "token_limit": 424242}
+    assert list(store) == ["bob"]
+
+    stats = pool.stats()
+    assert stats.evictions == 2
+    assert stats.restores == 1
+    assert stats.stored_sessions == 1
+    assert stats.memory_bytes > 0
+
+    pool.discard("bob")
+    assert "bob" not in pool
+
+
+def test_session_pool_keeps_sessions_in_a_turn(mocked_api_domain: str) -> None:
+    store: dict = {}
+    pool = SessionPool(max_sessions=2, store=store)
+
+    alice = pool.get("alice", domain=mocked_api_domain)
+    chunks = alice.chat("Who are you?", stream=True)
+    assert not isinstance(chunks, str)
+
+    # alice is in the middle of a turn, bob is evicted instead
+    pool.get("bob", domain=mocked_api_domain)
+    pool.get("carol", domain=mocked_api_domain)
+    assert list(store) == ["bob"]
+    assert pool.get("alice") is alice
+
+    # the store holds a copy that later turns of alice do not change
+    "".join(chunks)
+    pool.get("bob", domain=mocked_api_domain)
+    pool.get("dave", domain=mocked_api_domain)
+    assert list(store) == ["carol", "alice"]
+    assert len(store["alice"]["messages"]) == 2
+    alice.chat("Who are you?")
+    assert len(store["alice"]["messages"]) == 2
+
+    restored = pool.get("alice", domain=mocked_api_domain)
+    assert restored is not alice
+    assert restored.messages == alice.messages[:2]
+    assert restored.messages is not alice.messages
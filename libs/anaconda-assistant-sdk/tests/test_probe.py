@@ -0,0 +1,115 @@
+import json
+import socket
+from http.server import BaseHTTPRequestHandler
+from http.server import ThreadingHTTPServer
+from threading import Thread
+from typing import Any
+from typing import Generator
+
+import pytest
+
+from anaconda_assistant.api_client import APIClient
+from anaconda_assistant.probe import ProbeResult
+from anaconda_assistant.probe import Prober
+from anaconda_assistant.probe import main
+from anaconda_assistant.probe import probe
+
+
+_STATUSES = {"down": 503, "unauthorized": 401, "missing": 404}
+
+
+class _MockHandler(BaseHTTPRequestHandler):
+    def do_GET(self) -> None:
+        status = _STATUSES.get(self.path.rsplit("/", 1)[-1], 405)
+        body = json.dumps({"detail": "Method Not Allowed"}).encode()
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def log_message(self, *args: Any) -> None:
+        pass
+
+
+@pytest.fixture
+def mock_server() -> Generator[str, None, None]:
+    server = ThreadingHTTPServer(("127.0.0.1", 0), _MockHandler)
+    thread = Thread(target=server.serve_forever, daemon=True)
+    thread.start()
+    yield f"http://127.0.0.1:{server.server_address[1]}"
+    server.shutdown()
+    server.server_close()
+    thread.join()
+
+
+def test_probe(mock_server: str) -> None:
+    result = probe(APIClient(base_uri=mock_server))
+
+    assert result.ok
+    assert result.status_code == 405
+    assert result.url == f"{mock_server}/api/assistant/v3/completions"
+    assert result.tls_ms is None
+    assert result.error is None
+    for name in ("dns_ms", "connect_ms", "ttfb_ms", "total_ms"):
+        assert getattr(result, name) >= 0
+    assert result.ttfb_ms is not None and result.total_ms is not None
+    assert result.ttfb_ms <= result.total_ms
+
+
+@pytest.mark.parametrize("path", ["down", "unauthorized", "missing"])
+def test_probe_unhealthy_status(mock_server: str, path: str) -> None:
+    result = probe(APIClient(base_uri=mock_server), path=f"/{path}")
+    assert not result.ok
+    assert result.status_code == _STATUSES[path]
+
+
+def test_probe_connection_error() -> None:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        port = sock.getsockname()[1]
+
+    result = probe(APIClient(base_uri=f"http://127.0.0.1:{port}"), timeout=1)
+    assert not result.ok
+    assert result.status_code is None
+    assert result.dns_ms is not None
+    assert result.connect_ms is None
+    assert result.error is not None
+    assert "ConnectionRefusedError" in result.error
+
+
+def test_prober_moving_averages(mock_server: str) -> None:
+    prober = Prober(APIClient(base_uri=mock_server), alpha=0.5)
+    for total in (100.0, 200.0, 400.0):
+        prober.update(ProbeResult(timestamp="", url="", ok=True, total_ms=total))
+    prober.update(ProbeResult(timestamp="", url="", error="down"))
+
+    assert prober.averages["total_ms"] == 275.0
+    assert prober.averages["tls_ms"] is None
+    assert prober.probes == 4
+    assert prober.failures == 1
+
+    state = json.loads(prober.to_json())
+    assert state["last"]["error"] == "down"
+
+
+def test_prober_run(mock_server: str) -> None:
+    prober = Prober(APIClient(base_uri=mock_server), interval=0)
+    results = []
+    prober.run(count=3, callback=lambda p: results.append(p.last))
+
+    assert len(results) == 3
+    assert prober.probes == 3
+    assert prober.averages["total_ms"] is not None
+
+
+def test_probe_cli(mock_server: str, tmp_path: Any, capsys: Any) -> None:
+    output = tmp_path / "probe.json"
+    assert main(["--base-uri", mock_server, "--output", str(output)]) == 0
+
+    printed = json.loads(capsys.readouterr().out)
+    assert printed["probes"] == 1
+    assert printed["last"]["status_code"] == 405
+    assert json.loads(output.read_text()) == printed
+
+    assert main(["--base-uri", mock_server, "--path", "/down"]) == 1
@@ -0,0 +1,131 @@
+from threading import Thread
+from time import sleep
+from typing import Callable
+from typing import List
+
+import pytest
+
+from anaconda_assistant.core import ChatClient
+from anaconda_assistant.exceptions import DailyQuotaExceeded
+from anaconda_assistant.scheduler import Priority
+from anaconda_assistant.scheduler import RequestScheduler
+
+
+def _wait_in_thread(
+    scheduler: RequestScheduler, priority: int, started: List[int]
+) -> Thread:
+    def wait() -> None:
+        release = scheduler.acquire(priority)
+        started.append(priority)
+        release()
+
+    thread = Thread(target=wait)
+    thread.start()
+    return thread
+
+
+def test_scheduler_reserved_capacity() -> None:
+    scheduler = RequestScheduler(max_concurrency=3, reserved={Priority.HIGH: 1})
+
+    scheduler.acquire(Priority.LOW)
+    scheduler.acquire(Priority.LOW)
+    with pytest.raises(TimeoutError):
+        scheduler.acquire(Priority.LOW, timeout=0.05)
+
+    release = scheduler.acquire(Priority.HIGH, timeout=0.05)
+    assert scheduler.active == 3
+    release()
+    release()
+    assert scheduler.active == 2
+
+
+def test_scheduler_caps() -> None:
+    scheduler = RequestScheduler(max_concurrency=4, reserved={}, caps={Priority.LOW: 1})
+
+    scheduler.acquire(Priority.LOW)
+    with pytest.raises(TimeoutError):
+        scheduler.acquire(Priority.LOW, timeout=0.05)
+    scheduler.acquire(Priority.NORMAL, timeout=0.05)
+
+
+def test_scheduler_priority_order() -> None:
+    scheduler = RequestScheduler(max_concurrency=1, reserved={})
+    release = scheduler.acquire(Priority.NORMAL)
+
+    started: List[int] = []
+    threads = []
+    for priority in (Priority.LOW, Priority.NORMAL, Priority.HIGH):
+        threads.append(_wait_in_thread(scheduler, priority, started))
+        sleep(0.05)
+
+    release()
+    for thread in threads:
+        thread.join()
+
+    assert started == [Priority.HIGH, Priority.NORMAL, Priority.LOW]
+
+
+def test_scheduler_invalid_reservation() -> None:
+    with pytest.raises(ValueError):
+        RequestScheduler(max_concurrency=2, reserved={Priority.HIGH: 3})
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_client_scheduler_release(mocked_api_domain: str) -> None:
+    scheduler = RequestScheduler(max_concurrency=2, reserved={})
+    client = ChatClient(domain=mocked_api_domain, scheduler=scheduler)
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+
+    consumed = client.completions(messages, priority=Priority.HIGH)
+    closed = client.completions(messages)
+    assert scheduler.active == 2
+
+    consumed.message
+    closed.close()
+    assert scheduler.active == 0
+
+    with pytest.raises(DailyQuotaExceeded):
+        client.completions(
+            [{"role": "user", "content": "I've said too much", "message_id": "0"}]
+        )
+    assert scheduler.active == 0
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_client_batch(mocked_api_domain: str) -> None:
+    scheduler = RequestScheduler(max_concurrency=2)
+    client = ChatClient(domain=mocked_api_domain, scheduler=scheduler)
+    requests = [
+        [{"role": "user", "content": f"Question {i}", "message_id": "0"}]
+        for i in range(5)
+    ]
+    requests.insert(
+        2, [{"role": "user", "content": "I've said too much", "message_id": "0"}]
+    )
+
+    responses = client.batch(requests, return_exceptions=True)
+    assert len(responses) == 6
+    assert isinstance(responses[2], DailyQuotaExceeded)
+    for response in responses[:2] + responses[3:]:
+        assert not isinstance(response, Exception)
+        assert response.tokens_used == 42
+    assert scheduler.active == 0
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_client_batch_raises(mocked_api_domain: str) -> None:
+    client = ChatClient(domain=mocked_api_domain)
+    requests = [
+        [{"role": "user", "content": "Who are you?", "message_id": "0"}],
+        [{"role": "user", "content": "I've said too much", "message_id": "0"}],
+    ]
+    with pytest.raises(DailyQuotaExceeded):
+        client.batch(requests)
+
+
+def test_release_is_idempotent() -> None:
+    scheduler = RequestScheduler(max_concurrency=1, reserved={})
+    release: Callable[[], None] = scheduler.acquire()
+    release()
+    release()
+    assert scheduler.active == 0
@@ -0,0 +1,132 @@
+import asyncio
+from typing import AsyncIterator
+from typing import Iterable
+from typing import Iterator
+from typing import List
+
+import pytest
+from pytest_mock import MockerFixture
+
+from anaconda_assistant.streaming import CoalesceBytesPolicy
+from anaconda_assistant.streaming import CoalesceTimePolicy
+from anaconda_assistant.streaming import FixedSizePolicy
+from anaconda_assistant.streaming import LineBoundaryPolicy
+from anaconda_assistant.streaming import StopSequences
+from anaconda_assistant.streaming import StreamPolicy
+from anaconda_assistant.streaming import WordBoundaryPolicy
+
+CHUNKS = [b"Hel", b"lo w", b"orld", b"\nThis ", b"is", b" a test\n", b"end"]
+
+
+def _coalesce(policy: StreamPolicy) -> List[bytes]:
+    """Coalesce CHUNKS, async chunks must be grouped the same way"""
+    chunks = list(policy.coalesce(iter(CHUNKS)))
+    assert b"".join(chunks) == b"".join(CHUNKS)
+
+    async def achunks() -> AsyncIterator[bytes]:
+        for chunk in CHUNKS:
+            yield chunk
+
+    async def acoalesce() -> List[bytes]:
+        return [chunk async for chunk in policy.acoalesce(achunks())]
+
+    assert asyncio.run(acoalesce()) == chunks
+    return chunks
+
+
+def test_fixed_size_policy() -> None:
+    assert _coalesce(FixedSizePolicy(chunk_size=4)) == CHUNKS
+
+
+def test_coalesce_bytes_policy() -> None:
+    assert _coalesce(CoalesceBytesPolicy(min_bytes=8)) == [
+        b"Hello world",
+        b"\nThis is",
+        b" a test\n",
+        b"end",
+    ]
+
+
+def test_coalesce_time_policy(mocker: MockerFixture) -> None:
+    times = iter([0.0, 0.01, 0.02, 0.06, 0.07, 0.2, 0.21] * 2)
+    mocker.patch("anaconda_assistant.streaming.monotonic", side_effect=times)
+
+    assert _coalesce(CoalesceTimePolicy(interval=50)) == [
+        b"Hel",
+        b"lo world\nThis ",
+        b"is a test\n",
+        b"end",
+    ]
+
+
+def test_custom_policy_forwards_async_chunks() -> None:
+    class Reversed(StreamPolicy):
+        def coalesce(self, chunks: Iterable[bytes]) -> Iterator[bytes]:
+            yield b"".join(chunks)[::-1]
+
+    async def achunks() -> AsyncIterator[bytes]:
+        for chunk in CHUNKS:
+            yield chunk
+
+    async def acoalesce() -> List[bytes]:
+        return [chunk async for chunk in Reversed().acoalesce(achunks())]
+
+    assert asyncio.run(acoalesce()) == CHUNKS
+
+
+def test_word_boundary_policy() -> None:
+    assert _coalesce(WordBoundaryPolicy()) == [
+        b"Hello ",
+        b"world\nThis ",
+        b"is a test\n",
+        b"end",
+    ]
+
+
+def test_line_boundary_policy() -> None:
+    assert _coalesce(LineBoundaryPolicy()) == [
+        b"Hello world\n",
+        b"This is a test\n",
+        b"end",
+    ]
+
+
+@pytest.mark.parametrize(
+    "policy", [WordBoundaryPolicy(), LineBoundaryPolicy(), CoalesceBytesPolicy(3)]
+)
+def test_policy_keeps_utf8_characters(policy: StreamPolicy) -> None:
+    chunks = ["π ", "is ", "✨\n", "Ünï"]
+    encoded = [c.encode("utf-8") for c in chunks]
+    for chunk in policy.coalesce(iter(encoded)):
+        chunk.decode("utf-8")
+
+
+def _stop(stop: List[str], chunks: List[str]) -> List[str]:
+    matcher = StopSequences(stop)
+    parts = [matcher.feed(chunk) for chunk in chunks]
+    parts.append(matcher.finish())
+    return parts
+
+
+def test_stop_sequences_across_chunks() -> None:
+    assert _stop(["\nObservation:"], ["Action: x\nObs", "ervation: y", "z"]) == [
+        "Action: x",
+        "",
+        "",
+        "",
+    ]
+
+
+def test_stop_sequences_earliest_match() -> None:
+    matcher = StopSequences(["END", "ST"])
+    assert matcher.feed("first STOP then END") == "first "
+    assert matcher.stopped
+    assert matcher.feed("more") == ""
+
+
+def test_stop_sequences_partial_match_released() -> None:
+    assert "".join(_stop(["###"], ["a #", "# b", " c#"])) == "a ## b c#"
+
+
+def test_stop_sequences_empty() -> None:
+    assert _stop([], ["a", "b"]) == ["a", "b", ""]
@@ -0,0 +1,94 @@
+from io import BytesIO
+from typing import Any
+from typing import List
+
+import pytest
+from pydantic import BaseModel
+from pydantic import ValidationError
+from requests import Response
+
+from anaconda_assistant.core import ChatResponse
+from anaconda_assistant.exceptions import StructuredOutputError
+from anaconda_assistant.structured import JSONStreamParser
+
+ARRAY = """Here are the categories:
+```json
+[
+  {"category": "network", "message": "Could not \\"connect\\" [SSL]"},
+  {"category": "solver", "message": "Conflicting {pins}, \\\\"},
+  {"category": "other", "message": "ünïcode ✨"}
+]
+```"""
+
+
+class Category(BaseModel):
+    category: str
+    message: str
+
+
+def _parse(text: str, size: int, schema: Any = None) -> List[Any]:
+    parser = JSONStreamParser(schema=schema)
+    items = []
+    for i in range(0, len(text), size):
+        items.extend(parser.feed(text[i : i + size]))
+    parser.finish()
+    return items
+
+
+@pytest.mark.parametrize("size", [1, 2, 3, 7, 1000])
+def test_parse_array(size: int) -> None:
+    assert _parse(ARRAY, size) == [
+        {"category": "network", "message": 'Could not "connect" [SSL]'},
+        {"category": "solver", "message": "Conflicting {pins}, \\"},
+        {"category": "other", "message": "ünïcode ✨"},
+    ]
+
+
+def test_parse_array_elements_as_they_close() -> None:
+    parser = JSONStreamParser()
+    assert parser.feed('[1, "two", [3') == [1, "two"]
+    assert parser.feed("]") == []
+    assert parser.feed(", null") == [[3]]
+    assert parser.feed("]") == [None]
+    assert parser.done
+
+
+@pytest.mark.parametrize("size", [1, 5, 1000])
+def test_parse_object(size: int) -> None:
+    text = '{"a": 1, "b": {"c": [1, 2]}, "d": "}"} trailing text'
+    assert _parse(text, size) == [("a", 1), ("b", {"c": [1, 2]}), ("d", "}")]
+
+
+def test_parse_empty() -> None:
+    assert _parse("[]", 1) == []
+
+
+def test_parse_schema() -> None:
+    items = _parse(ARRAY, 5, schema=Category)
+    assert [item.category for item in items] == ["network", "solver", "other"]
+
+    with pytest.raises(ValidationError):
+        _parse('[{"category": "network"}]', 5, schema=Category)
+
+
+@pytest.mark.parametrize(
+    "text", ["no json here", '[{"category": "network"}', "[1, 2 3]"]
+)
+def test_parse_errors(text: str) -> None:
+    with pytest.raises(StructuredOutputError):
+        _parse(text, 4)
+
+
+def test_chat_response_iter_json() -> None:
+    response = Response()
+    response.raw = BytesIO(f"{ARRAY}__TOKENS_42/424242__".encode())
+    chat_response = ChatResponse(response, message_id="0")
+
+    items = list(chat_response.iter_json(schema=Category))
+
+    assert [item.category for item in items] == ["network", "solver", "other"]
+    assert chat_response.message == ARRAY
+    assert chat_response.tokens_used == 42
+
+    # a consumed response is parsed from its message
+    assert len(list(chat_response.iter_json())) == 3
@@ -0,0 +1,126 @@
+import json
+from pathlib import Path
+from typing import Any
+from typing import Dict
+from typing import List
+
+import pytest
+from pytest import MonkeyPatch
+
+from anaconda_assistant.core import ChatClient
+from anaconda_assistant.exceptions import DailyQuotaExceeded
+from anaconda_assistant.telemetry import JSONLSink
+
+
+def _read(path: Path) -> List[Dict[str, Any]]:
+    return [json.loads(line) for line in path.read_text().splitlines()]
+
+
+def test_sink_writes_batches(tmp_path: Path) -> None:
+    path = tmp_path / "logs" / "telemetry.jsonl"
+    sink = JSONLSink(path, batch_size=2, flush_interval=0.01)
+    for i in range(5):
+        sink.emit({"i": i})
+
+    assert sink.flush(timeout=5)
+    assert _read(path) == [{"i": i} for i in range(5)]
+    sink.close()
+
+
+def test_sink_drops_oldest(tmp_path: Path) -> None:
+    path = tmp_path / "telemetry.jsonl"
+    sink = JSONLSink(path, max_queue=3, flush_interval=0.5)
+    for i in range(5):
+        sink.emit({"i": i})
+
+    sink.close()
+    records = _read(path)
+    assert records[-3:] == [{"i": 2}, {"i": 3}, {"i": 4}]
+    assert len(records) + sink.dropped == 5
+
+
+def test_sink_drops_unserializable(tmp_path: Path) -> None:
+    path = tmp_path / "telemetry.jsonl"
+    sink = JSONLSink(path, flush_interval=0.01)
+    sink.emit({"i": 0})
+    sink.emit({"i": object()})
+    sink.emit({"i": 2})
+
+    assert sink.flush(timeout=5)
+    assert _read(path) == [{"i": 0}, {"i": 2}]
+    assert sink.dropped == 1
+
+    # the writer is still running
+    sink.emit({"i": 3})
+    assert sink.flush(timeout=5)
+    assert _read(path)[-1] == {"i": 3}
+    sink.close()
+
+
+def test_sink_rotates(tmp_path: Path) -> None:
+    path = tmp_path / "telemetry.jsonl"
+    sink = JSONLSink(path, max_bytes=20, backup_count=2, batch_size=1)
+    for i in range(5):
+        sink.emit({"record": i})
+        assert sink.flush(timeout=5)
+    sink.close()
+
+    assert _read(path) == [{"record": 4}]
+    assert _read(tmp_path / "telemetry.jsonl.1") == [{"record": 3}]
+    assert _read(tmp_path / "telemetry.jsonl.2") == [{"record": 2}]
+    assert not (tmp_path / "telemetry.jsonl.3").exists()
+
+
+@pytest.mark.parametrize("data_collection", [True, False])
+def test_chat_client_telemetry(
+    monkeypatch: MonkeyPatch,
+    tmp_path: Path,
+    mocked_api_domain: str,
+    data_collection: bool,
+) -> None:
+    monkeypatch.setenv("ANACONDA_ASSISTANT_ACCEPTED_TERMS", "true")
+    monkeypatch.setenv("ANACONDA_ASSISTANT_DATA_COLLECTION", str(data_collection))
+
+    path = tmp_path / "telemetry.jsonl"
+    sink = JSONLSink(path, flush_interval=0.01)
+    client = ChatClient(domain=mocked_api_domain, telemetry=sink)
+
+    messages = [{"role": "user", "content": "Who are you?", "message_id": "0"}]
+    response = client.completions(messages)
+    response.message
+
+    with pytest.raises(DailyQuotaExceeded):
+        client.completions(
+            [{"role": "user", "content": "I've said too much", "message_id": "0"}]
+        )
+
+    sink.close()
+    ok, error = _read(path)
+
+    assert ok["status"] == "ok"
+    assert ok["session_id"] == client.id
+    assert ok["message_id"] == response.message_id
+    assert ok["tokens_used"] == 42
+    assert ok["latency_ms"] <= ok["duration_ms"]
+    assert error["status"] == "error"
+    assert error["error"].startswith("DailyQuotaExceeded")
+
+    if data_collection:
+        assert ok["messages"] == messages
+        assert ok["response"] == response.message
+    else:
+        assert "messages" not in ok
+        assert "response" not in ok
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_client_telemetry_path(
+    monkeypatch: MonkeyPatch, tmp_path: Path, mocked_api_domain: str
+) -> None:
+    path = tmp_path / "telemetry.jsonl"
+    monkeypatch.setenv("ANACONDA_ASSISTANT_TELEMETRY_PATH", str(path))
+
+    client = ChatClient(domain=mocked_api_domain)
+    assert client.telemetry is not None
+    assert client.telemetry.path == path.resolve()
+    assert ChatClient(domain=mocked_api_domain).telemetry is client.telemetry
@@ -0,0 +1,120 @@
+import json
+
+import pytest
+
+from anaconda_assistant.core import ChatClient
+from anaconda_assistant.serialization import default_json_dumps
+from anaconda_assistant.templates import PromptTemplate
+
+TEMPLATE = PromptTemplate(
+    system_message="You explain {language} errors. Use {{braces}} literally.",
+    example_messages=[
+        {"role": "user", "content": "What is a {language} KeyError?"},
+        {"role": "assistant", "content": "A missing key."},
+    ],
+    user_message="Explain this error: {error!r}",
+)
+
+
+def test_template_variables() -> None:
+    assert TEMPLATE.prompt_variables == ("language",)
+    assert TEMPLATE.variables == ("language", "error")
+
+
+def test_template_custom_prompt() -> None:
+    assert TEMPLATE.custom_prompt({"language": "Python"}) == {
+        "system_message": {
+            "role": "system",
+            "content": "You explain Python errors. Use {braces} literally.",
+        },
+        "example_messages": [
+            {"role": "user", "content": "What is a Python KeyError?"},
+            {"role": "assistant", "content": "A missing key."},
+        ],
+    }
+
+    with pytest.raises(KeyError):
+        TEMPLATE.custom_prompt({})
+
+
+def test_template_user_message() -> None:
+    assert TEMPLATE.user_message(error="oops") == {
+        "role": "user",
+        "content": "Explain this error: 'oops'",
+    }
+    with pytest.raises(ValueError):
+        PromptTemplate(system_message="static").user_message()
+
+
+def test_template_encoded_custom_prompt_cache() -> None:
+    template = PromptTemplate(system_message="{language}", cache_size=2)
+
+    python = template.encoded_custom_prompt(default_json_dumps, {"language": "Python"})
+    assert python is not None
+    assert json.loads(python)["system_message"]["content"] == "Python"
+    assert (
+        template.encoded_custom_prompt(default_json_dumps, {"language": "Python"})
+        is python
+    )
+
+    # unhashable values are rendered without caching
+    assert template.encoded_custom_prompt(default_json_dumps, {"language": ["R"]})
+
+    template.encoded_custom_prompt(default_json_dumps, {"language": "R"})
+    template.encoded_custom_prompt(default_json_dumps, {"language": "Julia"})
+    assert len(template._encoded) == 2
+    assert (
+        template.encoded_custom_prompt(default_json_dumps, {"language": "Python"})
+        is not python
+    )
+
+
+def test_template_encoded_custom_prompt_cache_key() -> None:
+    template = PromptTemplate(system_message="{value}")
+
+    encoded = [
+        template.encoded_custom_prompt(default_json_dumps, {"value": value})
+        for value in [1, True, 1.0]
+    ]
+    assert [json.loads(e or b"")["system_message"]["content"] for e in encoded] == [
+        "1",
+        "True",
+        "1.0",
+    ]
+
+    with pytest.raises(KeyError):
+        template.encoded_custom_prompt(default_json_dumps, {})
+    assert len(template._encoded) == 3
+
+
+def test_template_attribute_fields() -> None:
+    template = PromptTemplate(system_message="{error.args[0]} in {language}")
+    assert template.prompt_variables == ("error", "language")
+
+    variables = {"error": KeyError("x"), "language": "Python"}
+    encoded = template.encoded_custom_prompt(default_json_dumps, variables)
+    assert json.loads(encoded or b"")["system_message"]["content"] == "x in Python"
+
+
+def test_template_without_system_message() -> None:
+    template = PromptTemplate(user_message="{message}")
+    assert template.custom_prompt() is None
+    assert template.encoded_custom_prompt(default_json_dumps) is None
+
+
+@pytest.mark.usefixtures("accepted_terms_and_data_collection")
+def test_chat_client_prompt_template(mocked_api_domain: str) -> None:
+    client = ChatClient(system_message="ignored", domain=mocked_api_domain)
+
+    messages = [{**TEMPLATE.user_message(error="oops"), "message_id": "0"}]
+    variables = {"language": "Python"}
+    res = client.completions(messages, variables=variables, prompt_template=TEMPLATE)
+
+    assert res._response.request.headers["Content-Type"] == "application/json"
+    assert res._response.request.body is not None
+    body = json.loads(res._response.request.body)
+    assert body["custom_prompt"] == TEMPLATE.custom_prompt(variables)
+    assert body["chat_context"]["variables"] == variables
+    assert body["messages"] == messages
+    assert body["response_message_id"] == res.message_id
+    assert res.message.startswith("I am Anaconda Assistant")